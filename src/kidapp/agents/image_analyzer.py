@@ -5,7 +5,7 @@ import base64
 from pydantic import ConfigDict
 from crewai import Agent
 from typing import Any
-from openai import OpenAI
+from ..openai_clients import get_openai_client, VISION_TIMEOUT
 
 def analyze_image_with_openai(image_path: str) -> str:
     """
@@ -24,8 +24,8 @@ def analyze_image_with_openai(image_path: str) -> str:
             "Please set OPENAI_API_KEY in your environment to access OpenAI's GPT-4 Vision model."
         )
 
-    # Initialize OpenAI client
-    client = OpenAI(api_key=openai_api_key)
+    # Use the shared OpenAI client
+    client = get_openai_client()
 
     # Read and encode the image
     with open(image_path, "rb") as image_file:
@@ -54,7 +54,8 @@ def analyze_image_with_openai(image_path: str) -> str:
                 }
             ],
             max_tokens=500,
-            temperature=0.1  # Low temperature for more consistent descriptions
+            temperature=0.1,  # Low temperature for more consistent descriptions
+            timeout=VISION_TIMEOUT
         )
         
         # Extract the description
@@ -4,18 +4,21 @@ Enhanced WonderBot API with authentication, quiz generation, and session managem
 
 import os
 import uuid
+import time
+import asyncio
 import logging
 import hashlib
 import requests
 import json
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
 from io import BytesIO
 from PIL import Image
-from fastapi import FastAPI, File, UploadFile, Form, Depends, HTTPException, status
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, File, UploadFile, Form, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -29,12 +32,18 @@ except ImportError:
 
 from .crew import KidSafeAppCrew
 from .models import *
-from .auth import get_current_user, register_user, login_user
-from .quiz_generator import generate_quiz_from_explanation, save_quiz_to_memory, get_quiz_by_id, submit_quiz_attempt
+from .auth import get_current_user, get_optional_user, register_user, login_user, token_cache
+from .quiz_generator import generate_quiz_from_explanation, save_quiz_to_memory, get_quiz_by_id, submit_quiz_attempt, enqueue_quiz_generation, quiz_reuse_stats, quiz_generation_stats, quiz_cache
+from .jobs import job_queue, JOB_HEARTBEAT_SECONDS
+from .quiz_timing import quiz_timer
 from .routers import auth_router, quiz_router, session_router
-from openai import OpenAI
 import base64
-from .rag_system import rag_system
+from .openai_clients import (
+    get_openai_client, get_async_openai_client, close_openai_clients,
+    CHAT_TIMEOUT, VISION_TIMEOUT, IMAGE_TIMEOUT, TTS_TIMEOUT
+)
+from .rag_system import rag_system, RAG_CHAT_MODEL, RAG_MAX_TOKENS, RAG_ERROR_RESPONSE
+from .ingest import ingest_texts
 
 # ——— Logging setup ———
 logging.basicConfig(level=logging.INFO)
@@ -47,16 +56,10 @@ app = FastAPI(
     description="AI-powered educational web app for kids with authentication, quizzes, and session management."
 )
 
-# Clear memory storage on startup
-memory_storage.users.clear()
-memory_storage.sessions.clear()
-memory_storage.quizzes.clear()
-memory_storage.quiz_attempts.clear()
-memory_storage.learning_progress.clear()
-memory_storage.achievements.clear()
-if hasattr(memory_storage, 'password_hashes'):
-    memory_storage.password_hashes.clear()
-logger.info("🧹 Memory storage cleared on startup")
+# Users, sessions, quizzes and progress live in the configured storage backend
+from .storage import storage
+from .password_hashing import password_hasher
+logger.info(f"🗄️ Using {type(storage).__name__} backend")
 
 # Add CORS middleware for deployment
 app.add_middleware(
@@ -67,21 +70,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-UPLOAD_DIR = os.path.join(os.getcwd(), "uploaded_images")
+# Generated diagrams and audio are deduplicated by the content-addressed media store
+from .media_store import media_store, media_key
+
+UPLOAD_DIR = media_store.root_dir
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+DIAGRAM_MODEL = "dall-e-3"
+DIAGRAM_SIZE = "1024x1024"
+TTS_MODEL = "tts-1"
+TTS_VOICE = "alloy"
+
+# Narrations currently being synthesized in this process, keyed by media key
+# (the text of narrations waiting to be streamed lives in the media index)
+narration_streams: Dict[str, "NarrationStream"] = {}
+
 # Mount static files for uploaded_images directory
 app.mount("/uploaded_images", StaticFiles(directory=UPLOAD_DIR), name="uploaded_images")
 
 # Mount static files for frontend assets
 app.mount("/static", StaticFiles(directory="src/kidapp/static"), name="static")
 
-# Simple cache for fast path responses
-response_cache = {}
+# Bounded LRU/TTL cache for generated responses (see cache.py)
+from .cache import response_cache
+from .singleflight import generation_flights
+from .cache_keys import make_topic_cache_key, make_image_cache_key, semantic_index
+from .recommender import recommender, RECOMMENDER_REFRESH_SECONDS
+
+# Bounded worker pool for blocking OpenAI/CrewAI calls made from async handlers
+MEDIA_MAX_WORKERS = int(os.getenv("MEDIA_MAX_WORKERS", "8"))
+media_executor = ThreadPoolExecutor(max_workers=MEDIA_MAX_WORKERS, thread_name_prefix="media")
 
 # Security
 security = HTTPBearer()
 
+async def _maintain_background_jobs_forever():
+    while True:
+        try:
+            await run_blocking(job_queue.resume_unfinished)
+        except Exception as e:
+            # A failed beat (e.g. a locked database) must not end the heartbeat for good
+            logger.error(f"❌ Job heartbeat failed: {e}")
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+
+@app.on_event("startup")
+async def resume_background_jobs():
+    """Keep this process's job heartbeat fresh and pick up jobs dead processes left unfinished."""
+    app.state.jobs_task = asyncio.create_task(_maintain_background_jobs_forever())
+
+async def _refresh_recommendations_forever():
+    while True:
+        try:
+            await run_blocking(recommender.refresh)
+        except Exception as e:
+            # Keep serving the last graph and try again on the next refresh
+            logger.error(f"❌ Recommender refresh failed: {e}")
+        await asyncio.sleep(RECOMMENDER_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def start_recommender_refresh():
+    """Keep the recommender's topic graph up to date in the background."""
+    app.state.recommender_task = asyncio.create_task(_refresh_recommendations_forever())
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    """Release the worker pool and the shared OpenAI connection pools."""
+    for task_name in ("recommender_task", "jobs_task"):
+        task = getattr(app.state, task_name, None)
+        if task is not None:
+            task.cancel()
+    media_executor.shutdown(wait=False)
+    password_hasher.shutdown()
+    job_queue.shutdown()
+    await close_openai_clients()
+
+# ——— Quiz catalog paging ———
+QUIZ_PAGE_DEFAULT = 20
+QUIZ_PAGE_MAX = 100
+
 # ——— Include Routers ———
 app.include_router(auth_router.router)
 app.include_router(quiz_router.router)
@@ -92,21 +158,20 @@ app.include_router(session_router.router)
 @app.post("/clear-data", response_class=JSONResponse)
 async def clear_all_data():
     """Clear all stored data (for testing/debugging)."""
-    memory_storage.users.clear()
-    memory_storage.sessions.clear()
-    memory_storage.quizzes.clear()
-    memory_storage.quiz_attempts.clear()
-    memory_storage.learning_progress.clear()
-    memory_storage.achievements.clear()
-    if hasattr(memory_storage, 'password_hashes'):
-        memory_storage.password_hashes.clear()
+    storage.clear()
     response_cache.clear()
+    quiz_cache.clear()
+    semantic_index.clear()
+    media_store.reset_refs()
+    recommender.reset()
+    quiz_timer.reset()
     logger.info("🧹 All data cleared")
     return {"message": "All data cleared successfully"}
 
 @app.get("/debug/storage", response_class=JSONResponse)
-async def view_memory_storage():
-    """View all data in memory storage (for debugging)."""
+async def view_storage():
+    """View all data in storage (for debugging)."""
+    counts = storage.counts()
     return {
         "users": {
             user_id: {
@@ -118,7 +183,7 @@ async def view_memory_storage():
                 "created_at": user.created_at.isoformat() if user.created_at else None,
                 "last_login": user.last_login.isoformat() if user.last_login else None
             }
-            for user_id, user in memory_storage.users.items()
+            for user_id, user in ((u.id, u) for u in storage.list_users())
         },
         "sessions": {
             user_id: [
@@ -133,7 +198,7 @@ async def view_memory_storage():
                 }
                 for session in sessions
             ]
-            for user_id, sessions in memory_storage.sessions.items()
+            for user_id, sessions in storage.sessions_by_user().items()
         },
         "quizzes": {
             quiz_id: {
@@ -143,7 +208,7 @@ async def view_memory_storage():
                 "questions_count": len(quiz.questions),
                 "created_at": quiz.created_at.isoformat() if quiz.created_at else None
             }
-            for quiz_id, quiz in memory_storage.quizzes.items()
+            for quiz_id, quiz in ((q.id, q) for q in storage.list_quizzes())
         },
         "quiz_attempts": {
             user_id: [
@@ -157,7 +222,7 @@ async def view_memory_storage():
                 }
                 for attempt in attempts
             ]
-            for user_id, attempts in memory_storage.quiz_attempts.items()
+            for user_id, attempts in storage.attempts_by_user().items()
         },
         "learning_progress": {
             user_id: {
@@ -171,22 +236,33 @@ async def view_memory_storage():
                 }
                 for topic, progress in user_progress.items()
             }
-            for user_id, user_progress in memory_storage.learning_progress.items()
+            for user_id, user_progress in storage.progress_by_user().items()
         },
         "password_hashes": {
             user_id: hash_value[:20] + "..." if len(hash_value) > 20 else hash_value
-            for user_id, hash_value in (memory_storage.password_hashes.items() if hasattr(memory_storage, 'password_hashes') else {})
+            for user_id, hash_value in storage.list_password_hashes().items()
         },
-        "cache_size": len(response_cache),
-        "total_users": len(memory_storage.users),
-        "total_sessions": sum(len(sessions) for sessions in memory_storage.sessions.values()),
-        "total_quizzes": len(memory_storage.quizzes),
-        "total_attempts": sum(len(attempts) for attempts in memory_storage.quiz_attempts.values())
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_index.stats(),
+        "media_store": media_store.stats(),
+        "background_jobs": job_queue.stats(),
+        "request_coalescing": generation_flights.stats(),
+        "token_cache": token_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "recommender": recommender.stats(),
+        "quiz_reuse": quiz_reuse_stats(),
+        "quiz_generation": quiz_generation_stats(),
+        "quiz_timing": quiz_timer.stats(),
+        "total_users": counts["users"],
+        "total_sessions": counts["sessions"],
+        "total_quizzes": counts["quizzes"],
+        "total_attempts": counts["attempts"]
     }
 
 @app.get("/debug/users", response_class=JSONResponse)
 async def view_users():
     """View all registered users."""
+    users = storage.list_users()
     return {
         "users": [
             {
@@ -199,31 +275,25 @@ async def view_users():
                 "created_at": user.created_at.isoformat() if user.created_at else None,
                 "last_login": user.last_login.isoformat() if user.last_login else None
             }
-            for user_id, user in memory_storage.users.items()
+            for user_id, user in ((u.id, u) for u in users)
         ],
-        "total_users": len(memory_storage.users)
+        "total_users": len(users)
     }
 
 @app.get("/debug/sessions/{user_id}", response_class=JSONResponse)
-async def view_user_sessions(user_id: str):
-    """View all sessions for a specific user."""
-    sessions = memory_storage.sessions.get(user_id, [])
-    return {
-        "user_id": user_id,
-        "sessions": [
-            {
-                "topic": session.topic,
-                "explanation": session.explanation,
-                "diagram_url": session.diagram_url,
-                "audio_url": session.audio_url,
-                "timestamp": session.timestamp.isoformat() if session.timestamp else None,
-                "age": session.age,
-                "interests": session.interests
-            }
-            for session in sessions
-        ],
-        "total_sessions": len(sessions)
-    }
+async def view_user_sessions(
+    user_id: str,
+    limit: int = Query(session_router.SESSION_PAGE_DEFAULT, ge=1, le=session_router.SESSION_PAGE_MAX),
+    cursor: Optional[str] = None,
+    topic: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    include_total: Optional[bool] = None
+):
+    """View a page of sessions for a specific user, newest first."""
+    page = session_router.get_session_page(user_id, limit, cursor, topic, since, until, fields, include_total)
+    return {"user_id": user_id, **page}
 
 @app.get("/learning/progress/{user_id}", response_class=JSONResponse)
 async def get_learning_progress(user_id: str, current_user: UserResponse = Depends(get_current_user)):
@@ -231,7 +301,7 @@ async def get_learning_progress(user_id: str, current_user: UserResponse = Depen
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this user's progress")
     
-    progress = memory_storage.learning_progress.get(user_id, {})
+    progress = storage.get_progress(user_id)
     return {"progress": progress}
 
 @app.get("/learning/recommendations/{user_id}", response_class=JSONResponse)
@@ -240,19 +310,8 @@ async def get_learning_recommendations(user_id: str, current_user: UserResponse
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this user's recommendations")
     
-    # Simple recommendation logic based on user interests and progress
-    user = current_user
-    recommendations = []
-    
-    if user.interests:
-        interests = user.interests.split(",")
-        for interest in interests[:3]:  # Top 3 interests
-            recommendations.append({
-                "topic": interest.strip(),
-                "reason": f"Based on your interest in {interest.strip()}",
-                "difficulty": "medium"
-            })
-    
+    # Served from the recommender's precomputed topic graph
+    recommendations = recommender.recommend(user_id, current_user.interests)
     return {"recommendations": recommendations}
 
 # ——— Original WonderBot Endpoints (Enhanced) ———
@@ -266,62 +325,153 @@ def is_simple_question(topic: str) -> bool:
     topic_lower = topic.lower()
     return any(keyword in topic_lower for keyword in simple_keywords)
 
-def fast_path_response(topic: str, age: int = None, interests: str = None) -> dict:
-    """Generate a quick response for simple questions using direct OpenAI call."""
-    try:
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
-            return {"error": "OpenAI API key not configured"}
-        
-        client = OpenAI(api_key=openai_api_key)
-        
-        # Create a simple, direct prompt
-        age_context = f" for a {age}-year-old child" if age else " for children aged 6-12"
-        interests_context = f" who loves {interests}" if interests else ""
-        
-        prompt = f"""You are a friendly teacher explaining things to kids. 
-        Explain this topic in a simple, fun way{age_context}{interests_context}:
-        
-        {topic}
-        
-        Keep it short (2-3 sentences), friendly, and easy to understand. 
-        Use simple words and maybe a fun example."""
-        
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the media worker pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(media_executor, partial(func, *args, **kwargs))
+
+async def _timed(func, *args):
+    """Run a blocking call on the worker pool and return (result, elapsed_ms)."""
+    start = time.perf_counter()
+    result = await run_blocking(func, *args)
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+def register_streaming_audio(text: str) -> str:
+    """Register a narration for streaming and return its /generate/audio URL (or the stored file URL)."""
+    text = text[:4096]
+    key = media_key("audio", text, TTS_MODEL, TTS_VOICE)
+    existing_url = media_store.lookup(key)
+    if existing_url:
+        return existing_url
+    media_store.register_pending(key, text)
+    return f"/generate/audio/{key}"
+
+async def _no_audio(text: str) -> tuple:
+    return register_streaming_audio(text), 0.0
+
+async def generate_media_assets(explanation: str, stream_audio: bool = False) -> dict:
+    """Generate the diagram and the audio narration for an explanation concurrently.
+
+    With stream_audio the narration is not synthesized up front; the returned
+    audio_url points at /generate/audio/{audio_id}, which streams it on demand.
+    """
+    dalle_prefix = "Create a simple, colorful diagram for kids that illustrates: "
+    max_explanation_len = 4000 - len(dalle_prefix)
+    dalle_prompt = dalle_prefix + explanation[:max_explanation_len]
+    # Truncate explanation for TTS to 4096 characters
+    tts_text = explanation[:4096]
+
+    start = time.perf_counter()
+    (diagram_result, diagram_ms), (audio_url, audio_ms) = await asyncio.gather(
+        _timed(generate_diagram_with_dalle, dalle_prompt),
+        _no_audio(tts_text) if stream_audio else _timed(generate_audio_with_tts, tts_text),
+    )
+    media_ms = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"⏱️ Media stage finished in {media_ms}ms (diagram {diagram_ms}ms, audio {audio_ms}ms)")
+
+    return {
+        "diagram_url": diagram_result["diagram_url"],
+        "diagram_error": diagram_result["diagram_error"],
+        "audio_url": audio_url,
+        "timings": {
+            "diagram_ms": diagram_ms,
+            "audio_ms": audio_ms,
+            "media_ms": media_ms
+        }
+    }
+
+def _clean_json_content(content: str) -> str:
+    """Unwrap content the model returned as a JSON object."""
+    if content.startswith('{"') or content.startswith('{'):
+        try:
+            parsed = json.loads(content)
+            if 'result' in parsed:
+                content = parsed['result']
+            elif 'content' in parsed:
+                content = parsed['content']
+        except:
+            pass
+    return content
+
+def _fast_path_completion(topic: str, age: int = None, interests: str = None) -> str:
+    """Ask OpenAI for a short kid-friendly explanation of a topic."""
+    client = get_openai_client()
+    
+    # Create a simple, direct prompt
+    age_context = f" for a {age}-year-old child" if age else " for children aged 6-12"
+    interests_context = f" who loves {interests}" if interests else ""
+    
+    prompt = f"""You are a friendly teacher explaining things to kids. 
+    Explain this topic in a simple, fun way{age_context}{interests_context}:
+    
+    {topic}
+    
+    Keep it short (2-3 sentences), friendly, and easy to understand. 
+    Use simple words and maybe a fun example."""
+    
+    response = client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=150,
+        temperature=0.7,
+        timeout=CHAT_TIMEOUT
+    )
+    
+    return _clean_json_content(response.choices[0].message.content.strip())
+
+def _fast_path_image_completion(image_path: str, age: int = None, interests: str = None) -> str:
+    """Ask OpenAI Vision for a short kid-friendly description of an image."""
+    client = get_openai_client()
+    
+    # Create a simple, direct prompt
+    age_context = f" for a {age}-year-old child" if age else " for children aged 6-12"
+    interests_context = f" who loves {interests}" if interests else ""
+    
+    prompt = f"""You are a friendly teacher explaining things to kids. 
+    Look at this image and explain what you see in a simple, fun way{age_context}{interests_context}.
+    
+    Keep it short (2-3 sentences), friendly, and easy to understand. 
+    Use simple words and maybe a fun example."""
+    
+    # Read the image file
+    with open(image_path, "rb") as image_file:
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{base64.b64encode(image_file.read()).decode('utf-8')}"
+                            }
+                        }
+                    ]
+                }
+            ],
             max_tokens=150,
-            temperature=0.7
+            temperature=0.7,
+            timeout=VISION_TIMEOUT
         )
+    
+    return _clean_json_content(response.choices[0].message.content.strip())
+
+async def fast_path_response(topic: str, age: int = None, interests: str = None, stream_audio: bool = False) -> dict:
+    """Generate a quick response for simple questions using direct OpenAI call."""
+    try:
+        if not os.getenv("OPENAI_API_KEY"):
+            return {"error": "OpenAI API key not configured"}
         
-        content = response.choices[0].message.content.strip()
-        
-        # Clean up any JSON formatting if present
-        if content.startswith('{"') or content.startswith('{'):
-            try:
-                parsed = json.loads(content)
-                if 'result' in parsed:
-                    content = parsed['result']
-                elif 'content' in parsed:
-                    content = parsed['content']
-            except:
-                pass
+        content = await run_blocking(_fast_path_completion, topic, age, interests)
         
         # Generate diagram and audio for the fast path response
-        dalle_prefix = "Create a simple, colorful diagram for kids that illustrates: "
-        max_explanation_len = 4000 - len(dalle_prefix)
-        dalle_prompt = dalle_prefix + content[:max_explanation_len]
-        diagram_result = generate_diagram_with_dalle(dalle_prompt)
-        
-        # Truncate content for TTS to 4096 characters
-        tts_text = content[:4096]
-        audio_url = generate_audio_with_tts(tts_text)
+        media = await generate_media_assets(content, stream_audio)
         
         return {
             "result": content,
-            "diagram_url": diagram_result["diagram_url"],
-            "diagram_error": diagram_result["diagram_error"],
-            "audio_url": audio_url,
+            **media,
             "fast_path": True
         }
         
@@ -329,75 +479,20 @@ def fast_path_response(topic: str, age: int = None, interests: str = None) -> di
         logger.error(f"Fast path failed: {e}")
         return None
 
-def fast_path_image_analysis(image_path: str, age: int = None, interests: str = None) -> dict:
+async def fast_path_image_analysis(image_path: str, age: int = None, interests: str = None, stream_audio: bool = False) -> dict:
     """Generate a quick response for image analysis using direct OpenAI Vision API call."""
     try:
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
+        if not os.getenv("OPENAI_API_KEY"):
             return {"error": "OpenAI API key not configured"}
         
-        client = OpenAI(api_key=openai_api_key)
-        
-        # Create a simple, direct prompt
-        age_context = f" for a {age}-year-old child" if age else " for children aged 6-12"
-        interests_context = f" who loves {interests}" if interests else ""
-        
-        prompt = f"""You are a friendly teacher explaining things to kids. 
-        Look at this image and explain what you see in a simple, fun way{age_context}{interests_context}.
-        
-        Keep it short (2-3 sentences), friendly, and easy to understand. 
-        Use simple words and maybe a fun example."""
-        
-        # Read the image file
-        with open(image_path, "rb") as image_file:
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64.b64encode(image_file.read()).decode('utf-8')}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=150,
-                temperature=0.7
-            )
-        
-        content = response.choices[0].message.content.strip()
-        
-        # Clean up any JSON formatting if present
-        if content.startswith('{"') or content.startswith('{'):
-            try:
-                parsed = json.loads(content)
-                if 'result' in parsed:
-                    content = parsed['result']
-                elif 'content' in parsed:
-                    content = parsed['content']
-            except:
-                pass
+        content = await run_blocking(_fast_path_image_completion, image_path, age, interests)
         
         # Generate diagram and audio for the fast path response
-        dalle_prefix = "Create a simple, colorful diagram for kids that illustrates: "
-        max_explanation_len = 4000 - len(dalle_prefix)
-        dalle_prompt = dalle_prefix + content[:max_explanation_len]
-        diagram_result = generate_diagram_with_dalle(dalle_prompt)
-        
-        # Truncate content for TTS to 4096 characters
-        tts_text = content[:4096]
-        audio_url = generate_audio_with_tts(tts_text)
+        media = await generate_media_assets(content, stream_audio)
         
         return {
             "result": content,
-            "diagram_url": diagram_result["diagram_url"],
-            "diagram_error": diagram_result["diagram_error"],
-            "audio_url": audio_url,
+            **media,
             "fast_path": True
         }
         
@@ -416,19 +511,30 @@ def generate_diagram_with_dalle(prompt: str) -> dict:
                 "diagram_error": "API key not configured. Please check your OpenAI API key."
             }
         
-        logger.info(f"🎨 Generating DALL-E diagram with prompt: {prompt[:100]}...")
-        client = OpenAI(api_key=openai_api_key)
-        
         # Add safety check for prompt length
         if len(prompt) > 4000:
             prompt = prompt[:4000]
             logger.info("📝 Truncated DALL-E prompt to fit limits")
         
+        # Reuse an identical diagram if one was already generated
+        key = media_key("diagram", prompt, DIAGRAM_MODEL, DIAGRAM_SIZE)
+        existing_url = media_store.lookup(key)
+        if existing_url:
+            logger.info(f"♻️ Reusing stored diagram: {existing_url}")
+            return {
+                "diagram_url": existing_url,
+                "diagram_error": None
+            }
+        
+        logger.info(f"🎨 Generating DALL-E diagram with prompt: {prompt[:100]}...")
+        client = get_openai_client()
+        
         response = client.images.generate(
-            model="dall-e-3",
+            model=DIAGRAM_MODEL,
             prompt=prompt,
             n=1,
-            size="1024x1024"
+            size=DIAGRAM_SIZE,
+            timeout=IMAGE_TIMEOUT
         )
         
         url = getattr(response.data[0], 'url', None)
@@ -444,19 +550,8 @@ def generate_diagram_with_dalle(prompt: str) -> dict:
         try:
             img_response = requests.get(url, timeout=30)  # Add timeout
             if img_response.status_code == 200:
-                # Generate a unique filename
-                img_filename = f"diagram_{uuid.uuid4().hex}.png"
-                img_path = os.path.join(UPLOAD_DIR, img_filename)
-                
-                # Ensure directory exists
-                os.makedirs(UPLOAD_DIR, exist_ok=True)
-                
-                # Save the image
-                with open(img_path, "wb") as f:
-                    f.write(img_response.content)
-                
-                # Return local URL
-                local_url = f"/uploaded_images/{img_filename}"
+                # Save the image atomically under its content key
+                local_url = media_store.put(key, "diagram", "png", img_response.content)
                 logger.info(f"✅ DALL-E diagram saved locally: {local_url}")
                 return {
                     "diagram_url": local_url,
@@ -495,26 +590,27 @@ def generate_audio_with_tts(text: str) -> str:
             text = text[:4096]
             logger.info("📝 Truncated TTS text to fit limits")
         
+        # Reuse an identical clip if one was already generated
+        key = media_key("audio", text, TTS_MODEL, TTS_VOICE)
+        existing_url = media_store.lookup(key)
+        if existing_url:
+            logger.info(f"♻️ Reusing stored audio: {existing_url}")
+            return existing_url
+        
         logger.info(f"🔊 Generating TTS audio for text: {text[:100]}...")
-        client = OpenAI(api_key=openai_api_key)
+        client = get_openai_client()
         response = client.audio.speech.create(
-            model="tts-1",
-            voice="alloy",
-            input=text
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=text,
+            timeout=TTS_TIMEOUT
         )
         
-        # Generate a unique filename
-        audio_filename = f"audio_{uuid.uuid4().hex}.mp3"
-        audio_path = os.path.join(UPLOAD_DIR, audio_filename)
-        
-        # Ensure directory exists
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        
-        # Save the audio file
-        response.stream_to_file(audio_path)
-        
-        # Return local URL
-        local_url = f"/uploaded_images/{audio_filename}"
+        # Save the audio file atomically under its content key
+        with media_store.writer(key, "audio", "mp3") as f:
+            for chunk in response.iter_bytes():
+                f.write(chunk)
+        local_url = media_store.url_for(media_store.filename_for(key, "audio", "mp3"))
         logger.info(f"✅ TTS audio saved locally: {local_url}")
         return local_url
         
@@ -522,6 +618,112 @@ def generate_audio_with_tts(text: str) -> str:
         logger.error(f"❌ TTS generation failed: {e}")
         return "/uploaded_images/audio_error.mp3"
 
+def _refresh_audio_url(outputs: dict) -> dict:
+    """Re-register a cached response's streaming narration in case it was never played."""
+    if str(outputs.get("audio_url", "")).startswith("/generate/audio/") and outputs.get("result"):
+        outputs["audio_url"] = register_streaming_audio(outputs["result"])
+    return outputs
+
+def _serve_cached(outputs: dict) -> dict:
+    """Prepare a cached response for serving, keeping the media it links to out of GC."""
+    media_store.touch([outputs.get("diagram_url"), outputs.get("audio_url")])
+    return _refresh_audio_url(outputs)
+
+async def _match_audio_mode(outputs: dict, stream_audio: bool) -> dict:
+    """Give a cached or shared result the audio form this caller asked for.
+
+    Results are shared between callers whatever their stream_audio flag, so a
+    caller that wanted finished audio may be handed a streaming URL; synthesize
+    it now (an already streamed clip is reused). A stored file URL suits both.
+    """
+    if not stream_audio and str(outputs.get("audio_url", "")).startswith("/generate/audio/") and outputs.get("result"):
+        outputs = {**outputs, "audio_url": await run_blocking(generate_audio_with_tts, outputs["result"][:4096])}
+    return outputs
+
+async def _stream_tts(audio_id: str, text: str):
+    """Yield OpenAI's streamed speech bytes while teeing them into the media store."""
+    client = get_async_openai_client()
+    async with client.audio.speech.with_streaming_response.create(
+        model=TTS_MODEL,
+        voice=TTS_VOICE,
+        input=text,
+        response_format="mp3",
+        timeout=TTS_TIMEOUT
+    ) as response:
+        with media_store.writer(audio_id, "audio", "mp3") as f:
+            async for chunk in response.iter_bytes(16 * 1024):
+                f.write(chunk)
+                yield chunk
+    media_store.clear_pending(audio_id)
+    logger.info(f"✅ Streamed TTS audio stored: {audio_id}")
+
+class NarrationStream:
+    """One TTS synthesis whose bytes are replayed to every listener of the same narration."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+    async def publish(self, chunk: bytes) -> None:
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None) -> None:
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def listen(self):
+        """Yield every chunk from the start, then new ones as they arrive."""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.chunks) or self.done)
+                new_chunks = self.chunks[index:]
+                finished = self.done
+            for chunk in new_chunks:
+                yield chunk
+            index += len(new_chunks)
+            if finished and index >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+async def _synthesize_narration(audio_id: str, text: str, stream: NarrationStream) -> None:
+    # Runs as its own task so a listener disconnecting does not stop the others
+    try:
+        async for chunk in _stream_tts(audio_id, text):
+            await stream.publish(chunk)
+        await stream.finish()
+    except Exception as e:
+        logger.error(f"❌ Streaming TTS failed for {audio_id}: {e}")
+        await stream.finish(e)
+    finally:
+        narration_streams.pop(audio_id, None)
+
+@app.get("/generate/audio/{audio_id}")
+async def stream_audio_narration(audio_id: str):
+    """Stream a narration registered by /generate, synthesizing it on first request.
+
+    Concurrent requests for the same narration share one synthesis.
+    """
+    existing_url = media_store.lookup(audio_id)
+    if existing_url:
+        return RedirectResponse(existing_url)
+    stream = narration_streams.get(audio_id)
+    if stream is None:
+        text = media_store.pending_text(audio_id)
+        if text is None:
+            raise HTTPException(status_code=404, detail="Audio not found")
+        stream = narration_streams[audio_id] = NarrationStream()
+        stream.task = asyncio.create_task(_synthesize_narration(audio_id, text, stream))
+    return StreamingResponse(stream.listen(), media_type="audio/mpeg")
+
 def clean_crewai_result(result) -> str:
     """Extract clean text from CrewAI result, removing JSON formatting."""
     if isinstance(result, dict):
@@ -546,13 +748,99 @@ def clean_crewai_result(result) -> str:
     else:
         return str(result)
 
+def _queue_quiz(current_user: Optional[UserResponse], explanation: str, topic: str) -> Optional[str]:
+    """Queue background quiz generation for an authenticated user and return the job id."""
+    if not current_user:
+        return None
+    try:
+        job_id = enqueue_quiz_generation(
+            explanation=explanation,
+            topic=topic,
+            user_id=current_user.id,
+            difficulty=DifficultyLevel.MEDIUM,
+            num_questions=5
+        )
+        logger.info(f"🎯 Queued quiz job {job_id} for topic: {topic}")
+        return job_id
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to queue quiz generation: {e}")
+        return None
+
+async def _compute_image_result(fpath: str, image_cache_key: str, age: Optional[int], interests: Optional[str], stream_audio: bool) -> dict:
+    """Explain an uploaded image with diagram and audio, and cache the shared result."""
+    # Try fast path for image analysis first
+    logger.info("⚡ Trying fast path for image analysis...")
+    fast_result = await fast_path_image_analysis(fpath, age, interests, stream_audio)
+    if fast_result and not fast_result.get("error"):
+        logger.info("✅ Fast path image analysis completed successfully")
+        # Cache the result
+        await run_blocking(response_cache.set, image_cache_key, fast_result)
+        return fast_result
+    
+    # Fallback to CrewAI workflow if fast path fails
+    logger.info("🔄 Fast path failed, falling back to CrewAI workflow...")
+    inputs = {"image_path": fpath, "mode": "image_analysis", "age": age, "interests": interests}
+    logger.info(f"🚀 Starting CrewAI image analysis workflow with inputs: {inputs}")
+    logger.info("📋 Creating CrewAI instance for image analysis...")
+    crew_instance = KidSafeAppCrew()
+    crew_instance._inputs = inputs
+    logger.info("🔧 Building crew for image analysis...")
+    crew = crew_instance.crew()
+    logger.info("⚡ Starting crew.kickoff() for image analysis...")
+    result = await run_blocking(crew.kickoff, inputs=inputs)
+    logger.info("✅ CrewAI image analysis completed successfully")
+    
+    # Clean the result to get just the content
+    explanation = clean_crewai_result(result)
+    
+    # Generate diagram and audio for the image analysis
+    media = await generate_media_assets(explanation, stream_audio)
+    
+    final_result = {
+        "result": explanation,
+        **media
+    }
+    
+    # Cache the result
+    await run_blocking(response_cache.set, image_cache_key, final_result)
+    logger.info("🎉 Image analysis multimodal processing completed")
+    return final_result
+
+async def _compute_topic_result(topic: str, cache_key: str, age: Optional[int], interests: Optional[str], stream_audio: bool) -> dict:
+    """Explain a text question with diagram and audio, and cache the shared result."""
+    # Try RAG first for better accuracy and context
+    logger.info("🔍 Using RAG system for enhanced response")
+    rag_result = await run_blocking(rag_system.generate_rag_response, topic, age, interests)
+    
+    # Generate diagram and audio concurrently
+    media = await generate_media_assets(rag_result["response"], stream_audio)
+    
+    final_result = {
+        "result": rag_result["response"],
+        **media,
+        "sources": [f"RAG: {source['category']} - {source['topic']}" for source in rag_result["sources"]] if rag_result["sources"] else ["Basic Response"],
+        "confidence": rag_result["confidence"]
+    }
+    
+    # Cache the result
+    await run_blocking(response_cache.set, cache_key, final_result)
+    if semantic_index.enabled:
+        try:
+            await run_blocking(semantic_index.add, topic, age, interests, cache_key)
+        except Exception as e:
+            logger.warning(f"⚠️ Semantic cache update failed: {e}")
+    
+    logger.info("🎉 Multimodal processing completed")
+    return final_result
+
 @app.post("/generate", response_class=JSONResponse)
 async def generate(
     topic: str = Form(None, description="The topic or question to explain (optional if image is provided)"),
     image: UploadFile = File(None, description="Optional image to analyze"),
     age: int = Form(None, description="Child's age (optional)"),
     interests: str = Form(None, description="Comma-separated interests (optional)"),
-    current_user: Optional[UserResponse] = None
+    stream_audio: bool = Form(False, description="Return a streaming audio URL instead of waiting for TTS"),
+    current_user: Optional[UserResponse] = Depends(get_optional_user)
 ):
     """
     Generate a kid-friendly explanation for either:
@@ -560,6 +848,7 @@ async def generate(
     - A text topic/question (if topic is provided)
     
     Now with session tracking and user authentication!
+    Identical questions arriving concurrently share one computation.
     """
     # Enforce that only one of image or topic is provided
     if (image and topic) or (not image and not topic):
@@ -570,16 +859,23 @@ async def generate(
     
     # Check cache for simple text questions
     if topic and not image:
-        cache_key = f"{topic}_{age}_{interests}"
-        if cache_key in response_cache:
+        cache_key = make_topic_cache_key(topic, age, interests)
+        cached = await run_blocking(response_cache.get, cache_key)
+        if cached is None and semantic_index.enabled:
+            try:
+                match = await run_blocking(semantic_index.lookup, topic, age, interests)
+                if match:
+                    cached = await run_blocking(response_cache.get, match[0])
+                    if cached is not None:
+                        logger.info(f"🧭 Semantic cache match {match[0]!r} (similarity {match[1]:.3f})")
+            except Exception as e:
+                logger.warning(f"⚠️ Semantic cache lookup failed: {e}")
+        if cached is not None:
             logger.info("🚀 Returning cached response")
-            return {"outputs": response_cache[cache_key]}
-    
-    # 1. Build the inputs dict
-    inputs = {}
+            return {"outputs": await _match_audio_mode(await run_blocking(_serve_cached, cached), stream_audio)}
     
     if image:
-        # Image analysis mode - use CrewAI workflow
+        # Image analysis mode
         ext = os.path.splitext(image.filename or "")[1] or ".png"
         fname = f"{uuid.uuid4().hex}{ext}"
         fpath = os.path.join(UPLOAD_DIR, fname)
@@ -598,195 +894,241 @@ async def generate(
             logger.exception("❌ Failed to open/dump the uploaded image")
 
         # Check cache for image analysis (using file hash as key)
-        image_cache_key = f"image_{md5}_{age}_{interests}"
-        if image_cache_key in response_cache:
+        image_cache_key = make_image_cache_key(md5, age, interests)
+        cached = await run_blocking(response_cache.get, image_cache_key)
+        if cached is not None:
             logger.info("🚀 Returning cached image analysis response")
-            return {"outputs": response_cache[image_cache_key]}
+            return {"outputs": await _match_audio_mode(await run_blocking(_serve_cached, cached), stream_audio)}
         
-        # Try fast path for image analysis first
-        logger.info("⚡ Trying fast path for image analysis...")
-        fast_result = fast_path_image_analysis(fpath, age, interests)
-        if fast_result and not fast_result.get("error"):
-            logger.info("✅ Fast path image analysis completed successfully")
-            # Cache the result
-            response_cache[image_cache_key] = fast_result
-            
-            # Generate quiz automatically for authenticated users (fast path image analysis)
-            quiz_id = None
-            if current_user:
-                try:
-                    from .quiz_generator import generate_quiz_from_explanation, save_quiz_to_memory
-                    quiz = generate_quiz_from_explanation(
-                        explanation=fast_result["result"],
-                        topic=f"Image Analysis: {image.filename}",
-                        difficulty=DifficultyLevel.MEDIUM,
-                        num_questions=5
-                    )
-                    save_quiz_to_memory(quiz)
-                    quiz_id = quiz.id
-                    logger.info(f"🎯 Generated quiz {quiz_id} for fast path image analysis: {image.filename}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to generate quiz for fast path image: {e}")
-            
-            # Save session data if user is authenticated
-            if current_user:
-                session_router.save_session_data(
-                    user_id=current_user.id,
-                    topic=f"Image Analysis: {image.filename}",
-                    explanation=fast_result["result"],
-                    diagram_url=fast_result["diagram_url"],
-                    audio_url=fast_result["audio_url"],
-                    age=age,
-                    interests=interests
-                )
-            
-            # Add quiz_id to fast result
-            fast_result["quiz_id"] = quiz_id
-            return {"outputs": fast_result}
-        
-        # Fallback to CrewAI workflow if fast path fails
-        logger.info("🔄 Fast path failed, falling back to CrewAI workflow...")
-        inputs = {"image_path": fpath, "mode": "image_analysis", "age": age, "interests": interests}
-        logger.info(f"🚀 Starting CrewAI image analysis workflow with inputs: {inputs}")
+        session_topic = f"Image Analysis: {image.filename}"
         try:
-            logger.info("📋 Creating CrewAI instance for image analysis...")
-            crew_instance = KidSafeAppCrew()
-            crew_instance._inputs = inputs
-            logger.info("🔧 Building crew for image analysis...")
-            crew = crew_instance.crew()
-            logger.info("⚡ Starting crew.kickoff() for image analysis...")
-            result = crew.kickoff(inputs=inputs)
-            logger.info("✅ CrewAI image analysis completed successfully")
-            
-            # Clean the result to get just the content
-            explanation = clean_crewai_result(result)
-            
-            # Generate diagram and audio for the image analysis
-            dalle_prefix = "Create a simple, colorful diagram for kids that illustrates: "
-            max_explanation_len = 4000 - len(dalle_prefix)
-            dalle_prompt = dalle_prefix + explanation[:max_explanation_len]
-            diagram_result = generate_diagram_with_dalle(dalle_prompt)
-            
-            # Truncate explanation for TTS to 4096 characters
-            tts_text = explanation[:4096]
-            audio_url = generate_audio_with_tts(tts_text)
-            
-            final_result = {
-                "result": explanation,
-                "diagram_url": diagram_result["diagram_url"],
-                "diagram_error": diagram_result["diagram_error"],
-                "audio_url": audio_url,
-                "quiz_id": quiz_id
-            }
-            
-            # Cache the result
-            response_cache[image_cache_key] = final_result
-            
-            # Generate quiz automatically for authenticated users (image analysis)
-            quiz_id = None
-            if current_user:
-                try:
-                    from .quiz_generator import generate_quiz_from_explanation, save_quiz_to_memory
-                    quiz = generate_quiz_from_explanation(
-                        explanation=explanation,
-                        topic=f"Image Analysis: {image.filename}",
-                        difficulty=DifficultyLevel.MEDIUM,
-                        num_questions=5
-                    )
-                    save_quiz_to_memory(quiz)
-                    quiz_id = quiz.id
-                    logger.info(f"🎯 Generated quiz {quiz_id} for image analysis: {image.filename}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to generate quiz for image: {e}")
-            
-            # Save session data if user is authenticated
-            if current_user:
-                session_router.save_session_data(
-                    user_id=current_user.id,
-                    topic=f"Image Analysis: {image.filename}",
-                    explanation=explanation,
-                    diagram_url=diagram_result["diagram_url"],
-                    audio_url=audio_url,
-                    age=age,
-                    interests=interests
-                )
-            
-            logger.info("🎉 Image analysis multimodal processing completed")
-            
+            shared = await generation_flights.run(
+                image_cache_key,
+                lambda: _compute_image_result(fpath, image_cache_key, age, interests, stream_audio)
+            )
         except Exception as e:
             logger.exception("❌ CrewAI image analysis execution or multimodal generation failed")
             return JSONResponse(
                 status_code=500,
                 content={"error": str(e)}
             )
-        return {"outputs": final_result}
-    elif topic:
-        # Try RAG first for better accuracy and context
-        logger.info("🔍 Using RAG system for enhanced response")
+    else:
+        session_topic = topic
         try:
-            rag_result = rag_system.generate_rag_response(topic, age, interests)
-            
-            # Generate diagram and audio
-            dalle_prefix = "Create a simple, colorful diagram for kids that illustrates: "
-            max_explanation_len = 4000 - len(dalle_prefix)
-            dalle_prompt = dalle_prefix + rag_result["response"][:max_explanation_len]
-            diagram_result = generate_diagram_with_dalle(dalle_prompt)
-            
-            # Truncate explanation for TTS to 4096 characters
-            tts_text = rag_result["response"][:4096]
-            audio_url = generate_audio_with_tts(tts_text)
-            
-            final_result = {
-                "result": rag_result["response"],
-                "diagram_url": diagram_result["diagram_url"],
-                "diagram_error": diagram_result["diagram_error"],
-                "audio_url": audio_url,
-                "sources": [f"RAG: {source['category']} - {source['topic']}" for source in rag_result["sources"]] if rag_result["sources"] else ["Basic Response"],
-                "confidence": rag_result["confidence"],
-                "quiz_id": quiz_id
-            }
-            
-            # Cache the result
-            cache_key = f"{topic}_{age}_{interests}"
-            response_cache[cache_key] = final_result
-            
-            # Generate quiz automatically for authenticated users
-            quiz_id = None
-            if current_user:
-                try:
-                    from .quiz_generator import generate_quiz_from_explanation, save_quiz_to_memory
-                    quiz = generate_quiz_from_explanation(
-                        explanation=rag_result["response"],
-                        topic=topic,
-                        difficulty=DifficultyLevel.MEDIUM,
-                        num_questions=5
-                    )
-                    save_quiz_to_memory(quiz)
-                    quiz_id = quiz.id
-                    logger.info(f"🎯 Generated quiz {quiz_id} for topic: {topic}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to generate quiz: {e}")
-            
-            # Save session data if user is authenticated
-            if current_user:
-                session_router.save_session_data(
-                    user_id=current_user.id,
-                    topic=topic,
-                    explanation=rag_result["response"],
-                    diagram_url=diagram_result["diagram_url"],
-                    audio_url=audio_url,
-                    age=age,
-                    interests=interests
-                )
-            
-            logger.info("🎉 Multimodal processing completed")
+            shared = await generation_flights.run(
+                cache_key,
+                lambda: _compute_topic_result(topic, cache_key, age, interests, stream_audio)
+            )
         except Exception as e:
             logger.exception("❌ CrewAI execution or multimodal generation failed")
             return JSONResponse(
                 status_code=500,
                 content={"error": str(e)}
             )
-        return {"outputs": final_result}
+    
+    # Per-request copy: quiz and session data belong to this user only
+    final_result = await _match_audio_mode({**shared, "quiz_id": None}, stream_audio)
+    
+    # Queue quiz generation in the background for authenticated users
+    final_result["quiz_job_id"] = await run_blocking(_queue_quiz, current_user, final_result["result"], session_topic)
+    
+    # Save session data if user is authenticated
+    if current_user:
+        await run_blocking(
+            session_router.save_session_data,
+            user_id=current_user.id,
+            topic=session_topic,
+            explanation=final_result["result"],
+            diagram_url=final_result["diagram_url"],
+            audio_url=final_result["audio_url"],
+            age=age,
+            interests=interests
+        )
+    
+    return {"outputs": final_result}
+
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _diagram_event(explanation: str) -> tuple:
+    dalle_prefix = "Create a simple, colorful diagram for kids that illustrates: "
+    max_explanation_len = 4000 - len(dalle_prefix)
+    diagram_result, diagram_ms = await _timed(generate_diagram_with_dalle, dalle_prefix + explanation[:max_explanation_len])
+    return "diagram_ready", {**diagram_result, "diagram_ms": diagram_ms}
+
+async def _audio_event(explanation: str, stream_audio: bool) -> tuple:
+    if stream_audio:
+        return "audio_ready", {"audio_url": register_streaming_audio(explanation), "audio_ms": 0.0}
+    audio_url, audio_ms = await _timed(generate_audio_with_tts, explanation[:4096])
+    return "audio_ready", {"audio_url": audio_url, "audio_ms": audio_ms}
+
+async def _quiz_event(job_id: str) -> tuple:
+    job = await job_queue.wait(job_id)
+    result = (job or {}).get("result") or {}
+    return "quiz_ready", {"quiz_id": result.get("quiz_id"), "quiz_job_id": job_id, "error": (job or {}).get("error")}
+
+async def _compute_streamed_topic_result(topic: str, cache_key: str, age: Optional[int], interests: Optional[str],
+                                        stream_audio: bool, emit) -> dict:
+    """Explain a text question token by token through emit(event, payload), then cache the shared result."""
+    start = time.perf_counter()
+    prepared = await run_blocking(rag_system.prepare_rag_prompt, topic, age, interests)
+    if prepared["messages"] is None:
+        explanation = prepared["response"]
+        emit("explanation_delta", {"text": explanation})
+    else:
+        parts = []
+        try:
+            stream = await get_async_openai_client().chat.completions.create(
+                model=RAG_CHAT_MODEL,
+                messages=prepared["messages"],
+                max_tokens=RAG_MAX_TOKENS,
+                temperature=0.7,
+                stream=True,
+                timeout=CHAT_TIMEOUT
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    emit("explanation_delta", {"text": delta})
+            explanation = "".join(parts).strip()
+        except Exception as e:
+            logger.error(f"❌ Streaming completion failed: {e}")
+            explanation = RAG_ERROR_RESPONSE
+            prepared = {**prepared, "sources": [], "confidence": 0.0}
+            emit("explanation_delta", {"text": explanation})
+
+    sources = [f"RAG: {source['category']} - {source['topic']}" for source in prepared["sources"]] if prepared["sources"] else ["Basic Response"]
+    text_ms = round((time.perf_counter() - start) * 1000, 1)
+    emit("explanation_done", {"result": explanation, "sources": sources, "confidence": prepared["confidence"], "text_ms": text_ms})
+
+    final_result = {
+        "result": explanation,
+        "sources": sources,
+        "confidence": prepared["confidence"]
+    }
+    for next_done in asyncio.as_completed([_diagram_event(explanation), _audio_event(explanation, stream_audio)]):
+        event, payload = await next_done
+        final_result.update({k: v for k, v in payload.items() if k != "error"})
+        emit(event, payload)
+    final_result["timings"] = {
+        "diagram_ms": final_result.pop("diagram_ms", None),
+        "audio_ms": final_result.pop("audio_ms", None),
+        "total_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+    await run_blocking(response_cache.set, cache_key, final_result)
+    if semantic_index.enabled:
+        try:
+            await run_blocking(semantic_index.add, topic, age, interests, cache_key)
+        except Exception as e:
+            logger.warning(f"⚠️ Semantic cache update failed: {e}")
+    return final_result
+
+def _shared_result_events(outputs: dict, cached: bool) -> list:
+    """Events for a result this stream did not generate itself (cache hit or a coalesced request)."""
+    return [
+        ("explanation_done", {"result": outputs["result"], "sources": outputs.get("sources"), "confidence": outputs.get("confidence"), "cached": cached}),
+        ("diagram_ready", {"diagram_url": outputs.get("diagram_url"), "diagram_error": outputs.get("diagram_error")}),
+        ("audio_ready", {"audio_url": outputs.get("audio_url")})
+    ]
+
+async def _generate_event_stream(topic: str, age: Optional[int], interests: Optional[str],
+                                 stream_audio: bool, current_user: Optional[UserResponse]):
+    """Stream the explanation token by token, then each artifact as it completes.
+
+    The computation joins generation_flights under the same key as /generate,
+    so identical questions share one answer whichever endpoint asked first; a
+    stream that joins another request's flight gets the explanation in one piece.
+    """
+    cache_key = make_topic_cache_key(topic, age, interests)
+    cached = await run_blocking(response_cache.get, cache_key)
+    if cached is not None:
+        logger.info("🚀 Streaming cached response")
+        outputs = await _match_audio_mode(await run_blocking(_serve_cached, cached), stream_audio)
+        for event, payload in _shared_result_events(outputs, cached=True):
+            yield _sse(event, payload)
+        yield _sse("done", {"outputs": outputs})
+        return
+
+    try:
+        events = asyncio.Queue()
+        flight = asyncio.ensure_future(generation_flights.run(
+            cache_key,
+            lambda: _compute_streamed_topic_result(topic, cache_key, age, interests, stream_audio,
+                                                   lambda event, payload: events.put_nowait((event, payload)))
+        ))
+        led, quiz_job_id, quiz_task = False, None, None
+        while not (flight.done() and events.empty()):
+            next_event = asyncio.ensure_future(events.get())
+            await asyncio.wait({next_event, flight}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                continue
+            event, payload = next_event.result()
+            led = True
+            yield _sse(event, payload)
+            if event == "explanation_done":
+                # The quiz belongs to this user, so it is queued here rather than in the shared flight
+                quiz_job_id = await run_blocking(_queue_quiz, current_user, payload["result"], topic)
+                if quiz_job_id:
+                    yield _sse("quiz_queued", {"quiz_job_id": quiz_job_id})
+                    quiz_task = asyncio.ensure_future(_quiz_event(quiz_job_id))
+
+        shared = flight.result()
+        final_result = {**shared, "quiz_id": None}
+        if not led:
+            logger.info("🤝 Streaming a result shared with a concurrent request")
+            final_result = await _match_audio_mode(final_result, stream_audio)
+            for event, payload in _shared_result_events(final_result, cached=False):
+                yield _sse(event, payload)
+            quiz_job_id = await run_blocking(_queue_quiz, current_user, final_result["result"], topic)
+            if quiz_job_id:
+                yield _sse("quiz_queued", {"quiz_job_id": quiz_job_id})
+                quiz_task = asyncio.ensure_future(_quiz_event(quiz_job_id))
+        if quiz_task is not None:
+            final_result["quiz_job_id"] = quiz_job_id
+            event, payload = await quiz_task
+            final_result.update({k: v for k, v in payload.items() if k != "error"})
+            yield _sse(event, payload)
+
+        if current_user:
+            await run_blocking(
+                session_router.save_session_data,
+                user_id=current_user.id,
+                topic=topic,
+                explanation=final_result["result"],
+                diagram_url=final_result.get("diagram_url"),
+                audio_url=final_result.get("audio_url"),
+                age=age,
+                interests=interests
+            )
+        yield _sse("done", {"outputs": final_result})
+    except Exception as e:
+        logger.exception("❌ Streaming generation failed")
+        yield _sse("error", {"error": str(e)})
+
+@app.post("/generate/stream")
+async def generate_stream(
+    topic: str = Form(..., description="The topic or question to explain"),
+    age: int = Form(None, description="Child's age (optional)"),
+    interests: str = Form(None, description="Comma-separated interests (optional)"),
+    stream_audio: bool = Form(True, description="Return a streaming audio URL instead of waiting for TTS"),
+    current_user: Optional[UserResponse] = Depends(get_optional_user)
+):
+    """
+    Server-sent-events variant of /generate for text questions.
+
+    Emits explanation_delta events with the explanation as it is generated,
+    then explanation_done, diagram_ready, audio_ready and (for logged-in
+    users) quiz_ready as each artifact finishes, and finally done.
+    """
+    return StreamingResponse(
+        _generate_event_stream(topic, age, interests, stream_audio, current_user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -814,7 +1156,8 @@ async def quiz_page():
 
 @app.get("/debug", response_class=HTMLResponse)
 async def debug_page():
-    """Simple debug page to view memory storage data."""
+    """Simple debug page to view storage data."""
+    counts = storage.counts()
     html_content = f"""
     <!DOCTYPE html>
     <html>
@@ -835,11 +1178,11 @@ async def debug_page():
         <div class="section">
             <h2>📊 Storage Statistics</h2>
             <div class="stats">
-                <p><strong>Total Users:</strong> {len(memory_storage.users)}</p>
-                <p><strong>Total Sessions:</strong> {sum(len(sessions) for sessions in memory_storage.sessions.values())}</p>
-                <p><strong>Total Quizzes:</strong> {len(memory_storage.quizzes)}</p>
-                <p><strong>Total Quiz Attempts:</strong> {sum(len(attempts) for attempts in memory_storage.quiz_attempts.values())}</p>
-                <p><strong>Cache Size:</strong> {len(response_cache)}</p>
+                <p><strong>Total Users:</strong> {counts["users"]}</p>
+                <p><strong>Total Sessions:</strong> {counts["sessions"]}</p>
+                <p><strong>Total Quizzes:</strong> {counts["quizzes"]}</p>
+                <p><strong>Total Quiz Attempts:</strong> {counts["attempts"]}</p>
+                <p><strong>Cache Size:</strong> {response_cache.stats()["entries"]} (hit rate {response_cache.stats()["hit_rate"]:.0%})</p>
             </div>
         </div>
 
@@ -857,14 +1200,14 @@ async def debug_page():
         <div class="section">
             <h2>👥 Registered Users</h2>
             <div id="users">
-                {chr(10).join(f'<div class="user"><strong>{user.username}</strong> ({user.email}) - Age: {user.age or "N/A"} - Interests: {user.interests or "N/A"}</div>' for user in memory_storage.users.values())}
+                {chr(10).join(f'<div class="user"><strong>{user.username}</strong> ({user.email}) - Age: {user.age or "N/A"} - Interests: {user.interests or "N/A"}</div>' for user in storage.list_users())}
             </div>
         </div>
 
         <div class="section">
             <h2>📝 Recent Sessions</h2>
             <div id="sessions">
-                {chr(10).join(f'<div class="session"><strong>{session.topic}</strong> - {session.timestamp.strftime("%Y-%m-%d %H:%M") if session.timestamp else "No timestamp"}</div>' for sessions in memory_storage.sessions.values() for session in sessions[-5:])}
+                {chr(10).join(f'<div class="session"><strong>{session.topic}</strong> - {session.timestamp.strftime("%Y-%m-%d %H:%M") if session.timestamp else "No timestamp"}</div>' for sessions in storage.sessions_by_user().values() for session in sessions[-5:])}
             </div>
         </div>
 
@@ -896,7 +1239,7 @@ async def debug_page():
 @app.get("/rag/stats", response_class=JSONResponse)
 async def get_rag_stats():
     """Get RAG system statistics."""
-    return rag_system.get_knowledge_stats()
+    return await run_blocking(rag_system.get_knowledge_stats)
 
 @app.post("/rag/add", response_class=JSONResponse)
 async def add_knowledge(
@@ -906,16 +1249,42 @@ async def add_knowledge(
     age_group: str = Form("6-12", description="Age group (6-8, 9-12, 6-12)")
 ):
     """Add new knowledge to the RAG system."""
-    success = rag_system.add_knowledge(content, category, topic, age_group)
+    success = await run_blocking(rag_system.add_knowledge, content, category, topic, age_group)
     if success:
         return {"message": "Knowledge added successfully", "topic": topic, "category": category}
     else:
         raise HTTPException(status_code=500, detail="Failed to add knowledge")
 
+@app.post("/rag/ingest", response_class=JSONResponse)
+async def ingest_knowledge(
+    files: List[UploadFile] = File(..., description="JSONL or Markdown files"),
+    category: Optional[str] = Form(None, description="Default category for records that do not set one"),
+    age_group: str = Form("6-12", description="Default age group"),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Bulk-load passages into the RAG knowledge base; re-sent passages are skipped."""
+    if current_user.role not in (UserRole.TEACHER, UserRole.PARENT):
+        raise HTTPException(status_code=403, detail="Only teachers and parents can ingest knowledge")
+    
+    uploads = []
+    for upload in files:
+        try:
+            uploads.append((upload.filename or "", (await upload.read()).decode("utf-8-sig")))
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail=f"{upload.filename} is not UTF-8 text")
+    defaults = {"age_group": age_group, **({"category": category} if category else {})}
+    try:
+        report = await run_blocking(ingest_texts, uploads, defaults)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    logger.info(f"📚 Ingested {report['upserted']} chunks from {len(uploads)} files ({report['chunks_per_second']}/s)")
+    return report
+
 @app.get("/rag/search", response_class=JSONResponse)
 async def search_knowledge(query: str):
     """Search the RAG knowledge base."""
-    contexts = rag_system.retrieve_relevant_context(query)
+    # Embedding the query and the vector search both block
+    contexts = await run_blocking(rag_system.retrieve_relevant_context, query)
     return {
         "query": query,
         "results": contexts,
@@ -923,17 +1292,24 @@ async def search_knowledge(query: str):
     }
 
 @app.get("/quizzes/available", response_class=JSONResponse)
-async def get_available_quizzes(current_user: UserResponse = Depends(get_current_user)):
-    """Get all available quizzes for the current user."""
+async def get_available_quizzes(
+    limit: int = Query(QUIZ_PAGE_DEFAULT, ge=1, le=QUIZ_PAGE_MAX),
+    cursor: Optional[str] = None,
+    topic: Optional[str] = None,
+    difficulty: Optional[DifficultyLevel] = None,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Get a page of available quizzes (newest first) with the user's completion status."""
     try:
-        # Get all quizzes from memory storage
-        quizzes = list(memory_storage.quizzes.values())
-        
-        # Get user's quiz attempts to show completion status
-        user_attempts = memory_storage.quiz_attempts.get(current_user.id, [])
-        attempted_quiz_ids = {attempt.quiz_id for attempt in user_attempts}
+        quizzes, next_cursor = storage.page_quizzes(
+            limit, cursor=cursor, topic=topic, difficulty=difficulty.value if difficulty else None
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        # Completion status only for the quizzes on this page
+        completed = storage.completed_quiz_ids(current_user.id, [quiz.id for quiz in quizzes])
         
-        # Add completion status to each quiz
         quiz_data = []
         for quiz in quizzes:
             quiz_info = {
@@ -943,11 +1319,12 @@ async def get_available_quizzes(current_user: UserResponse = Depends(get_current
                 "difficulty": quiz.difficulty.value,
                 "num_questions": len(quiz.questions),
                 "estimated_time": quiz.estimated_time,
-                "completed": quiz.id in attempted_quiz_ids
+                "created_at": quiz.created_at.isoformat(),
+                "completed": quiz.id in completed
             }
             quiz_data.append(quiz_info)
         
-        return {"quizzes": quiz_data}
+        return {"quizzes": quiz_data, "next_cursor": next_cursor}
     except Exception as e:
         return JSONResponse(
             status_code=500,
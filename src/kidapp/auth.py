@@ -2,24 +2,42 @@
 Authentication system for WonderBot
 """
 
+import os
 import hashlib
 import secrets
 import uuid
 import re
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, List, Dict, Any, Tuple
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import ValidationError
 import jwt
 
-from .models import UserCreate, UserResponse, UserLogin, memory_storage
+from .models import UserCreate, UserResponse, UserLogin
+from .storage import storage, DuplicateUserError
+from .password_hashing import password_hasher
+
+logger = logging.getLogger(__name__)
 
 # JWT Configuration
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Verified-token cache
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+# Bulk registration limits
+BULK_REGISTER_MAX_ROWS = int(os.getenv("BULK_REGISTER_MAX_ROWS", "500"))
+
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 def validate_password_strength(password: str) -> dict:
     """Validate password strength and return detailed feedback."""
@@ -55,12 +73,12 @@ def validate_password_strength(password: str) -> dict:
     }
 
 def hash_password(password: str) -> str:
-    """Hash a password using SHA-256."""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash a password with scrypt (blocking; use password_hasher.hash_async from handlers)."""
+    return password_hasher.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return hash_password(plain_password) == hashed_password
+    """Verify a password against its hash (blocking)."""
+    return password_hasher.verify(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
@@ -82,45 +100,147 @@ def verify_token(token: str) -> Optional[dict]:
     except jwt.PyJWTError:
         return None
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserResponse:
-    """Get the current user from the JWT token."""
-    token = credentials.credentials
-    print(f"DEBUG: Token received: {token[:20]}...")  # Show first 20 chars
-    
+def _token_id(token: str) -> str:
+    """Storage key for a token, so raw bearer tokens are never written to disk."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+class TokenCache:
+    """Bounded LRU of verified tokens -> (user_id, exp) that expire with the token.
+
+    Revocations are written to the shared storage backend, so a token logged
+    out on one worker is refused by every worker, including on a cache hit.
+    Revoked tokens are refused until their own expiry, after which the JWT
+    check rejects them anyway. This process's revocations are also kept
+    locally so its own repeat checks skip storage.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[str]:
+        """Return the user id of a cached, unexpired and unrevoked token."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+        if self.is_revoked(token):
+            with self._lock:
+                self._entries.pop(token, None)
+                self.misses += 1
+            return None
+        with self._lock:
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, user_id: str, exp: float) -> None:
+        with self._lock:
+            if token in self._revoked:
+                return
+            self._entries[token] = (user_id, exp)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke(self, token: str, exp: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._entries.pop(token, None)
+            self._revoked[token] = exp
+            # Expired tokens fail verification on their own; drop them from the list
+            for revoked, revoked_exp in list(self._revoked.items()):
+                if revoked_exp <= now:
+                    del self._revoked[revoked]
+        storage.revoke_token(_token_id(token), exp)
+
+    def is_revoked(self, token: str) -> bool:
+        with self._lock:
+            if token in self._revoked:
+                return True
+        return storage.is_token_revoked(_token_id(token))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._revoked.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "revoked": len(self._revoked),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+# Global verified-token cache
+token_cache = TokenCache()
+
+def _credentials_error(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def resolve_token(token: str) -> str:
+    """Return the user id a token was issued for, using the cache when possible."""
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
+    if token_cache.is_revoked(token):
+        logger.info("auth.token_rejected reason=revoked")
+        raise _credentials_error()
     payload = verify_token(token)
     if payload is None:
-        print("DEBUG: Token verification failed")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    print(f"DEBUG: Token payload: {payload}")
-    
+        logger.info("auth.token_rejected reason=invalid")
+        raise _credentials_error()
     user_id = payload.get("sub")
     if user_id is None:
-        print("DEBUG: No 'sub' field in token payload")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    print(f"DEBUG: Looking for user with ID: {user_id}")
-    user = memory_storage.users.get(user_id)
+        logger.info("auth.token_rejected reason=missing_sub")
+        raise _credentials_error()
+
+    token_cache.put(token, user_id, float(payload["exp"]))
+    return user_id
+
+def revoke_token(token: str) -> None:
+    """Add a token to the revocation list until it expires."""
+    payload = verify_token(token)
+    if payload is not None:
+        token_cache.revoke(token, float(payload["exp"]))
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserResponse:
+    """Get the current user from the JWT token."""
+    user_id = resolve_token(credentials.credentials)
+    user = storage.get_user(user_id)
     if user is None:
-        print(f"DEBUG: User not found in memory storage. Available users: {list(memory_storage.users.keys())}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    print(f"DEBUG: User found: {user.username}")
+        logger.info("auth.token_rejected reason=unknown_user user_id=%s", user_id)
+        raise _credentials_error("User not found")
+    logger.debug("auth.token_accepted user_id=%s", user_id)
     return user
 
-def register_user(user_data: UserCreate) -> UserResponse:
+def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Optional[UserResponse]:
+    """Get the current user if a valid token was sent, otherwise None."""
+    if credentials is None:
+        return None
+    try:
+        return get_current_user(credentials)
+    except HTTPException:
+        return None
+
+async def register_user(user_data: UserCreate) -> UserResponse:
     """Register a new user."""
     # Validate password strength
     password_validation = validate_password_strength(user_data.password)
@@ -133,22 +253,22 @@ def register_user(user_data: UserCreate) -> UserResponse:
             detail=error_message
         )
     
-    # Check if username already exists
-    for user in memory_storage.users.values():
-        if user.username == user_data.username:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already registered"
-            )
-        if user.email == user_data.email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
+    # Check if username already exists (O(1) index lookups; this is only a fast
+    # path before hashing, add_user below is the authoritative atomic check)
+    if storage.get_user_by_username(user_data.username):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already registered"
+        )
+    if storage.get_user_by_email(user_data.email):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
     # Create new user
     user_id = str(uuid.uuid4())
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await password_hasher.hash_async(user_data.password)
     
     new_user = UserResponse(
         id=user_id,
@@ -161,48 +281,141 @@ def register_user(user_data: UserCreate) -> UserResponse:
         last_login=None
     )
     
-    # Store user with hashed password (in production, use a proper database)
-    memory_storage.users[user_id] = new_user
-    # Store password hash separately (in production, use a proper database)
-    if not hasattr(memory_storage, 'password_hashes'):
-        memory_storage.password_hashes = {}
-    memory_storage.password_hashes[user_id] = hashed_password
+    # Store user with hashed password; the backend rejects a concurrent duplicate
+    try:
+        storage.add_user(new_user, hashed_password)
+    except DuplicateUserError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     return new_user
 
-def authenticate_user(login_data: UserLogin) -> Optional[UserResponse]:
+def _validation_messages(error: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()]
+
+def _validate_bulk_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Validate every row in one pass, checking duplicates within the batch and against storage."""
+    seen_usernames = set()
+    seen_emails = set()
+    checked = []
+    for index, row in enumerate(rows, start=1):
+        result: Dict[str, Any] = {"row": index, "username": row.get("username") if isinstance(row, dict) else None}
+        errors: List[str] = []
+        user_data = None
+        if not isinstance(row, dict):
+            errors.append("Row must be an object")
+        else:
+            # csv.DictReader files cells past the header under a None key
+            if any(not isinstance(key, str) for key in row):
+                errors.append("Unexpected extra columns")
+            # CSV cells are strings; treat empty optional cells as missing
+            values = {key: value for key, value in row.items() if isinstance(key, str) and value not in ("", None)}
+            try:
+                user_data = UserCreate(**values)
+            except ValidationError as e:
+                errors.extend(_validation_messages(e))
+            except TypeError as e:
+                errors.append(str(e))
+
+        if user_data is not None:
+            password_validation = validate_password_strength(user_data.password)
+            errors.extend(password_validation["errors"])
+            if user_data.username in seen_usernames or storage.get_user_by_username(user_data.username):
+                errors.append("Username already registered")
+            if user_data.email in seen_emails or storage.get_user_by_email(user_data.email):
+                errors.append("Email already registered")
+            seen_usernames.add(user_data.username)
+            seen_emails.add(user_data.email)
+
+        result["errors"] = errors
+        result["user_data"] = None if errors else user_data
+        checked.append(result)
+    return checked
+
+async def register_users_bulk(rows: List[Dict[str, Any]]) -> dict:
+    """Register a batch of users and return a result for every row.
+
+    Rows are validated up front, passwords for the valid rows are hashed on the
+    password-hash pool, and all valid users are inserted in one transaction.
+    Invalid rows are reported without preventing the others from being created.
+    """
+    if len(rows) > BULK_REGISTER_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many rows: at most {BULK_REGISTER_MAX_ROWS} users per request"
+        )
+
+    checked = _validate_bulk_rows(rows)
+    valid = [result for result in checked if result["user_data"] is not None]
+
+    hashes = await asyncio.gather(*(password_hasher.hash_async(result["user_data"].password) for result in valid))
+
+    now = datetime.now(timezone.utc)
+    new_users = []
+    for result in valid:
+        user_data = result["user_data"]
+        new_users.append(UserResponse(
+            id=str(uuid.uuid4()),
+            username=user_data.username,
+            email=user_data.email,
+            age=user_data.age,
+            interests=user_data.interests,
+            role=user_data.role,
+            created_at=now,
+            last_login=None
+        ))
+    # A concurrent registration may still have taken a name since validation
+    conflicts = storage.add_users(list(zip(new_users, hashes)))
+
+    for result, user, conflict in zip(valid, new_users, conflicts):
+        if conflict:
+            result["errors"].append(f"{conflict} already registered")
+        else:
+            result["user"] = user
+
+    results = []
+    for result in checked:
+        result.pop("user_data")
+        result["status"] = "error" if result["errors"] else "created"
+        results.append(result)
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+async def authenticate_user(login_data: UserLogin) -> Optional[UserResponse]:
     """Authenticate a user with username and password."""
     # Find user by username
-    user = None
-    for u in memory_storage.users.values():
-        if u.username == login_data.username:
-            user = u
-            break
+    user = storage.get_user_by_username(login_data.username)
     
     if not user:
-        print(f"DEBUG: User '{login_data.username}' not found")
+        # Do the same KDF work as a real check so timing doesn't reveal whether the username exists
+        await password_hasher.verify_async(login_data.password, password_hasher.dummy_hash)
+        logger.info("auth.login_failed reason=unknown_user username=%s", login_data.username)
         return None
     
     # Verify password against stored hash
-    if not hasattr(memory_storage, 'password_hashes'):
-        memory_storage.password_hashes = {}
-    
-    stored_hash = memory_storage.password_hashes.get(user.id)
+    stored_hash = storage.get_password_hash(user.id)
     if not stored_hash:
-        print(f"DEBUG: No password hash found for user '{login_data.username}'")
+        await password_hasher.verify_async(login_data.password, password_hasher.dummy_hash)
+        logger.warning("auth.login_failed reason=missing_hash user_id=%s", user.id)
         return None
     
-    if verify_password(login_data.password, stored_hash):
-        print(f"DEBUG: Password verified for user '{login_data.username}'")
+    if await password_hasher.verify_async(login_data.password, stored_hash):
+        logger.debug("auth.login_succeeded user_id=%s", user.id)
+        if password_hasher.needs_rehash(stored_hash):
+            # Upgrade legacy SHA-256 (or outdated-cost) hashes now that we have the password
+            storage.set_password_hash(user.id, await password_hasher.hash_async(login_data.password))
+            password_hasher.record_upgrade()
+            logger.info("auth.password_rehashed user_id=%s", user.id)
         return user
-    else:
-        print(f"DEBUG: Password verification failed for user '{login_data.username}'")
+    logger.info("auth.login_failed reason=bad_password user_id=%s", user.id)
     
     return None
 
-def login_user(login_data: UserLogin) -> dict:
+async def login_user(login_data: UserLogin) -> dict:
     """Login a user and return access token."""
-    user = authenticate_user(login_data)
+    user = await authenticate_user(login_data)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -212,7 +425,7 @@ def login_user(login_data: UserLogin) -> dict:
     
     # Update last login
     user.last_login = datetime.now(timezone.utc)
-    memory_storage.users[user.id] = user
+    storage.update_user(user)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -0,0 +1,231 @@
+"""
+Bounded response cache for WonderBot
+
+Entries are JSON-serialized, carry a per-entry TTL and are evicted in LRU
+order once the entry-count or byte budget is exceeded. The storage backend is
+pluggable: the in-process backend is private to one worker, while the SQLite
+backend lives on disk and is shared by every uvicorn worker on the host.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# ——— Configuration (overridable from the environment) ———
+CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(os.getcwd(), "cache", "responses.sqlite3"))
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 60 * 60)))
+
+class MemoryCacheBackend:
+    """In-process LRU store of serialized entries."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, payload: str, expires_at: float) -> int:
+        """Store an entry and return the number of entries evicted to make room."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = (payload, expires_at)
+            self._bytes += len(payload)
+
+            evicted = 0
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (old_payload, _) = self._entries.popitem(last=False)
+                self._bytes -= len(old_payload)
+                evicted += 1
+            return evicted
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+class SQLiteCacheBackend:
+    """On-disk LRU store shared by all worker processes on a host."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_access ON response_cache(last_access)")
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE response_cache SET last_access = ? WHERE key = ?", (time.time(), key)
+                )
+            return row
+
+    def set(self, key: str, payload: str, expires_at: float) -> int:
+        """Store an entry and return the number of entries evicted to make room."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, payload, size, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), expires_at, time.time())
+                )
+                evicted = 0
+                count, total = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache"
+                ).fetchone()
+                if count > self.max_entries or total > self.max_bytes:
+                    rows = self._conn.execute(
+                        "SELECT key, size FROM response_cache WHERE key != ? ORDER BY last_access", (key,)
+                    ).fetchall()
+                    victims = []
+                    for victim_key, victim_size in rows:
+                        if count <= self.max_entries and total <= self.max_bytes:
+                            break
+                        victims.append((victim_key,))
+                        count -= 1
+                        total -= victim_size
+                    self._conn.executemany("DELETE FROM response_cache WHERE key = ?", victims)
+                    evicted = len(victims)
+                self._conn.execute("COMMIT")
+                return evicted
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+
+    def size(self) -> Dict[str, int]:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache"
+            ).fetchone()
+            return {"entries": count, "bytes": total}
+
+class ResponseCache:
+    """TTL + LRU cache for generated responses with hit/miss/eviction counters."""
+
+    def __init__(self, backend, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a copy of the cached value, or None on a miss or expired entry."""
+        entry = self.backend.get(key)
+        if entry is None:
+            self._count("misses")
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.time():
+            self.backend.delete(key)
+            self._count("expirations")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(payload)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Cache a JSON-serializable value."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        payload = json.dumps(value, default=str)
+        evicted = self.backend.set(key, payload, time.time() + ttl)
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size, budget and counter statistics."""
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "backend": self.backend.name,
+            **self.backend.size(),
+            "max_entries": self.backend.max_entries,
+            "max_bytes": self.backend.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0
+        }
+
+def create_response_cache(backend: str = CACHE_BACKEND, path: str = CACHE_PATH,
+                          max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES,
+                          ttl_seconds: float = CACHE_TTL_SECONDS) -> ResponseCache:
+    """Build a response cache for the configured backend."""
+    if backend == "sqlite":
+        store = SQLiteCacheBackend(path, max_entries, max_bytes)
+    elif backend == "memory":
+        store = MemoryCacheBackend(max_entries, max_bytes)
+    else:
+        raise ValueError(f"Unknown response cache backend: {backend}")
+    return ResponseCache(store, ttl_seconds)
+
+# Global response cache instance
+response_cache = create_response_cache()
@@ -0,0 +1,156 @@
+"""
+Cache key normalization for WonderBot
+
+Questions that differ only in case, spacing, punctuation or contractions map
+to the same cache key, interests are put in a canonical order and ages are
+bucketed into the same groups the RAG prompt uses. An optional embedding
+index can additionally match paraphrased questions to a cached answer; it
+embeds through the knowledge base's shared embedder and query-embedding cache.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+CONTRACTIONS = {
+    "what's": "what is",
+    "whats": "what is",
+    "who's": "who is",
+    "where's": "where is",
+    "when's": "when is",
+    "why's": "why is",
+    "how's": "how is",
+    "it's": "it is",
+    "that's": "that is",
+    "there's": "there is",
+    "what're": "what are",
+    "how're": "how are",
+    "don't": "do not",
+    "doesn't": "does not",
+    "can't": "cannot",
+    "isn't": "is not",
+    "aren't": "are not",
+}
+
+_APOSTROPHES = re.compile(r"[‘’ʼ`]")
+# Only sentence-final punctuation is folded: "2+2", "2-2" and "2.5" must stay distinct questions
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+_WHITESPACE = re.compile(r"\s+")
+
+def age_group_for(age: Optional[int]) -> str:
+    """Bucket an age into the 6-8 / 9-12 / 6-12 groups used by the RAG prompt."""
+    return "6-8" if age and age <= 8 else "9-12" if age and age <= 12 else "6-12"
+
+def normalize_topic(topic: str) -> str:
+    """Fold case, unicode, whitespace, apostrophes, trailing ?/!/. and common contractions."""
+    text = unicodedata.normalize("NFKC", topic or "").lower()
+    text = _APOSTROPHES.sub("'", text)
+    text = _TRAILING_PUNCTUATION.sub("", text)
+    words = [CONTRACTIONS.get(word, word) for word in text.split()]
+    text = " ".join(word.strip("'") for word in words)
+    return _WHITESPACE.sub(" ", text).strip()
+
+def canonical_interests(interests: Optional[str]) -> str:
+    """Return comma-separated interests lower-cased, de-duplicated and sorted."""
+    if not interests:
+        return ""
+    items = {_WHITESPACE.sub(" ", item).strip().lower() for item in interests.split(",")}
+    return ",".join(sorted(item for item in items if item))
+
+def make_topic_cache_key(topic: str, age: Optional[int] = None, interests: Optional[str] = None) -> str:
+    """Build the response-cache key for a text question."""
+    return f"topic:{normalize_topic(topic)}|age:{age_group_for(age)}|interests:{canonical_interests(interests)}"
+
+def make_image_cache_key(image_md5: str, age: Optional[int] = None, interests: Optional[str] = None) -> str:
+    """Build the response-cache key for an uploaded image."""
+    return f"image:{image_md5}|age:{age_group_for(age)}|interests:{canonical_interests(interests)}"
+
+# ——— Optional semantic lookup ———
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_TOPICS = int(os.getenv("SEMANTIC_CACHE_MAX_TOPICS", "5000"))
+
+class SemanticTopicIndex:
+    """Embedding index over answered topics that maps paraphrases to an existing cache key."""
+
+    def __init__(self, enabled: bool = SEMANTIC_CACHE_ENABLED, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_topics: int = SEMANTIC_CACHE_MAX_TOPICS, embeddings=None):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_topics = max_topics
+        # EmbeddingCache to use; defaults to the shared one from embeddings.get_query_embeddings()
+        self._embeddings = embeddings
+        # (age group, interests) -> OrderedDict[normalized topic -> (cache key, unit vector)]
+        self._entries = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+
+    def _embed(self, normalized: str):
+        if self._embeddings is None:
+            from .embeddings import get_query_embeddings
+            self._embeddings = get_query_embeddings()
+        return self._embeddings.embed(normalized)
+
+    def lookup(self, topic: str, age: Optional[int] = None, interests: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """Return (cache key, similarity) of the closest answered topic above the threshold."""
+        if not self.enabled:
+            return None
+        import numpy as np
+
+        bucket = (age_group_for(age), canonical_interests(interests))
+        with self._lock:
+            candidates = list(self._entries.get(bucket, {}).values())
+            self.lookups += 1
+        if not candidates:
+            return None
+
+        query = self._embed(normalize_topic(topic))
+        matrix = np.stack([vector for _, vector in candidates])
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if float(scores[best]) < self.threshold:
+            return None
+        with self._lock:
+            self.hits += 1
+        return candidates[best][0], float(scores[best])
+
+    def add(self, topic: str, age: Optional[int], interests: Optional[str], cache_key: str) -> None:
+        """Record an answered topic under its cache key."""
+        if not self.enabled:
+            return
+        normalized = normalize_topic(topic)
+        vector = self._embed(normalized)
+        bucket = (age_group_for(age), canonical_interests(interests))
+        with self._lock:
+            entries = self._entries.setdefault(bucket, OrderedDict())
+            if normalized not in entries:
+                self._size += 1
+            entries[normalized] = (cache_key, vector)
+            entries.move_to_end(normalized)
+            while self._size > self.max_topics:
+                largest_bucket = max(self._entries, key=lambda b: len(self._entries[b]))
+                self._entries[largest_bucket].popitem(last=False)
+                self._size -= 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "topics": self._size,
+                "lookups": self.lookups,
+                "hits": self.hits
+            }
+
+# Global semantic index instance
+semantic_index = SemanticTopicIndex()
@@ -0,0 +1,325 @@
+"""
+Embedding backends for WonderBot's knowledge base
+
+RAG_EMBEDDING_BACKEND selects how documents and questions are embedded:
+
+- "local":  all-MiniLM-L6-v2 through sentence-transformers when installed,
+            otherwise the same model as the ONNX build that ships with chromadb
+- "openai": the OpenAI embeddings API
+- "hash":   a deterministic feature-hashing embedder with no model or network,
+            for tests and offline development
+
+Every backend returns L2-normalized float32 rows, so a vector store's
+distances convert directly to cosine similarity. Raw cosine ranges differ a
+lot between models, so each backend also carries a floor/ceiling used to
+calibrate similarities onto 0..1 before the relevance threshold is applied.
+
+Query vectors are cached by (model, normalized text) in a byte-bounded
+in-memory LRU in front of a SQLite table of float32 blobs, so recurring
+questions are embedded once and stay embedded across restarts.
+get_embedder() and get_query_embeddings() hand out one shared instance of each
+per process, for the knowledge base and the semantic response cache alike.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ——— Configuration (overridable from the environment) ———
+RAG_EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "local")
+RAG_LOCAL_EMBEDDING_MODEL = os.getenv("RAG_LOCAL_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+RAG_OPENAI_EMBEDDING_MODEL = os.getenv("RAG_OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+RAG_HASH_EMBEDDING_DIM = int(os.getenv("RAG_HASH_EMBEDDING_DIM", "1024"))
+RAG_EMBEDDING_BATCH_SIZE = int(os.getenv("RAG_EMBEDDING_BATCH_SIZE", "64"))
+# Empty path keeps the query-embedding cache in memory only
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(os.getcwd(), "cache", "embeddings.sqlite3"))
+EMBEDDING_CACHE_MEMORY_BYTES = int(os.getenv("EMBEDDING_CACHE_MEMORY_BYTES", str(16 * 1024 * 1024)))
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "by", "for", "with", "from", "is", "are",
+    "was", "were", "be", "it", "its", "that", "this", "what", "why", "how", "who", "where", "when", "do",
+    "does", "can", "you", "me", "my", "i", "tell", "about", "they", "their", "there", "as", "so",
+}
+
+def _normalize_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+def cosine_from_distance(distance: float, space: str = "l2") -> float:
+    """Cosine similarity from a Chroma distance between unit vectors.
+
+    Chroma's "l2" space reports squared euclidean distance (2 - 2cos); the
+    "cosine" and "ip" spaces report 1 - cos.
+    """
+    if space == "l2":
+        return 1.0 - distance / 2.0
+    return 1.0 - distance
+
+class Embedder:
+    """Base class: turns texts into unit-length float32 rows."""
+
+    name = "base"
+    # Identifies the vectors a backend produces (backend plus model) for caching
+    model_id = "base"
+    # Typical cosine of an unrelated pair and of a clearly relevant pair
+    similarity_floor = 0.0
+    similarity_ceiling = 1.0
+
+    def _embed_batch(self, texts: List[str]):
+        raise NotImplementedError
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in batches of RAG_EMBEDDING_BATCH_SIZE; returns an (n, dim) array."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        batches = [
+            _normalize_rows(self._embed_batch(texts[start:start + RAG_EMBEDDING_BATCH_SIZE]))
+            for start in range(0, len(texts), RAG_EMBEDDING_BATCH_SIZE)
+        ]
+        return np.vstack(batches)
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    def calibrate(self, cosine: float) -> float:
+        """Map a raw cosine similarity onto 0..1 for this model."""
+        span = self.similarity_ceiling - self.similarity_floor
+        return round(float(np.clip((cosine - self.similarity_floor) / span, 0.0, 1.0)), 4)
+
+class HashEmbedder(Embedder):
+    """Deterministic signed feature hashing of word unigrams and bigrams."""
+
+    name = "hash"
+    similarity_floor = float(os.getenv("RAG_HASH_SIMILARITY_FLOOR", "0.05"))
+    similarity_ceiling = float(os.getenv("RAG_HASH_SIMILARITY_CEILING", "0.35"))
+
+    def __init__(self, dim: int = RAG_HASH_EMBEDDING_DIM):
+        self.dim = dim
+        self.model_id = f"hash:{dim}"
+
+    @staticmethod
+    def _features(text: str) -> List[tuple]:
+        words = []
+        for word in _TOKEN.findall(text.lower()):
+            if word in _STOPWORDS:
+                continue
+            # Crude plural folding so "planets" and "planet" share a feature
+            words.append(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word)
+        return [(word, 1.0) for word in words] + [(f"{a} {b}", 0.5) for a, b in zip(words, words[1:])]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                matrix[row, digest % self.dim] += weight if digest >> 63 else -weight
+        return matrix
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI embeddings API, one request per batch."""
+
+    name = "openai"
+    similarity_floor = float(os.getenv("RAG_OPENAI_SIMILARITY_FLOOR", "0.15"))
+    similarity_ceiling = float(os.getenv("RAG_OPENAI_SIMILARITY_CEILING", "0.6"))
+
+    def __init__(self, model: str = RAG_OPENAI_EMBEDDING_MODEL):
+        self.model = model
+        self.model_id = f"openai:{model}"
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        from .openai_clients import get_openai_client, EMBEDDING_TIMEOUT
+
+        response = get_openai_client().embeddings.create(model=self.model, input=texts, timeout=EMBEDDING_TIMEOUT)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+class LocalEmbedder(Embedder):
+    """A local sentence-embedding model, loaded on first use."""
+
+    name = "local"
+    similarity_floor = float(os.getenv("RAG_LOCAL_SIMILARITY_FLOOR", "0.1"))
+    similarity_ceiling = float(os.getenv("RAG_LOCAL_SIMILARITY_CEILING", "0.6"))
+
+    def __init__(self, model: str = RAG_LOCAL_EMBEDDING_MODEL):
+        self.model = model
+        self.model_id = f"local:{model}"
+        self._encode = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._encode is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    encoder = SentenceTransformer(self.model)
+                    self._encode = lambda texts: encoder.encode(texts, batch_size=len(texts), show_progress_bar=False)
+                    logger.info(f"🧠 Loaded sentence-transformers model {self.model}")
+                except ImportError:
+                    # chromadb bundles an ONNX build of all-MiniLM-L6-v2
+                    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+                    self._encode = DefaultEmbeddingFunction()
+                    logger.info("🧠 Using chromadb's bundled ONNX MiniLM embedder")
+        return self._encode
+
+    def _embed_batch(self, texts: List[str]):
+        return self._load()(texts)
+
+EMBEDDERS = {"local": LocalEmbedder, "openai": OpenAIEmbedder, "hash": HashEmbedder}
+
+def create_embedder(backend: Optional[str] = None) -> Embedder:
+    """Build the configured embedding backend."""
+    backend = (backend or RAG_EMBEDDING_BACKEND).lower()
+    if backend not in EMBEDDERS:
+        raise ValueError(f"Unknown RAG_EMBEDDING_BACKEND {backend!r}; expected one of {sorted(EMBEDDERS)}")
+    return EMBEDDERS[backend]()
+
+class EmbeddingCache:
+    """Caches query embeddings by (model, normalized text): memory LRU over SQLite float32 blobs."""
+
+    def __init__(self, embedder: Embedder, path: str = EMBEDDING_CACHE_PATH,
+                 memory_bytes: int = EMBEDDING_CACHE_MEMORY_BYTES, max_rows: int = EMBEDDING_CACHE_MAX_ROWS):
+        self.embedder = embedder
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_size = 0
+        self._conn = None
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS query_embeddings (
+                    model TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (model, text)
+                ) WITHOUT ROWID"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_query_embeddings_access ON query_embeddings(last_access)")
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """Insert into the memory LRU, evicting the oldest vectors past the byte budget. Caller holds the lock."""
+        if key not in self._memory:
+            self._memory_size += vector.nbytes
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= evicted.nbytes
+
+    def _load(self, text: str) -> Optional[np.ndarray]:
+        row = self._conn.execute(
+            "SELECT vector FROM query_embeddings WHERE model = ? AND text = ?", (self.embedder.model_id, text)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE query_embeddings SET last_access = ? WHERE model = ? AND text = ?",
+            (time.time(), self.embedder.model_id, text)
+        )
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def _store(self, text: str, vector: np.ndarray) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO query_embeddings (model, text, vector, last_access) VALUES (?, ?, ?, ?)",
+            (self.embedder.model_id, text, vector.astype(np.float32).tobytes(), time.time())
+        )
+        self._writes += 1
+        # Trim occasionally rather than counting rows on every write
+        if self._writes % 1000 == 0:
+            self._conn.execute(
+                "DELETE FROM query_embeddings WHERE last_access <= ("
+                "SELECT last_access FROM query_embeddings ORDER BY last_access DESC LIMIT 1 OFFSET ?)",
+                (self.max_rows,)
+            )
+
+    def embed(self, text: str) -> np.ndarray:
+        """Unit-length embedding of a query, computed at most once per model and normalized text."""
+        from .cache_keys import normalize_topic
+
+        normalized = normalize_topic(text) or text
+        key = f"{self.embedder.model_id}|{normalized}"
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+            vector = self._load(normalized) if self._conn is not None else None
+            if vector is not None:
+                self.disk_hits += 1
+                self._remember(key, vector)
+                return vector
+            self.misses += 1
+        vector = self.embedder.embed_one(normalized)
+        with self._lock:
+            self._remember(key, vector)
+            if self._conn is not None:
+                self._store(normalized, vector)
+        return vector
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM query_embeddings")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            stored = self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0] if self._conn else 0
+            return {
+                "model": self.embedder.model_id,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "stored_entries": stored,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+            }
+
+_shared_lock = threading.Lock()
+_shared_embedder: Optional[Embedder] = None
+_shared_query_cache: Optional[EmbeddingCache] = None
+
+def get_embedder() -> Embedder:
+    """The process-wide embedder for the configured backend, created on first use."""
+    global _shared_embedder
+    with _shared_lock:
+        if _shared_embedder is None:
+            _shared_embedder = create_embedder()
+        return _shared_embedder
+
+def get_query_embeddings() -> EmbeddingCache:
+    """The process-wide query-embedding cache in front of get_embedder()."""
+    global _shared_query_cache
+    embedder = get_embedder()
+    with _shared_lock:
+        if _shared_query_cache is None:
+            _shared_query_cache = EmbeddingCache(embedder)
+        return _shared_query_cache
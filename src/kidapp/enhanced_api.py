@@ -30,8 +30,9 @@ except ImportError:
 from .crew import KidSafeAppCrew
 from .models import *
 from .auth import get_current_user, register_user, login_user
+from .storage import storage
 from .quiz_generator import generate_quiz_from_explanation, save_quiz_to_memory, get_quiz_by_id, submit_quiz_attempt
-from openai import OpenAI
+from .openai_clients import get_openai_client, CHAT_TIMEOUT, VISION_TIMEOUT, IMAGE_TIMEOUT, TTS_TIMEOUT
 import base64
 
 # ——— Logging setup ———
@@ -75,7 +76,7 @@ security = HTTPBearer()
 async def register(user_data: UserCreate):
     """Register a new user."""
     try:
-        user = register_user(user_data)
+        user = await register_user(user_data)
         return {"message": "User registered successfully", "user": user}
     except HTTPException as e:
         raise e
@@ -87,7 +88,7 @@ async def register(user_data: UserCreate):
 async def login(login_data: UserLogin):
     """Login a user."""
     try:
-        result = login_user(login_data)
+        result = await login_user(login_data)
         return result
     except HTTPException as e:
         raise e
@@ -114,9 +115,7 @@ def save_session_data(user_id: str, topic: str, explanation: str, diagram_url: O
         interests=interests
     )
     
-    if user_id not in memory_storage.sessions:
-        memory_storage.sessions[user_id] = []
-    memory_storage.sessions[user_id].append(session_data)
+    storage.add_session(session_data)
 
 @app.get("/sessions/{user_id}", response_class=JSONResponse)
 async def get_user_sessions(user_id: str, current_user: UserResponse = Depends(get_current_user)):
@@ -124,7 +123,7 @@ async def get_user_sessions(user_id: str, current_user: UserResponse = Depends(g
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this user's sessions")
     
-    sessions = memory_storage.sessions.get(user_id, [])
+    sessions = storage.list_sessions(user_id)
     return {"sessions": sessions}
 
 # ——— Quiz Endpoints ———
@@ -185,7 +184,7 @@ async def get_user_quiz_attempts(user_id: str, current_user: UserResponse = Depe
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this user's attempts")
     
-    attempts = memory_storage.quiz_attempts.get(user_id, [])
+    attempts = storage.list_attempts(user_id)
     return {"attempts": attempts}
 
 # ——— Enhanced Learning Endpoints ———
@@ -196,7 +195,7 @@ async def get_learning_progress(user_id: str, current_user: UserResponse = Depen
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this user's progress")
     
-    progress = memory_storage.learning_progress.get(user_id, {})
+    progress = storage.get_progress(user_id)
     return {"progress": progress}
 
 @app.get("/learning/recommendations/{user_id}", response_class=JSONResponse)
@@ -238,7 +237,7 @@ def fast_path_response(topic: str, age: int = None, interests: str = None) -> di
         if not openai_api_key:
             return {"error": "OpenAI API key not configured"}
         
-        client = OpenAI(api_key=openai_api_key)
+        client = get_openai_client()
         
         # Create a simple, direct prompt
         age_context = f" for a {age}-year-old child" if age else " for children aged 6-12"
@@ -256,7 +255,8 @@ def fast_path_response(topic: str, age: int = None, interests: str = None) -> di
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
             max_tokens=150,
-            temperature=0.7
+            temperature=0.7,
+            timeout=CHAT_TIMEOUT
         )
         
         content = response.choices[0].message.content.strip()
@@ -301,7 +301,7 @@ def fast_path_image_analysis(image_path: str, age: int = None, interests: str =
         if not openai_api_key:
             return {"error": "OpenAI API key not configured"}
         
-        client = OpenAI(api_key=openai_api_key)
+        client = get_openai_client()
         
         # Create a simple, direct prompt
         age_context = f" for a {age}-year-old child" if age else " for children aged 6-12"
@@ -332,7 +332,8 @@ def fast_path_image_analysis(image_path: str, age: int = None, interests: str =
                     }
                 ],
                 max_tokens=150,
-                temperature=0.7
+                temperature=0.7,
+                timeout=VISION_TIMEOUT
             )
         
         content = response.choices[0].message.content.strip()
@@ -382,7 +383,7 @@ def generate_diagram_with_dalle(prompt: str) -> dict:
             }
         
         logger.info(f"🎨 Generating DALL-E diagram with prompt: {prompt[:100]}...")
-        client = OpenAI(api_key=openai_api_key)
+        client = get_openai_client()
         
         # Add safety check for prompt length
         if len(prompt) > 4000:
@@ -393,7 +394,8 @@ def generate_diagram_with_dalle(prompt: str) -> dict:
             model="dall-e-3",
             prompt=prompt,
             n=1,
-            size="1024x1024"
+            size="1024x1024",
+            timeout=IMAGE_TIMEOUT
         )
         
         url = getattr(response.data[0], 'url', None)
@@ -461,11 +463,12 @@ def generate_audio_with_tts(text: str) -> str:
             logger.info("📝 Truncated TTS text to fit limits")
         
         logger.info(f"🔊 Generating TTS audio for text: {text[:100]}...")
-        client = OpenAI(api_key=openai_api_key)
+        client = get_openai_client()
         response = client.audio.speech.create(
             model="tts-1",
             voice="alloy",
-            input=text
+            input=text,
+            timeout=TTS_TIMEOUT
         )
         
         # Generate a unique filename
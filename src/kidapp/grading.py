@@ -0,0 +1,133 @@
+"""
+Quiz grading for WonderBot
+
+Answers are normalized once into an attempts x questions matrix and scored
+column by column with NumPy, so grading one submission and grading a whole
+class share the same rules. Batch grading also reports classical item
+statistics for every question: difficulty (share of attempts answering
+correctly) and discrimination (correlation between getting the question right
+and the score on the rest of the quiz).
+"""
+
+import os
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .models import Quiz, QuestionType
+
+# Share of the reference answer's keywords a short answer must contain
+SHORT_ANSWER_THRESHOLD = float(os.getenv("SHORT_ANSWER_THRESHOLD", "0.6"))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_TRUE_FALSE = {"true": "true", "t": "true", "yes": "true", "y": "true",
+               "false": "false", "f": "false", "no": "false", "n": "false"}
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "by", "for", "with", "from",
+    "is", "are", "was", "were", "be", "it", "its", "that", "this", "they", "their", "as", "so",
+}
+
+def normalize_answer(text: Optional[str]) -> str:
+    """Fold unicode, case, punctuation and whitespace."""
+    text = unicodedata.normalize("NFKC", str(text or "")).lower()
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+def _keywords(normalized: str) -> set:
+    return {word for word in normalized.split() if word not in _STOPWORDS}
+
+def _answer_key(question) -> str:
+    """Normalized reference answer, resolving option letters for multiple choice."""
+    answer = question.correct_answer
+    if question.question_type == QuestionType.MULTIPLE_CHOICE and question.options:
+        letter = answer.strip().rstrip(").").upper()
+        if answer not in question.options and len(letter) == 1 and "A" <= letter < chr(ord("A") + len(question.options)):
+            answer = question.options[ord(letter) - ord("A")]
+    normalized = normalize_answer(answer)
+    if question.question_type == QuestionType.TRUE_FALSE:
+        return _TRUE_FALSE.get(normalized, normalized)
+    return normalized
+
+def _normalize_matrix(quiz: Quiz, answer_sets: List[Dict[str, str]]) -> np.ndarray:
+    """Build the attempts x questions matrix of normalized answers (keys are question indexes)."""
+    matrix = np.empty((len(answer_sets), len(quiz.questions)), dtype=object)
+    for row, answers in enumerate(answer_sets):
+        for col, question in enumerate(quiz.questions):
+            normalized = normalize_answer(answers.get(str(col), ""))
+            if question.question_type == QuestionType.TRUE_FALSE:
+                normalized = _TRUE_FALSE.get(normalized, normalized)
+            elif question.question_type == QuestionType.MULTIPLE_CHOICE and question.options and len(normalized) == 1:
+                # Accept the option letter as well as the option text
+                index = ord(normalized) - ord("a")
+                if 0 <= index < len(question.options):
+                    normalized = normalize_answer(question.options[index])
+            matrix[row, col] = normalized
+    return matrix
+
+def score_matrix(quiz: Quiz, answer_sets: List[Dict[str, str]]) -> np.ndarray:
+    """Return a boolean attempts x questions matrix of correct answers."""
+    answers = _normalize_matrix(quiz, answer_sets)
+    correct = np.zeros(answers.shape, dtype=bool)
+    if not answers.size:
+        return correct
+    keys = np.array([_answer_key(question) for question in quiz.questions], dtype=object)
+    exact = np.array([question.question_type != QuestionType.SHORT_ANSWER for question in quiz.questions])
+    # Exact-match question types: one broadcast comparison for the whole class
+    correct[:, exact] = (answers[:, exact] == keys[exact][None, :]) & (answers[:, exact] != "")
+    for col in np.flatnonzero(~exact):
+        expected = _keywords(keys[col]) or set(keys[col].split())
+        if not expected:
+            continue
+        overlap = np.array([len(expected & _keywords(answer)) for answer in answers[:, col]], dtype=float)
+        correct[:, col] = overlap / len(expected) >= SHORT_ANSWER_THRESHOLD
+    return correct
+
+def _item_statistics(correct: np.ndarray) -> Dict[str, List[Optional[float]]]:
+    if not len(correct):
+        empty: List[Optional[float]] = [None] * correct.shape[1]
+        return {"difficulty": empty, "discrimination": list(empty)}
+    items = correct.astype(float)
+    difficulty = items.mean(axis=0)
+    # Corrected item-total (point-biserial) correlation against the rest of the quiz
+    rest = items.sum(axis=1, keepdims=True) - items
+    item_centered = items - items.mean(axis=0)
+    rest_centered = rest - rest.mean(axis=0)
+    denominator = np.sqrt((item_centered ** 2).sum(axis=0) * (rest_centered ** 2).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        discrimination = (item_centered * rest_centered).sum(axis=0) / denominator
+
+    def as_list(values: np.ndarray) -> List[Optional[float]]:
+        return [None if np.isnan(value) else round(float(value), 3) for value in values]
+
+    return {"difficulty": as_list(difficulty), "discrimination": as_list(discrimination)}
+
+def grade_attempts(quiz: Quiz, answer_sets: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Grade N attempts at a quiz at once.
+
+    Returns per-attempt correct counts and scores plus per-question difficulty
+    (share correct) and discrimination (None when it cannot be computed, e.g.
+    every attempt answered the question the same way).
+    """
+    correct = score_matrix(quiz, answer_sets)
+    total_questions = len(quiz.questions)
+    correct_counts = correct.sum(axis=1)
+    scores = correct_counts / total_questions * 100 if total_questions else np.zeros(len(answer_sets))
+    statistics = _item_statistics(correct)
+    return {
+        "correct": correct,
+        "correct_answers": [int(count) for count in correct_counts],
+        "scores": [round(float(score), 2) for score in scores],
+        "questions": [
+            {
+                "question_id": str(i),
+                "question": question.question,
+                "question_type": question.question_type.value,
+                "difficulty": statistics["difficulty"][i],
+                "discrimination": statistics["discrimination"][i]
+            }
+            for i, question in enumerate(quiz.questions)
+        ],
+        "mean_score": round(float(scores.mean()), 2) if len(scores) else None
+    }
@@ -0,0 +1,352 @@
+"""
+Bulk knowledge ingestion for WonderBot's RAG collection
+
+Reads JSONL and Markdown files, splits long passages into overlapping chunks,
+drops duplicates by content hash, embeds chunks in large batches on a bounded
+worker pool and upserts them into the collection batch by batch.
+
+Chunk ids are content hashes, so an interrupted run can simply be started
+again: chunks already in the collection are skipped before embedding, and
+files that finished completely are recorded in a small state file and not
+even re-read.
+
+Usage:
+    python -m kidapp.ingest curriculum/*.jsonl lessons/ --category science
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .rag_system import rag_system, document_id_for
+
+logger = logging.getLogger(__name__)
+
+# ——— Configuration (overridable from the environment) ———
+INGEST_CHUNK_CHARS = int(os.getenv("INGEST_CHUNK_CHARS", "1200"))
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "150"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+INGEST_STATE_PATH = os.getenv("INGEST_STATE_PATH", os.path.join(os.getcwd(), "cache", "ingest_state.json"))
+INGEST_DEFAULT_CATEGORY = "general"
+INGEST_DEFAULT_AGE_GROUP = "6-12"
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_HEADING = re.compile(r"^(#{1,3})\s+(.+?)\s*#*\s*$", re.MULTILINE)
+_FRONT_MATTER = re.compile(r"\A---\s*\n(.*?)\n---\s*\n", re.DOTALL)
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_") or "untitled"
+
+def _pieces(text: str, max_chars: int) -> Iterator[str]:
+    """Paragraphs, then sentences, then hard slices, each at most max_chars long."""
+    for paragraph in _PARAGRAPH.split(text):
+        paragraph = " ".join(paragraph.split())
+        if len(paragraph) <= max_chars:
+            if paragraph:
+                yield paragraph
+            continue
+        for sentence in _SENTENCE.split(paragraph):
+            for start in range(0, len(sentence), max_chars):
+                yield sentence[start:start + max_chars]
+
+def chunk_text(text: str, max_chars: int = INGEST_CHUNK_CHARS, overlap: int = INGEST_CHUNK_OVERLAP) -> List[str]:
+    """Split a passage into chunks of at most max_chars on paragraph and sentence boundaries.
+
+    Consecutive chunks share up to `overlap` characters of trailing sentences so
+    a fact split across a boundary is still retrievable from either side.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for piece in _pieces(text, max_chars):
+        if current and size + 1 + len(piece) > max_chars:
+            chunks.append(" ".join(current))
+            # Carry at most `overlap` characters, and only as much as still fits next to the piece
+            budget = min(overlap, max_chars - len(piece) - 1)
+            carried: List[str] = []
+            size = 0
+            for sentence in reversed(_SENTENCE.split(chunks[-1])):
+                if size + len(sentence) > budget:
+                    break
+                carried.insert(0, sentence)
+                size += len(sentence) + 1
+            current = carried
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def _clean_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    # Chroma metadata values must be scalars
+    return {key: value for key, value in metadata.items()
+            if isinstance(value, (str, int, float, bool)) and value != ""}
+
+def read_jsonl(text: str, defaults: Dict[str, Any], errors: List[str], source: str = "") -> Iterator[Dict[str, Any]]:
+    """Records from JSON lines with "content" (or "text") plus optional metadata fields."""
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            content = record.pop("content", None) or record.pop("text", None)
+        except (ValueError, AttributeError):
+            errors.append(f"{source}:{number}: not a JSON object")
+            continue
+        if not isinstance(content, str) or not content.strip():
+            errors.append(f"{source}:{number}: missing content")
+            continue
+        yield {"content": content, "metadata": _clean_metadata({**defaults, **record})}
+
+def read_markdown(text: str, defaults: Dict[str, Any], source: str = "") -> Iterator[Dict[str, Any]]:
+    """One record per heading section; simple "key: value" front matter sets metadata."""
+    metadata = dict(defaults)
+    match = _FRONT_MATTER.match(text)
+    if match:
+        for line in match.group(1).splitlines():
+            key, _, value = line.partition(":")
+            if value.strip():
+                metadata[key.strip()] = value.strip().strip("'\"")
+        text = text[match.end():]
+    headings = list(_HEADING.finditer(text))
+    sections = [(None, text[:headings[0].start()] if headings else text)]
+    for i, heading in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        sections.append((heading.group(2), text[heading.end():end]))
+    for title, body in sections:
+        if not body.strip():
+            continue
+        topic = metadata.get("topic") or _slug(title or os.path.splitext(os.path.basename(source))[0])
+        content = f"{title}\n\n{body.strip()}" if title else body.strip()
+        yield {"content": content, "metadata": _clean_metadata({**metadata, "topic": topic})}
+
+def read_records(name: str, text: str, defaults: Dict[str, Any], errors: List[str]) -> Iterator[Dict[str, Any]]:
+    """Records from a file's text, chosen by its extension."""
+    extension = os.path.splitext(name)[1].lower()
+    if extension in JSONL_EXTENSIONS:
+        return read_jsonl(text, defaults, errors, name)
+    if extension in MARKDOWN_EXTENSIONS:
+        return read_markdown(text, defaults, name)
+    raise ValueError(f"Unsupported file type for {name}; expected JSONL or Markdown")
+
+class Ingestor:
+    """Chunks, dedups, embeds and upserts records, keeping throughput counters."""
+
+    def __init__(self, batch_size: int = INGEST_BATCH_SIZE, concurrency: int = INGEST_CONCURRENCY,
+                 chunk_chars: int = INGEST_CHUNK_CHARS, chunk_overlap: int = INGEST_CHUNK_OVERLAP):
+        if not rag_system.collection:
+            raise RuntimeError("RAG system not available - dependencies missing")
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.chunk_chars = chunk_chars
+        self.chunk_overlap = chunk_overlap
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest")
+        self._in_flight: deque = deque()
+        self._pending: List[Tuple[str, str, Dict[str, Any]]] = []
+        self._seen: set = set()
+        # Batches are stored in the order they are dispatched
+        self._batches_dispatched = 0
+        self._batches_stored = 0
+        self._waiters: deque = deque()
+        self.started = time.perf_counter()
+        self.embed_seconds = 0.0
+        self.counts = {"records": 0, "chunks": 0, "duplicates": 0, "already_present": 0, "upserted": 0}
+        self.errors: List[str] = []
+
+    def add(self, records: Iterable[Dict[str, Any]]) -> None:
+        added_date = datetime.now().isoformat()
+        for record in records:
+            self.counts["records"] += 1
+            metadata = {"category": INGEST_DEFAULT_CATEGORY, "age_group": INGEST_DEFAULT_AGE_GROUP,
+                        "added_date": added_date, **record["metadata"]}
+            metadata.setdefault("topic", _slug(record["content"][:40]))
+            chunks = chunk_text(record["content"], self.chunk_chars, self.chunk_overlap)
+            for index, chunk in enumerate(chunks):
+                self.counts["chunks"] += 1
+                doc_id = document_id_for(chunk)
+                if doc_id in self._seen:
+                    self.counts["duplicates"] += 1
+                    continue
+                self._seen.add(doc_id)
+                chunk_metadata = dict(metadata, chunk=index, chunks=len(chunks)) if len(chunks) > 1 else metadata
+                self._pending.append((doc_id, chunk, chunk_metadata))
+                if len(self._pending) >= self.batch_size:
+                    self._dispatch()
+
+    def when_stored(self, callback) -> None:
+        """Call callback() once everything added so far has been stored."""
+        self._waiters.append((self._batches_dispatched + (1 if self._pending else 0), callback))
+        self._notify()
+
+    def _notify(self) -> None:
+        while self._waiters and self._waiters[0][0] <= self._batches_stored:
+            self._waiters.popleft()[1]()
+
+    def _embed(self, batch: List[Tuple[str, str, Dict[str, Any]]]):
+        started = time.perf_counter()
+        vectors = rag_system.embedding_model.embed([chunk for _, chunk, _ in batch])
+        return batch, vectors, time.perf_counter() - started
+
+    def _dispatch(self) -> None:
+        batch, self._pending = self._pending, []
+        self._batches_dispatched += 1
+        present = rag_system.existing_ids([doc_id for doc_id, _, _ in batch])
+        self.counts["already_present"] += len(present)
+        batch = [item for item in batch if item[0] not in present]
+        if not batch:
+            if not self._in_flight:
+                self._batches_stored = self._batches_dispatched
+                self._notify()
+            else:
+                self._in_flight.append(None)
+            return
+        # At most `concurrency` batches are being embedded at once
+        while len(self._in_flight) >= self.concurrency:
+            self._upsert(self._in_flight.popleft())
+        self._in_flight.append(self.executor.submit(self._embed, batch))
+
+    def _upsert(self, future) -> None:
+        self._batches_stored += 1
+        if future is None:
+            # A batch that was entirely present already, queued behind real ones
+            self._notify()
+            return
+        batch, vectors, seconds = future.result()
+        self.embed_seconds += seconds
+        rag_system.upsert_documents(
+            documents=[chunk for _, chunk, _ in batch],
+            metadatas=[metadata for _, _, metadata in batch],
+            ids=[doc_id for doc_id, _, _ in batch],
+            embeddings=vectors
+        )
+        self.counts["upserted"] += len(batch)
+        logger.info(f"📚 Ingested {self.counts['upserted']} chunks ({self.throughput():.1f}/s)")
+        self._notify()
+
+    def flush(self) -> None:
+        """Embed and upsert everything queued so far."""
+        if self._pending:
+            self._dispatch()
+        while self._in_flight:
+            self._upsert(self._in_flight.popleft())
+
+    def throughput(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.counts["upserted"] / elapsed if elapsed else 0.0
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            **self.counts,
+            "errors": self.errors,
+            "seconds": round(elapsed, 3),
+            "embed_seconds": round(self.embed_seconds, 3),
+            "chunks_per_second": round(self.throughput(), 1)
+        }
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+def ingest_texts(files: List[Tuple[str, str]], defaults: Optional[Dict[str, Any]] = None,
+                 batch_size: int = INGEST_BATCH_SIZE, concurrency: int = INGEST_CONCURRENCY) -> Dict[str, Any]:
+    """Ingest (file name, text) pairs, e.g. uploaded files; returns the throughput report."""
+    ingestor = Ingestor(batch_size, concurrency)
+    try:
+        for name, text in files:
+            try:
+                ingestor.add(read_records(name, text, defaults or {}, ingestor.errors))
+            except ValueError as e:
+                ingestor.errors.append(str(e))
+        ingestor.flush()
+    finally:
+        ingestor.close()
+    return ingestor.report()
+
+def _load_state(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_state(path: str, state: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(temporary, path)
+
+def _expand(paths: Iterable[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if name.lower().endswith(JSONL_EXTENSIONS + MARKDOWN_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+def ingest_paths(paths: Iterable[str], defaults: Optional[Dict[str, Any]] = None,
+                 batch_size: int = INGEST_BATCH_SIZE, concurrency: int = INGEST_CONCURRENCY,
+                 state_path: Optional[str] = INGEST_STATE_PATH, resume: bool = True) -> Dict[str, Any]:
+    """Ingest files and directories, skipping files a previous run already finished."""
+    state = _load_state(state_path) if state_path and resume else {}
+    ingestor = Ingestor(batch_size, concurrency)
+    skipped = 0
+    try:
+        for path in _expand(paths):
+            stat = os.stat(path)
+            key = os.path.abspath(path)
+            fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime}
+            if state.get(key) == fingerprint:
+                skipped += 1
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            try:
+                ingestor.add(read_records(path, text, defaults or {}, ingestor.errors))
+            except ValueError as e:
+                ingestor.errors.append(str(e))
+                continue
+            if state_path:
+                # A file only counts as done once all of its chunks are stored
+                def mark_done(key=key, fingerprint=fingerprint):
+                    state[key] = fingerprint
+                    _save_state(state_path, state)
+                ingestor.when_stored(mark_done)
+        ingestor.flush()
+    finally:
+        ingestor.close()
+    return {**ingestor.report(), "files_skipped": skipped}
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load JSONL/Markdown passages into the WonderBot knowledge base.")
+    parser.add_argument("paths", nargs="+", help="JSONL or Markdown files, or directories containing them")
+    parser.add_argument("--category", help="Default category for records that do not set one")
+    parser.add_argument("--age-group", default=INGEST_DEFAULT_AGE_GROUP, help="Default age group")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY)
+    parser.add_argument("--fresh", action="store_true", help="Re-read files a previous run already finished")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    defaults = {"age_group": args.age_group}
+    if args.category:
+        defaults["category"] = args.category
+    report = ingest_paths(args.paths, defaults, args.batch_size, args.concurrency, resume=not args.fresh)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
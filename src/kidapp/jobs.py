@@ -0,0 +1,307 @@
+"""
+Background job queue for WonderBot
+
+Slow work that the user does not need to wait for (such as quiz generation)
+is submitted here and runs on a bounded worker pool. Job records live in
+memory, or in a SQLite file when JOB_QUEUE_BACKEND=sqlite so that every
+worker can report job status and unfinished jobs are resumed after a restart.
+
+With the SQLite backend each process records itself as the owner of the jobs
+it submits and keeps a heartbeat; a periodic sweep takes over queued and
+running jobs whose owner has stopped heart-beating (crashed or restarted).
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# ——— Configuration (overridable from the environment) ———
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "memory")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(os.getcwd(), "cache", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_RECORDS = int(os.getenv("JOB_MAX_RECORDS", "10000"))
+# How often each process heart-beats and sweeps for orphaned jobs
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+# Processes that have not heart-beaten for this long are assumed dead
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class MemoryJobStore:
+    """Bounded in-process job records."""
+
+    def __init__(self, max_records: int = JOB_MAX_RECORDS):
+        self.max_records = max_records
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def insert(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+            while len(self._jobs) > self.max_records:
+                self._jobs.popitem(last=False)
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def heartbeat(self, owner: str) -> None:
+        pass
+
+    def claim_unfinished(self, owner: str) -> list:
+        # Jobs die with the process, so there is never anything to take over
+        return []
+
+    def retire(self, owner: str) -> None:
+        pass
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+class SQLiteJobStore:
+    """Job records persisted in SQLite and shared across worker processes."""
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, stale_seconds: float = JOB_STALE_SECONDS):
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                user_id TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT
+            )"""
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            # Files created before jobs had owners; NULL owners are claimable
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, updated_at)")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_workers (
+                owner TEXT PRIMARY KEY,
+                heartbeat_at REAL NOT NULL
+            )"""
+        )
+
+    def insert(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, user_id, payload, status, result, error, created_at, updated_at, owner) "
+                "VALUES (?, ?, ?, ?, ?, NULL, NULL, ?, ?, ?)",
+                (job["id"], job["kind"], job["user_id"], json.dumps(job["payload"], default=str),
+                 job["status"], job["created_at"], job["updated_at"], job.get("owner"))
+            )
+
+    def update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], default=str)
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    _COLUMNS = "id, kind, user_id, payload, status, result, error, created_at, updated_at, owner"
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        job_id, kind, user_id, payload, status, result, error, created_at, updated_at, owner = row
+        return {
+            "id": job_id,
+            "kind": kind,
+            "user_id": user_id,
+            "payload": json.loads(payload),
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "owner": owner
+        }
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def heartbeat(self, owner: str) -> None:
+        """Record that the owning process is alive."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_workers (owner, heartbeat_at) VALUES (?, ?)", (owner, time.time())
+            )
+
+    def claim_unfinished(self, owner: str) -> list:
+        """Atomically take over queued and running jobs whose owner is no longer alive.
+
+        Age does not matter: a job queued a second before its process died is
+        claimed as soon as that process's heartbeat goes stale.
+        """
+        cutoff = time.time() - self.stale_seconds
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM job_workers WHERE heartbeat_at < ? AND owner != ?", (cutoff, owner))
+                rows = self._conn.execute(
+                    f"SELECT {self._COLUMNS} FROM jobs WHERE status IN (?, ?) AND (owner IS NULL OR ("
+                    "owner != ? AND owner NOT IN (SELECT owner FROM job_workers)))",
+                    (QUEUED, RUNNING, owner)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE id = ?",
+                    [(QUEUED, owner, time.time(), row[0]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [self._row_to_job(row) for row in rows]
+
+    def retire(self, owner: str) -> None:
+        """Forget a process on clean shutdown so its unfinished jobs are claimed right away."""
+        with self._lock:
+            self._conn.execute("DELETE FROM job_workers WHERE owner = ?", (owner,))
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+class JobQueue:
+    """Runs registered job kinds on a bounded worker pool and tracks their status."""
+
+    def __init__(self, store, max_workers: int = JOB_WORKERS):
+        self.store = store
+        self.owner = uuid.uuid4().hex
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, handler: Callable[..., Any]) -> None:
+        """Register the function that runs jobs of the given kind with the job payload as kwargs."""
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, payload: Dict[str, Any], user_id: Optional[str] = None) -> str:
+        """Queue a job and return its id immediately."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        now = time.time()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "user_id": user_id,
+            "payload": payload,
+            "status": QUEUED,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "owner": self.owner
+        }
+        self.store.insert(job)
+        self._dispatch(job["id"], kind, payload)
+        return job["id"]
+
+    def _dispatch(self, job_id: str, kind: str, payload: Dict[str, Any]) -> None:
+        future = self._executor.submit(self._run, job_id, kind, payload)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._forget(job_id))
+
+    def _forget(self, job_id: str) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _run(self, job_id: str, kind: str, payload: Dict[str, Any]) -> Any:
+        self.store.update(job_id, status=RUNNING)
+        try:
+            result = self._handlers[kind](**payload)
+        except Exception as e:
+            logger.warning(f"⚠️ Job {job_id} ({kind}) failed: {e}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+            raise
+        self.store.update(job_id, status=DONE, result=result)
+        return result
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    async def wait(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Wait for a job started by this process to finish and return its record."""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                pass
+        return self.get(job_id)
+
+    def resume_unfinished(self) -> int:
+        """Heart-beat and re-dispatch jobs orphaned by dead processes (persistent backend only).
+
+        Call at startup and then every JOB_HEARTBEAT_SECONDS.
+        """
+        self.store.heartbeat(self.owner)
+        resumed = 0
+        for job in self.store.claim_unfinished(self.owner):
+            if job["kind"] in self._handlers:
+                self._dispatch(job["id"], job["kind"], job["payload"])
+                resumed += 1
+        if resumed:
+            logger.info(f"🔁 Resumed {resumed} unfinished background jobs")
+        return resumed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._futures)
+        return {"in_flight": in_flight, "by_status": self.store.counts()}
+
+    def shutdown(self) -> None:
+        # Jobs not started yet are left queued for the process that takes them over
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.store.retire(self.owner)
+
+def create_job_queue(backend: str = JOB_QUEUE_BACKEND) -> JobQueue:
+    """Build the job queue for the configured backend."""
+    if backend == "sqlite":
+        return JobQueue(SQLiteJobStore())
+    if backend == "memory":
+        return JobQueue(MemoryJobStore())
+    raise ValueError(f"Unknown job queue backend: {backend}")
+
+# Global job queue instance
+job_queue = create_job_queue()
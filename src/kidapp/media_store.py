@@ -0,0 +1,252 @@
+"""
+Content-addressed media store for WonderBot
+
+Generated diagrams and audio clips are stored under a hash of the inputs that
+produced them (prompt, model, voice/size), so an identical request reuses the
+existing file instead of calling OpenAI again. Files are written atomically,
+a small SQLite index keeps sizes, reference counts and access times, and a
+size-capped garbage collector evicts unreferenced files in LRU order. The
+index also holds the text of narrations registered for on-demand streaming,
+so any worker sharing it can serve them.
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, BinaryIO, Iterable
+
+from .cache import CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# ——— Configuration (overridable from the environment) ———
+MEDIA_DIR = os.getenv("MEDIA_DIR", os.path.join(os.getcwd(), "uploaded_images"))
+MEDIA_URL_PREFIX = "/uploaded_images"
+MEDIA_INDEX_PATH = os.getenv("MEDIA_INDEX_PATH", os.path.join(os.getcwd(), "cache", "media_index.sqlite3"))
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Recently used files are kept even when unreferenced for at least as long as a
+# cached response linking to them can be served (served hits also touch them)
+MEDIA_GC_GRACE_SECONDS = max(
+    float(os.getenv("MEDIA_GC_GRACE_SECONDS", str(60 * 60))), CACHE_TTL_SECONDS
+)
+# Narrations waiting to be streamed from /generate/audio/{audio_id}
+PENDING_AUDIO_MAX = int(os.getenv("PENDING_AUDIO_MAX", "1000"))
+
+def media_key(kind: str, prompt: str, model: str, variant: str = "") -> str:
+    """Hash the inputs that fully determine a generated artifact."""
+    digest = hashlib.sha256()
+    for part in (kind, model, variant, prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class MediaStore:
+    """Deduplicating, size-capped store for generated media files."""
+
+    def __init__(self, root_dir: str = MEDIA_DIR, index_path: str = MEDIA_INDEX_PATH,
+                 max_bytes: int = MEDIA_MAX_BYTES, gc_grace_seconds: float = MEDIA_GC_GRACE_SECONDS,
+                 url_prefix: str = MEDIA_URL_PREFIX, max_pending: int = PENDING_AUDIO_MAX):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.gc_grace_seconds = gc_grace_seconds
+        self.url_prefix = url_prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(root_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(index_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS media (
+                key TEXT PRIMARY KEY,
+                filename TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                refs INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_gc ON media(refs, last_access)")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pending_audio (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_audio_created ON pending_audio(created_at)")
+
+    def filename_for(self, key: str, kind: str, ext: str) -> str:
+        return f"{kind}_{key[:32]}.{ext}"
+
+    def url_for(self, filename: str) -> str:
+        return f"{self.url_prefix}/{filename}"
+
+    def path_for(self, filename: str) -> str:
+        return os.path.join(self.root_dir, filename)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the URL of an existing artifact, or None if it must be generated."""
+        with self._lock:
+            row = self._conn.execute("SELECT filename FROM media WHERE key = ?", (key,)).fetchone()
+            if row is not None and os.path.exists(self.path_for(row[0])):
+                self._conn.execute("UPDATE media SET last_access = ? WHERE key = ?", (time.time(), key))
+                self.hits += 1
+                return self.url_for(row[0])
+            if row is not None:
+                # File vanished from disk; forget it so it gets regenerated
+                self._conn.execute("DELETE FROM media WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+    @contextmanager
+    def writer(self, key: str, kind: str, ext: str) -> Iterator[BinaryIO]:
+        """Open a temporary file that is atomically published under its content key on success."""
+        filename = self.filename_for(key, kind, ext)
+        final_path = self.path_for(filename)
+        tmp_path = self.path_for(f".{filename}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._register(key, filename, kind, os.path.getsize(final_path))
+
+    def put(self, key: str, kind: str, ext: str, data: bytes) -> str:
+        """Store bytes under their content key and return the public URL."""
+        with self.writer(key, kind, ext) as f:
+            f.write(data)
+        return self.url_for(self.filename_for(key, kind, ext))
+
+    def _register(self, key: str, filename: str, kind: str, size: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO media (key, filename, kind, size, refs, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET size = excluded.size, last_access = excluded.last_access",
+                (key, filename, kind, size, now, now)
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM media").fetchone()[0]
+        if total > self.max_bytes:
+            self.collect_garbage()
+
+    def register_pending(self, key: str, text: str) -> None:
+        """Remember a narration's text until it is first streamed, keeping the newest max_pending."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pending_audio (key, text, created_at) VALUES (?, ?, ?)",
+                (key, text, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM pending_audio WHERE created_at < ("
+                "SELECT created_at FROM pending_audio ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+                (self.max_pending - 1,)
+            )
+
+    def pending_text(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM pending_audio WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def clear_pending(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM pending_audio WHERE key = ?", (key,))
+
+    def _filename_from_url(self, url: Optional[str]) -> Optional[str]:
+        if not url or not url.startswith(self.url_prefix + "/"):
+            return None
+        return url[len(self.url_prefix) + 1:]
+
+    def touch(self, urls: Iterable[Optional[str]]) -> None:
+        """Mark artifacts as just used, e.g. when a cached response linking to them is served."""
+        filenames = [(time.time(), name) for name in map(self._filename_from_url, urls) if name]
+        if filenames:
+            with self._lock:
+                self._conn.executemany("UPDATE media SET last_access = ? WHERE filename = ?", filenames)
+
+    def add_ref(self, url: Optional[str]) -> None:
+        """Mark an artifact as referenced (e.g. by a saved session) so GC keeps it."""
+        filename = self._filename_from_url(url)
+        if filename:
+            with self._lock:
+                self._conn.execute("UPDATE media SET refs = refs + 1 WHERE filename = ?", (filename,))
+
+    def release(self, url: Optional[str]) -> None:
+        """Drop one reference to an artifact."""
+        filename = self._filename_from_url(url)
+        if filename:
+            with self._lock:
+                self._conn.execute("UPDATE media SET refs = MAX(refs - 1, 0) WHERE filename = ?", (filename,))
+
+    def reset_refs(self) -> None:
+        """Forget all references (used when stored sessions are cleared)."""
+        with self._lock:
+            self._conn.execute("UPDATE media SET refs = 0")
+
+    def collect_garbage(self, max_bytes: Optional[int] = None) -> int:
+        """Evict unreferenced, least recently used files until the store fits its budget."""
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        cutoff = time.time() - self.gc_grace_seconds
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM media").fetchone()[0]
+            if total <= budget:
+                return 0
+            candidates = self._conn.execute(
+                "SELECT key, filename, size FROM media WHERE refs = 0 AND last_access < ? ORDER BY last_access",
+                (cutoff,)
+            ).fetchall()
+            evicted = []
+            for key, filename, size in candidates:
+                if total <= budget:
+                    break
+                try:
+                    os.remove(self.path_for(filename))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not evict media file {filename}: {e}")
+                    continue
+                evicted.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM media WHERE key = ?", evicted)
+            self.evictions += len(evicted)
+        if evicted:
+            logger.info(f"🧹 Media GC evicted {len(evicted)} files")
+        return len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            files, total, referenced = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refs > 0), 0) FROM media"
+            ).fetchone()
+            pending = self._conn.execute("SELECT COUNT(*) FROM pending_audio").fetchone()[0]
+            return {
+                "files": files,
+                "bytes": total,
+                "referenced_files": referenced,
+                "pending_narrations": pending,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+# Global media store instance
+media_store = MediaStore()
@@ -82,6 +82,7 @@ class QuizAttempt(BaseModel):
     time_taken: int  # in seconds
     completed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     answers: Dict[str, str] = Field(..., description="Question ID to answer mapping")
+    question_times: Dict[str, float] = Field(default_factory=dict, description="Question ID to seconds spent")
 
 class LearningProgress(BaseModel):
     user_id: str
@@ -100,16 +101,3 @@ class Achievement(BaseModel):
     icon: str
     criteria: Dict[str, Any]
     unlocked_at: Optional[datetime] = None
-
-# In-memory storage (replace with database in production)
-class MemoryStorage:
-    def __init__(self):
-        self.users: Dict[str, UserResponse] = {}
-        self.sessions: Dict[str, List[SessionData]] = {}
-        self.quizzes: Dict[str, Quiz] = {}
-        self.quiz_attempts: Dict[str, List[QuizAttempt]] = {}
-        self.learning_progress: Dict[str, Dict[str, LearningProgress]] = {}
-        self.achievements: Dict[str, List[Achievement]] = {}
-
-# Global memory storage instance
-memory_storage = MemoryStorage() 
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Shared OpenAI clients for WonderBot
+
+Every part of the app talks to OpenAI through the two process-wide clients
+provided here, so HTTP connections and TLS sessions are reused across calls.
+"""
+
+import os
+import threading
+from typing import Optional
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# ——— Tuning (overridable from the environment) ———
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "1") == "1" and HTTP2_AVAILABLE
+
+# Default and per-call timeouts in seconds
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+CHAT_TIMEOUT = float(os.getenv("OPENAI_CHAT_TIMEOUT", "30"))
+VISION_TIMEOUT = float(os.getenv("OPENAI_VISION_TIMEOUT", "60"))
+IMAGE_TIMEOUT = float(os.getenv("OPENAI_IMAGE_TIMEOUT", "90"))
+TTS_TIMEOUT = float(os.getenv("OPENAI_TTS_TIMEOUT", "60"))
+EMBEDDING_TIMEOUT = float(os.getenv("OPENAI_EMBEDDING_TIMEOUT", "20"))
+
+_lock = threading.Lock()
+_sync_client: Optional[OpenAI] = None
+_async_client: Optional[AsyncOpenAI] = None
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+    )
+
+def get_openai_client() -> OpenAI:
+    """Return the shared synchronous OpenAI client, creating it on first use."""
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=OPENAI_BASE_URL,
+                    timeout=OPENAI_TIMEOUT,
+                    max_retries=OPENAI_MAX_RETRIES,
+                    http_client=httpx.Client(limits=_limits(), http2=OPENAI_HTTP2, timeout=OPENAI_TIMEOUT)
+                )
+    return _sync_client
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Return the shared asynchronous OpenAI client, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=OPENAI_BASE_URL,
+                    timeout=OPENAI_TIMEOUT,
+                    max_retries=OPENAI_MAX_RETRIES,
+                    http_client=httpx.AsyncClient(limits=_limits(), http2=OPENAI_HTTP2, timeout=OPENAI_TIMEOUT)
+                )
+    return _async_client
+
+def set_openai_clients(sync_client: Optional[OpenAI] = None, async_client: Optional[AsyncOpenAI] = None) -> None:
+    """Replace the shared clients (e.g. with clients pointed at a local fake server in tests)."""
+    global _sync_client, _async_client
+    with _lock:
+        if sync_client is not None:
+            _sync_client = sync_client
+        if async_client is not None:
+            _async_client = async_client
+
+async def close_openai_clients() -> None:
+    """Close the shared clients and their connection pools."""
+    global _sync_client, _async_client
+    with _lock:
+        sync_client, async_client = _sync_client, _async_client
+        _sync_client = None
+        _async_client = None
+    if sync_client is not None:
+        sync_client.close()
+    if async_client is not None:
+        await async_client.close()
@@ -0,0 +1,132 @@
+"""
+Password hashing service for WonderBot
+
+Passwords are hashed with scrypt, a memory-hard KDF from hashlib, on a
+bounded worker pool so that login and registration never run the KDF on the
+event loop. Hashes are stored as "scrypt$n$r$p$salt$hash" so the cost can be
+raised later; older hashes (including the legacy unsalted SHA-256 hex
+digests) are reported as needing a rehash and upgraded on the next login.
+"""
+
+import os
+import hmac
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+# ——— Configuration (overridable from the environment) ———
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(8, (os.cpu_count() or 1) + 2))))
+SCRYPT_SALT_BYTES = 16
+SCRYPT_KEY_BYTES = 32
+LATENCY_SAMPLES = 1000
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+def _is_legacy_sha256(stored_hash: str) -> bool:
+    return len(stored_hash) == 64 and all(c in "0123456789abcdef" for c in stored_hash)
+
+class PasswordHasher:
+    """Hashes and verifies passwords with scrypt on a bounded thread pool."""
+
+    def __init__(self, n: int = PASSWORD_SCRYPT_N, r: int = PASSWORD_SCRYPT_R, p: int = PASSWORD_SCRYPT_P,
+                 max_workers: int = PASSWORD_HASH_WORKERS):
+        self.n = n
+        self.r = r
+        self.p = p
+        # hashlib.scrypt releases the GIL, so threads give real parallelism here
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pwhash")
+        self._lock = threading.Lock()
+        self._latencies_ms: deque = deque(maxlen=LATENCY_SAMPLES)
+        self.hashes = 0
+        self.verifications = 0
+        self.upgrades = 0
+        # Checked when there is no real hash (unknown user), so that login costs the same scrypt
+        # work either way and response times don't reveal which usernames exist; matches nothing
+        self.dummy_hash = (f"scrypt${n}${r}${p}${_b64encode(secrets.token_bytes(SCRYPT_SALT_BYTES))}"
+                           f"${_b64encode(secrets.token_bytes(SCRYPT_KEY_BYTES))}")
+
+    def _scrypt(self, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        started = time.perf_counter()
+        key = hashlib.scrypt(
+            password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+            maxmem=128 * n * r * p + 1024 * 1024, dklen=SCRYPT_KEY_BYTES
+        )
+        with self._lock:
+            self._latencies_ms.append((time.perf_counter() - started) * 1000)
+        return key
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the current cost parameters (blocking)."""
+        salt = secrets.token_bytes(SCRYPT_SALT_BYTES)
+        key = self._scrypt(password, salt, self.n, self.r, self.p)
+        with self._lock:
+            self.hashes += 1
+        return f"scrypt${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password: str, stored_hash: str) -> bool:
+        """Check a password against a stored scrypt or legacy SHA-256 hash (blocking)."""
+        with self._lock:
+            self.verifications += 1
+        if _is_legacy_sha256(stored_hash):
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(legacy, stored_hash)
+        try:
+            scheme, n, r, p, salt, key = stored_hash.split("$")
+            if scheme != "scrypt":
+                return False
+            expected = base64.b64decode(key)
+            actual = self._scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+        except ValueError:
+            return False
+        return hmac.compare_digest(actual, expected)
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        """True for legacy hashes and scrypt hashes made with different cost parameters."""
+        return not stored_hash.startswith(f"scrypt${self.n}${self.r}${self.p}$")
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.hash, password)
+
+    async def verify_async(self, password: str, stored_hash: str) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.verify, password, stored_hash)
+
+    def record_upgrade(self) -> None:
+        with self._lock:
+            self.upgrades += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._latencies_ms)
+            hashes, verifications, upgrades = self.hashes, self.verifications, self.upgrades
+
+        def percentile(fraction: float) -> float:
+            return round(samples[min(len(samples) - 1, int(fraction * len(samples)))], 2) if samples else 0.0
+
+        return {
+            "algorithm": "scrypt",
+            "n": self.n,
+            "r": self.r,
+            "p": self.p,
+            "hashes": hashes,
+            "verifications": verifications,
+            "legacy_upgrades": upgrades,
+            "kdf_ms_p50": percentile(0.5),
+            "kdf_ms_p95": percentile(0.95),
+            "kdf_ms_max": round(samples[-1], 2) if samples else 0.0
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+# Global password hasher
+password_hasher = PasswordHasher()
@@ -0,0 +1,64 @@
+"""
+Incremental learning-progress aggregation for WonderBot
+
+Every learning session and quiz attempt updates the per-(user, topic)
+LearningProgress record in storage as it is recorded, so reading a user's
+progress is a single lookup rather than a scan over their history.
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from .models import LearningProgress
+from .storage import storage
+from .cache_keys import normalize_topic
+
+# ——— Mastery model (overridable from the environment) ———
+# Sessions needed for full "exposure" credit and quiz attempts needed before
+# the average score is fully trusted
+MASTERY_SESSIONS = int(os.getenv("MASTERY_SESSIONS", "5"))
+MASTERY_ATTEMPTS = int(os.getenv("MASTERY_ATTEMPTS", "3"))
+MASTERY_QUIZ_WEIGHT = float(os.getenv("MASTERY_QUIZ_WEIGHT", "0.8"))
+
+def progress_topic(topic: str) -> str:
+    """Key progress by normalized topic so rephrasings of a question share one record."""
+    return normalize_topic(topic) or topic
+
+def mastery_for(progress: LearningProgress) -> float:
+    """Blend exposure (sessions) with quiz performance, discounted until enough attempts exist."""
+    exposure = min(1.0, progress.sessions_count / MASTERY_SESSIONS)
+    confidence = min(1.0, progress.quiz_attempts / MASTERY_ATTEMPTS)
+    performance = progress.average_quiz_score / 100 * confidence
+    mastery = (1 - MASTERY_QUIZ_WEIGHT) * exposure + MASTERY_QUIZ_WEIGHT * performance
+    return round(max(0.0, min(1.0, mastery)), 4)
+
+def _load(user_id: str, topic: str) -> LearningProgress:
+    existing = storage.get_topic_progress(user_id, topic)
+    # Work on a copy so readers never see a half-updated record
+    return existing.model_copy() if existing else LearningProgress(user_id=user_id, topic=topic)
+
+def record_session(user_id: str, topic: str, at: Optional[datetime] = None) -> LearningProgress:
+    """Count a learning session towards the user's progress on its topic."""
+    key = progress_topic(topic)
+    with storage.transaction():
+        progress = _load(user_id, key)
+        progress.sessions_count += 1
+        progress.last_accessed = at or datetime.now(timezone.utc)
+        progress.mastery_level = mastery_for(progress)
+        storage.save_progress(progress)
+    return progress
+
+def record_quiz_attempt(user_id: str, topic: str, score: float, time_taken: int = 0,
+                        at: Optional[datetime] = None) -> LearningProgress:
+    """Fold a quiz score into the running average and mastery for its topic."""
+    key = progress_topic(topic)
+    with storage.transaction():
+        progress = _load(user_id, key)
+        progress.quiz_attempts += 1
+        progress.average_quiz_score += (score - progress.average_quiz_score) / progress.quiz_attempts
+        progress.total_time_spent += max(0, int(time_taken))
+        progress.last_accessed = at or datetime.now(timezone.utc)
+        progress.mastery_level = mastery_for(progress)
+        storage.save_progress(progress)
+    return progress
@@ -2,14 +2,161 @@
 Quiz generation system for WonderBot
 """
 
+import re
 import uuid
+import random
+import hashlib
+import logging
+import threading
 from datetime import datetime
-from typing import List, Dict, Any
-from openai import OpenAI
+from typing import List, Dict, Any, Optional
 import os
 import json
 
 from .models import Quiz, QuizQuestion, QuestionType, DifficultyLevel
+from .openai_clients import get_openai_client, CHAT_TIMEOUT
+from .jobs import job_queue
+from .cache import create_response_cache, CACHE_BACKEND
+from .grading import score_matrix, grade_attempts
+from .quiz_timing import quiz_timer
+
+logger = logging.getLogger(__name__)
+
+# ——— Quiz reuse cache (overridable from the environment) ———
+QUIZ_CACHE_PATH = os.getenv("QUIZ_CACHE_PATH", os.path.join(os.getcwd(), "cache", "quizzes.sqlite3"))
+QUIZ_CACHE_MAX_ENTRIES = int(os.getenv("QUIZ_CACHE_MAX_ENTRIES", "5000"))
+QUIZ_CACHE_TTL_SECONDS = float(os.getenv("QUIZ_CACHE_TTL", str(7 * 24 * 60 * 60)))
+# Serve each user their own ordering of a quiz's questions and options
+QUIZ_SHUFFLE_PER_USER = os.getenv("QUIZ_SHUFFLE_PER_USER", "1") == "1"
+
+quiz_cache = create_response_cache(
+    CACHE_BACKEND, path=QUIZ_CACHE_PATH, max_entries=QUIZ_CACHE_MAX_ENTRIES,
+    ttl_seconds=QUIZ_CACHE_TTL_SECONDS
+)
+
+# ——— Quiz generation (overridable from the environment) ———
+# "function": structured output through a forced function call with a JSON schema
+# built from the QuizQuestion model; "text": free-form JSON in the message body
+QUIZ_GENERATION_MODE = os.getenv("QUIZ_GENERATION_MODE", "function")
+QUIZ_MODEL = "gpt-3.5-turbo"
+QUIZ_MAX_TOKENS = 2000
+QUIZ_FUNCTION_NAME = "create_quiz"
+
+_generation_lock = threading.Lock()
+_generation_counters = {
+    "requests": 0, "parse_failures": 0, "repaired": 0, "retries": 0,
+    "retry_successes": 0, "dropped_questions": 0, "fallbacks": 0
+}
+
+def _count_generation(name: str, amount: int = 1) -> None:
+    with _generation_lock:
+        _generation_counters[name] += amount
+
+class QuizParseError(ValueError):
+    """The model's output could not be turned into a usable quiz."""
+
+def _inline_refs(schema: Any, defs: Dict[str, Any]) -> Any:
+    if isinstance(schema, dict):
+        if "$ref" in schema:
+            return _inline_refs(defs[schema["$ref"].split("/")[-1]], defs)
+        return {key: _inline_refs(value, defs) for key, value in schema.items() if key != "$defs"}
+    if isinstance(schema, list):
+        return [_inline_refs(item, defs) for item in schema]
+    return schema
+
+def quiz_function_schema() -> Dict[str, Any]:
+    """JSON schema for the create_quiz function, derived from the QuizQuestion model."""
+    question = QuizQuestion.model_json_schema()
+    question = _inline_refs(question, question.get("$defs", {}))
+    # Difficulty is set by the caller, not the model
+    question["properties"].pop("difficulty", None)
+    question["required"] = ["question", "question_type", "correct_answer", "explanation"]
+    return {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string", "description": "Short, fun quiz title"},
+            "questions": {"type": "array", "items": question, "minItems": 1}
+        },
+        "required": ["title", "questions"]
+    }
+
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_LINE_COMMENT = re.compile(r'("(?:[^"\\]|\\.)*")|//[^\n]*')
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+def parse_quiz_json(content: str) -> Dict[str, Any]:
+    """Parse model output as a quiz object, repairing common formatting slips.
+
+    Handles markdown fences, prose around the object, // comments, smart
+    quotes and trailing commas. Raises QuizParseError if nothing parses.
+    """
+    text = (content or "").strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        text = _FENCE.sub("", text)
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise QuizParseError("No JSON object in model output")
+        text = text[start:end + 1]
+        text = _LINE_COMMENT.sub(lambda m: m.group(1) or "", text)
+        text = _TRAILING_COMMA.sub(r"\1", text)
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            # Last resort: curly quotes used as JSON string delimiters
+            try:
+                data = json.loads(text.translate(_SMART_QUOTES))
+            except json.JSONDecodeError as e:
+                raise QuizParseError(f"Invalid JSON: {e}") from e
+        _count_generation("repaired")
+    if not isinstance(data, dict):
+        raise QuizParseError("Model output is not a JSON object")
+    return data
+
+_QUESTION_TYPE_ALIASES = {
+    "true/false": "true_false", "truefalse": "true_false", "true_or_false": "true_false",
+    "multiple choice": "multiple_choice", "multiplechoice": "multiple_choice",
+    "fill in the blank": "fill_blank", "fill_in_the_blank": "fill_blank", "fill-in-the-blank": "fill_blank",
+    "short answer": "short_answer",
+}
+
+def _build_questions(quiz_data: Dict[str, Any], difficulty: DifficultyLevel) -> List[QuizQuestion]:
+    """Validate the model's questions, normalizing small deviations and dropping unusable ones."""
+    questions = []
+    for q_data in quiz_data.get("questions") or []:
+        if not isinstance(q_data, dict):
+            continue
+        question_type = str(q_data.get("question_type", "multiple_choice")).strip().lower()
+        question_type = _QUESTION_TYPE_ALIASES.get(question_type, question_type.replace("-", "_").replace(" ", "_"))
+        options = q_data.get("options") or None
+        correct_answer = str(q_data.get("correct_answer", "")).strip()
+        if question_type == QuestionType.MULTIPLE_CHOICE.value and options:
+            # "B" or "b)" style answers refer to an option by letter
+            letter = correct_answer.rstrip(").").upper()
+            if correct_answer not in options and len(letter) == 1 and "A" <= letter < chr(ord("A") + len(options)):
+                correct_answer = options[ord(letter) - ord("A")]
+        try:
+            question = QuizQuestion(
+                question=q_data.get("question", ""),
+                question_type=QuestionType(question_type),
+                correct_answer=correct_answer,
+                options=options,
+                explanation=q_data.get("explanation"),
+                difficulty=difficulty
+            )
+        except (ValueError, TypeError):
+            _count_generation("dropped_questions")
+            continue
+        if not question.question or not question.correct_answer or (
+                question.question_type == QuestionType.MULTIPLE_CHOICE and not (question.options and len(question.options) >= 2)):
+            _count_generation("dropped_questions")
+            continue
+        questions.append(question)
+    if not questions:
+        raise QuizParseError("Quiz has no usable questions")
+    return questions
 
 def generate_quiz_from_explanation(
     explanation: str, 
@@ -17,15 +164,15 @@ def generate_quiz_from_explanation(
     difficulty: DifficultyLevel = DifficultyLevel.MEDIUM,
     num_questions: int = 5
 ) -> Quiz:
-    """Generate a quiz from an explanation using OpenAI."""
-    
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
-        raise ValueError("OpenAI API key not configured")
-    
-    client = OpenAI(api_key=openai_api_key)
-    
-    # Create prompt for quiz generation
+    """Generate a quiz from an explanation using OpenAI, or a fallback quiz if that fails."""
+    try:
+        return _request_quiz(explanation, topic, difficulty, num_questions)
+    except Exception as e:
+        logger.warning(f"⚠️ Quiz generation failed, using fallback quiz: {e}")
+        _count_generation("fallbacks")
+        return create_fallback_quiz(topic, explanation, difficulty)
+
+def _quiz_prompt(explanation: str, topic: str, difficulty: DifficultyLevel, num_questions: int, structured: bool) -> str:
     prompt = f"""
     Create a {difficulty.value} level quiz about this topic: "{topic}"
     
@@ -38,66 +185,229 @@ def generate_quiz_from_explanation(
     3. Clear, simple language
     4. Include explanations for correct answers
     5. Make it fun and engaging
-    
+    """
+    if structured:
+        return prompt + f"""
+    Call the {QUIZ_FUNCTION_NAME} function with the quiz. For multiple choice questions the
+    correct_answer must be the full text of one of the options.
+    """
+    return prompt + """
     Return the quiz as a JSON object with this structure:
-    {{
+    {
         "title": "Quiz title",
         "questions": [
-            {{
+            {
                 "question": "Question text",
                 "question_type": "multiple_choice|true_false|fill_blank",
                 "correct_answer": "Correct answer",
-                "options": ["Option A", "Option B", "Option C", "Option D"], // for multiple choice
+                "options": ["Option A", "Option B", "Option C", "Option D"],
                 "explanation": "Why this answer is correct"
-            }}
+            }
         ]
-    }}
+    }
+    Only include "options" for multiple choice questions.
     """
-    
-    try:
+
+def _complete_quiz(client, messages: List[Dict[str, Any]], structured: bool) -> tuple:
+    """Run one completion and return (raw output, assistant message to echo on retry)."""
+    if structured:
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=2000,
-            temperature=0.7
+            model=QUIZ_MODEL,
+            messages=messages,
+            tools=[{
+                "type": "function",
+                "function": {
+                    "name": QUIZ_FUNCTION_NAME,
+                    "description": "Save a kid-friendly quiz",
+                    "parameters": quiz_function_schema()
+                }
+            }],
+            tool_choice={"type": "function", "function": {"name": QUIZ_FUNCTION_NAME}},
+            max_tokens=QUIZ_MAX_TOKENS,
+            temperature=0.7,
+            timeout=CHAT_TIMEOUT
         )
-        
-        content = response.choices[0].message.content.strip()
-        
-        # Parse JSON response
+        message = response.choices[0].message
+        if not message.tool_calls:
+            return message.content or "", {"role": "assistant", "content": message.content or ""}
+        call = message.tool_calls[0]
+        echo = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{"id": call.id, "type": "function",
+                            "function": {"name": call.function.name, "arguments": call.function.arguments}}]
+        }
+        return call.function.arguments, echo
+
+    response = client.chat.completions.create(
+        model=QUIZ_MODEL,
+        messages=messages,
+        max_tokens=QUIZ_MAX_TOKENS,
+        temperature=0.7,
+        timeout=CHAT_TIMEOUT
+    )
+    content = response.choices[0].message.content or ""
+    return content, {"role": "assistant", "content": content}
+
+def _request_quiz(explanation: str, topic: str, difficulty: DifficultyLevel, num_questions: int) -> Quiz:
+    """Ask the model for a quiz, raising if the call fails or its output cannot be used.
+
+    Output that cannot be parsed or validated gets one targeted retry that
+    tells the model what was wrong with its previous answer.
+    """
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise ValueError("OpenAI API key not configured")
+    
+    client = get_openai_client()
+    structured = QUIZ_GENERATION_MODE == "function"
+    messages: List[Dict[str, Any]] = [
+        {"role": "user", "content": _quiz_prompt(explanation, topic, difficulty, num_questions, structured)}
+    ]
+    _count_generation("requests")
+    
+    for attempt in range(2):
+        raw, echo = _complete_quiz(client, messages, structured)
         try:
-            quiz_data = json.loads(content)
-        except json.JSONDecodeError:
-            # Fallback: create a simple quiz
-            quiz_data = create_fallback_quiz(topic, explanation)
-        
-        # Convert to Quiz model
-        questions = []
-        for q_data in quiz_data.get("questions", []):
-            question = QuizQuestion(
-                question=q_data.get("question", ""),
-                question_type=QuestionType(q_data.get("question_type", "multiple_choice")),
-                correct_answer=q_data.get("correct_answer", ""),
-                options=q_data.get("options"),
-                explanation=q_data.get("explanation"),
-                difficulty=difficulty
-            )
-            questions.append(question)
-        
-        quiz = Quiz(
-            id=str(uuid.uuid4()),
-            title=quiz_data.get("title", f"Quiz about {topic}"),
-            topic=topic,
-            questions=questions,
-            difficulty=difficulty,
-            estimated_time=len(questions) * 2  # 2 minutes per question
-        )
-        
+            quiz_data = parse_quiz_json(raw)
+            questions = _build_questions(quiz_data, difficulty)
+        except QuizParseError as e:
+            _count_generation("parse_failures")
+            if attempt == 1:
+                raise
+            _count_generation("retries")
+            logger.info(f"🔁 Retrying quiz generation after unusable output: {e}")
+            messages.append(echo)
+            correction = (f"That quiz could not be used: {e}. Send the complete quiz again as valid JSON "
+                          "matching the requested structure, with no other text.")
+            if structured and echo.get("tool_calls"):
+                messages.append({"role": "tool", "tool_call_id": echo["tool_calls"][0]["id"], "content": correction})
+            else:
+                messages.append({"role": "user", "content": correction})
+            continue
+        if attempt == 1:
+            _count_generation("retry_successes")
+        break
+    
+    quiz = Quiz(
+        id=str(uuid.uuid4()),
+        title=str(quiz_data.get("title") or f"Quiz about {topic}"),
+        topic=topic,
+        questions=questions,
+        difficulty=difficulty,
+        estimated_time=quiz_timer.estimate_minutes(len(questions))
+    )
+    
+    return quiz
+
+def quiz_generation_stats() -> Dict[str, Any]:
+    with _generation_lock:
+        counters = dict(_generation_counters)
+    requests = counters["requests"]
+    return {
+        "mode": QUIZ_GENERATION_MODE,
+        **counters,
+        "parse_failure_rate": round(counters["parse_failures"] / requests, 4) if requests else 0.0,
+        "fallback_rate": round(counters["fallbacks"] / requests, 4) if requests else 0.0
+    }
+
+# ——— Quiz reuse ———
+_reuse_lock = threading.Lock()
+_reuse_counters = {"reused": 0, "generated": 0, "fallbacks": 0}
+
+def _count_reuse(name: str) -> None:
+    with _reuse_lock:
+        _reuse_counters[name] += 1
+
+def quiz_reuse_key(explanation: str, topic: str, difficulty: DifficultyLevel, num_questions: int) -> str:
+    """Hash the inputs that fully determine a generated quiz."""
+    digest = hashlib.sha256()
+    for part in (explanation, topic, difficulty.value, str(num_questions)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return f"quiz:{digest.hexdigest()}"
+
+def get_or_generate_quiz(
+    explanation: str,
+    topic: str,
+    difficulty: DifficultyLevel = DifficultyLevel.MEDIUM,
+    num_questions: int = 5
+) -> Quiz:
+    """Return a saved quiz for this explanation, generating one only if none is cached.
+
+    Everyone shares the one saved quiz; per-user ordering happens when it is
+    served (quiz_for_user). Fallback quizzes are saved but not cached, so the
+    next request retries.
+    """
+    from .storage import storage
+
+    reuse_key = quiz_reuse_key(explanation, topic, difficulty, num_questions)
+    cached = quiz_cache.get(reuse_key)
+    if cached is not None:
+        _count_reuse("reused")
+        base = Quiz.model_validate(cached)
+    else:
+        try:
+            base = _request_quiz(explanation, topic, difficulty, num_questions)
+        except Exception as e:
+            logger.warning(f"⚠️ Quiz generation failed, using fallback quiz: {e}")
+            _count_reuse("fallbacks")
+            _count_generation("fallbacks")
+            quiz = create_fallback_quiz(topic, explanation, difficulty)
+            save_quiz_to_memory(quiz)
+            return quiz
+        _count_reuse("generated")
+        quiz_cache.set(reuse_key, base.model_dump(mode="json"))
+
+    if storage.get_quiz(base.id) is None:
+        save_quiz_to_memory(base)
+    return base
+
+def quiz_reuse_stats() -> Dict[str, Any]:
+    with _reuse_lock:
+        counters = dict(_reuse_counters)
+    requests = counters["reused"] + counters["generated"] + counters["fallbacks"]
+    return {
+        **counters,
+        "hit_rate": round(counters["reused"] / requests, 4) if requests else 0.0,
+        "shuffle_per_user": QUIZ_SHUFFLE_PER_USER,
+        "cache": quiz_cache.stats()
+    }
+
+# ——— Per-user ordering ———
+def question_order(quiz: Quiz, user_id: Optional[str]) -> List[int]:
+    """Canonical question indexes in the order this user is shown them (stable per quiz and user)."""
+    order = list(range(len(quiz.questions)))
+    if QUIZ_SHUFFLE_PER_USER and user_id:
+        random.Random(f"{quiz.id}|{user_id}").shuffle(order)
+    return order
+
+def quiz_for_user(quiz: Quiz, user_id: Optional[str]) -> Quiz:
+    """The quiz as served to one user: same id, questions and options in their own order.
+
+    Answers to it are keyed by served position; submit them with
+    served_order=True so they are mapped back to the canonical questions.
+    """
+    if not (QUIZ_SHUFFLE_PER_USER and user_id):
         return quiz
-        
-    except Exception as e:
-        # Fallback quiz generation
-        return create_fallback_quiz(topic, explanation, difficulty)
+    rng = random.Random(f"{quiz.id}|{user_id}|options")
+    questions = []
+    for index in question_order(quiz, user_id):
+        question = quiz.questions[index]
+        options = list(question.options) if question.options else question.options
+        # Only shuffle options when the answer is given as option text, not a letter
+        if options and question.correct_answer in options:
+            rng.shuffle(options)
+        questions.append(question.model_copy(update={"options": options}))
+    return quiz.model_copy(update={"questions": questions})
+
+def _to_canonical(by_position: Dict[str, Any], order: List[int]) -> Dict[str, Any]:
+    """Re-key a served-position mapping by canonical question index, dropping unknown keys."""
+    return {
+        str(order[int(position)]): value
+        for position, value in by_position.items()
+        if position.isdigit() and int(position) < len(order)
+    }
 
 def create_fallback_quiz(topic: str, explanation: str, difficulty: DifficultyLevel = DifficultyLevel.MEDIUM) -> Quiz:
     """Create a simple fallback quiz if AI generation fails."""
@@ -138,74 +448,175 @@ def create_fallback_quiz(topic: str, explanation: str, difficulty: DifficultyLev
 
 def save_quiz_to_memory(quiz: Quiz) -> None:
     """Save quiz to memory storage."""
-    from .models import memory_storage
-    memory_storage.quizzes[quiz.id] = quiz
+    from .storage import storage
+    storage.save_quiz(quiz)
 
 def get_quiz_by_id(quiz_id: str) -> Quiz:
     """Get a quiz by ID from memory storage."""
-    from .models import memory_storage
-    return memory_storage.quizzes.get(quiz_id)
+    from .storage import storage
+    return storage.get_quiz(quiz_id)
 
 def get_quizzes_by_topic(topic: str) -> List[Quiz]:
     """Get all quizzes for a specific topic."""
-    from .models import memory_storage
-    return [quiz for quiz in memory_storage.quizzes.values() if quiz.topic.lower() == topic.lower()]
+    from .storage import storage
+    return storage.quizzes_by_topic(topic)
+
+def submit_quiz_attempt(quiz_id: str, user_id: str, answers: Dict[str, str],
+                        attempt_token: Optional[str] = None, served_order: bool = False) -> Dict[str, Any]:
+    """Submit a quiz attempt and calculate score.
 
-def submit_quiz_attempt(quiz_id: str, user_id: str, answers: Dict[str, str]) -> Dict[str, Any]:
-    """Submit a quiz attempt and calculate score."""
+    With the token from start_quiz_attempt the server-measured time taken and
+    per-question times are recorded; without one the attempt is untimed.
+    served_order means answers (and timed question ids) are positions in the
+    quiz_for_user ordering; they are stored against the canonical questions.
+    Raises AttemptTokenError for a bad or reused token.
+    """
     quiz = get_quiz_by_id(quiz_id)
     if not quiz:
         raise ValueError("Quiz not found")
     
-    # Calculate score
-    correct_answers = 0
-    total_questions = len(quiz.questions)
+    time_taken, question_times = 0, {}
+    if attempt_token:
+        time_taken, question_times = quiz_timer.finish(attempt_token, quiz_id, user_id)
+    if served_order:
+        order = question_order(quiz, user_id)
+        answers = _to_canonical(answers, order)
+        question_times = _to_canonical(question_times, order)
     
-    for i, question in enumerate(quiz.questions):
-        question_id = str(i)
-        user_answer = answers.get(question_id, "")
-        
-        if question.question_type == QuestionType.TRUE_FALSE:
-            if user_answer.lower() == question.correct_answer.lower():
-                correct_answers += 1
-        elif question.question_type == QuestionType.MULTIPLE_CHOICE:
-            if user_answer == question.correct_answer:
-                correct_answers += 1
-        elif question.question_type == QuestionType.FILL_BLANK:
-            if user_answer.lower().strip() == question.correct_answer.lower().strip():
-                correct_answers += 1
-        elif question.question_type == QuestionType.SHORT_ANSWER:
-            # Simple keyword matching for short answers
-            if any(keyword in user_answer.lower() for keyword in question.correct_answer.lower().split()):
-                correct_answers += 1
+    # Calculate score (same rules as batch grading)
+    total_questions = len(quiz.questions)
+    correct_answers = int(score_matrix(quiz, [answers]).sum())
     
     score = (correct_answers / total_questions) * 100
     
     # Create quiz attempt
-    from .models import QuizAttempt, memory_storage
+    from .models import QuizAttempt
+    from .storage import storage
     attempt = QuizAttempt(
         quiz_id=quiz_id,
         user_id=user_id,
         score=score,
         total_questions=total_questions,
         correct_answers=correct_answers,
-        time_taken=0,  # TODO: Track actual time
-        answers=answers
+        time_taken=time_taken,
+        answers=answers,
+        question_times=question_times
     )
     
-    # Save attempt
-    if user_id not in memory_storage.quiz_attempts:
-        memory_storage.quiz_attempts[user_id] = []
-    memory_storage.quiz_attempts[user_id].append(attempt)
+    # Save attempt and fold it into the user's progress on the topic
+    from .progress import record_quiz_attempt
+    with storage.transaction():
+        storage.add_attempt(attempt)
+        record_quiz_attempt(user_id, quiz.topic, score, attempt.time_taken, at=attempt.completed_at)
+    
+    quiz_timer.observe(quiz_id, total_questions, question_times)
+    if question_times:
+        # Keep the catalog's estimate in line with how long the quiz really takes
+        estimated_time = quiz_timer.estimate_minutes(total_questions, quiz_id)
+        if estimated_time != quiz.estimated_time:
+            storage.save_quiz(quiz.model_copy(update={"estimated_time": estimated_time}))
     
     return {
         "score": score,
         "correct_answers": correct_answers,
         "total_questions": total_questions,
+        "time_taken": time_taken,
         "feedback": generate_feedback(score, quiz.difficulty),
         "attempt_id": str(uuid.uuid4())
     }
 
+def start_quiz_attempt(quiz_id: str, user_id: str) -> Dict[str, Any]:
+    """Open a timed attempt at a quiz and return its signed attempt token."""
+    quiz = get_quiz_by_id(quiz_id)
+    if not quiz:
+        raise ValueError("Quiz not found")
+    
+    started = quiz_timer.start(quiz_id, user_id)
+    started["estimated_time"] = quiz.estimated_time
+    return started
+
+def record_quiz_answer(quiz_id: str, user_id: str, question_id: str, attempt_token: str) -> float:
+    """Stamp an answer during a timed attempt; returns seconds since the attempt started.
+
+    Raises AttemptTokenError for a bad token and UnknownQuestionError for a
+    question id outside the quiz.
+    """
+    quiz = get_quiz_by_id(quiz_id)
+    if not quiz:
+        raise ValueError("Quiz not found")
+    
+    return quiz_timer.record_answer(attempt_token, quiz_id, user_id, question_id, len(quiz.questions))
+
+def quiz_timing_report(quiz_id: str) -> Dict[str, Any]:
+    """Per-question timing histograms and slow questions for a quiz."""
+    quiz = get_quiz_by_id(quiz_id)
+    if not quiz:
+        raise ValueError("Quiz not found")
+    
+    return quiz_timer.quiz_timing(quiz_id, len(quiz.questions))
+
+def grade_quiz_batch(quiz_id: str, answer_sets: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Grade many answer sets for one quiz without recording them."""
+    quiz = get_quiz_by_id(quiz_id)
+    if not quiz:
+        raise ValueError("Quiz not found")
+    
+    graded = grade_attempts(quiz, answer_sets)
+    graded.pop("correct")
+    graded["quiz_id"] = quiz_id
+    graded["attempts"] = len(answer_sets)
+    return graded
+
+def quiz_analytics(quiz_id: str) -> Dict[str, Any]:
+    """Item statistics over every recorded attempt at a quiz."""
+    from .storage import storage
+    attempts = storage.attempts_for_quiz(quiz_id)
+    graded = grade_quiz_batch(quiz_id, [attempt.answers for attempt in attempts])
+    # Per-attempt scores are already stored; only the aggregate is useful here
+    del graded["correct_answers"], graded["scores"]
+    return graded
+
+def generate_and_save_quiz(
+    explanation: str,
+    topic: str,
+    difficulty: str = DifficultyLevel.MEDIUM.value,
+    num_questions: int = 5,
+    user_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Reuse or generate a quiz, save it and return its id (the "quiz" background job).
+
+    user_id stays in the job payload for ownership checks; the quiz itself is shared.
+    """
+    quiz = get_or_generate_quiz(
+        explanation=explanation,
+        topic=topic,
+        difficulty=DifficultyLevel(difficulty),
+        num_questions=num_questions
+    )
+    return {"quiz_id": quiz.id}
+
+def enqueue_quiz_generation(
+    explanation: str,
+    topic: str,
+    user_id: str,
+    difficulty: DifficultyLevel = DifficultyLevel.MEDIUM,
+    num_questions: int = 5
+) -> str:
+    """Queue quiz generation in the background and return the job id."""
+    return job_queue.submit(
+        "quiz",
+        {
+            "explanation": explanation,
+            "topic": topic,
+            "difficulty": difficulty.value,
+            "num_questions": num_questions,
+            "user_id": user_id
+        },
+        user_id=user_id
+    )
+
+job_queue.register("quiz", generate_and_save_quiz)
+
 def generate_feedback(score: float, difficulty: DifficultyLevel) -> str:
     """Generate feedback based on quiz score."""
     if score >= 90:
@@ -0,0 +1,414 @@
+"""
+Quiz attempt timing for WonderBot
+
+Starting a quiz issues a signed attempt token carrying the server start time;
+answers posted with the token are stamped on the server, and submitting it
+gives the real time taken plus the seconds spent on each question. Per-question
+times are folded into fixed-bucket histograms per quiz (one small integer
+array per quiz), which is enough to estimate how long a quiz takes and to spot
+questions that hold children up.
+
+Answer stamps and the "already submitted" markers that stop a token being
+replayed live in memory by default, which only holds with a single worker
+process. Set QUIZ_ATTEMPT_BACKEND=sqlite to keep them in a SQLite file that
+every worker shares.
+"""
+
+import os
+import math
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import jwt
+import numpy as np
+
+from .auth import SECRET_KEY, ALGORITHM
+from .storage import storage
+
+# ——— Configuration (overridable from the environment) ———
+QUIZ_ATTEMPT_BACKEND = os.getenv("QUIZ_ATTEMPT_BACKEND", "memory")
+QUIZ_ATTEMPT_PATH = os.getenv("QUIZ_ATTEMPT_PATH", os.path.join(os.getcwd(), "cache", "quiz_attempts.sqlite3"))
+QUIZ_ATTEMPT_TTL_SECONDS = int(os.getenv("QUIZ_ATTEMPT_TTL_SECONDS", str(2 * 60 * 60)))
+QUIZ_ATTEMPT_MAX_OPEN = int(os.getenv("QUIZ_ATTEMPT_MAX_OPEN", "10000"))
+QUIZ_TIMING_MIN_SAMPLES = int(os.getenv("QUIZ_TIMING_MIN_SAMPLES", "5"))
+SLOW_QUESTION_FACTOR = float(os.getenv("SLOW_QUESTION_FACTOR", "1.5"))
+DEFAULT_MINUTES_PER_QUESTION = 2
+# Upper bucket edges in seconds; the last bucket collects everything slower
+TIMING_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+_EDGES = np.array((0,) + TIMING_BUCKETS, dtype=float)
+ATTEMPT_TOKEN_TYPE = "quiz_attempt"
+
+class AttemptTokenError(Exception):
+    """The attempt token is missing, invalid, expired, or for another quiz or user."""
+
+class UnknownQuestionError(ValueError):
+    """The question id is not an index into the quiz's questions."""
+
+def _histogram_quantile(counts: np.ndarray, q: float) -> Optional[float]:
+    """Quantile of a bucketed histogram, interpolating linearly inside the bucket."""
+    total = counts.sum()
+    if not total:
+        return None
+    cumulative = np.cumsum(counts)
+    bucket = min(int(np.searchsorted(cumulative, q * total)), len(TIMING_BUCKETS) - 1)
+    before = cumulative[bucket - 1] if bucket else 0
+    fraction = (q * total - before) / counts[bucket] if counts[bucket] else 0.0
+    low, high = _EDGES[bucket], _EDGES[bucket + 1]
+    return round(float(low + (high - low) * fraction), 1)
+
+class MemoryAttemptStore:
+    """Answer stamps and submitted markers for open attempts, in this process only."""
+
+    def __init__(self, max_open: int = QUIZ_ATTEMPT_MAX_OPEN):
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        # attempt_id -> {question_id: first server timestamp}; None once submitted
+        self._attempts: "OrderedDict[str, Optional[Dict[str, float]]]" = OrderedDict()
+
+    def open(self, attempt_id: str, expires_at: float) -> None:
+        with self._lock:
+            self._attempts[attempt_id] = {}
+            while len(self._attempts) > self.max_open:
+                self._attempts.popitem(last=False)
+
+    def mark(self, attempt_id: str, question_id: str, at: float) -> bool:
+        """Keep the first stamp for a question; False if the attempt was already submitted."""
+        with self._lock:
+            if attempt_id in self._attempts and self._attempts[attempt_id] is None:
+                return False
+            marks = self._attempts.get(attempt_id)
+            if marks is not None:
+                marks.setdefault(question_id, at)
+            return True
+
+    def close(self, attempt_id: str, expires_at: float) -> Optional[Dict[str, float]]:
+        """Mark the attempt submitted and return its stamps; None if it was already submitted."""
+        with self._lock:
+            if attempt_id in self._attempts and self._attempts[attempt_id] is None:
+                return None
+            marks = self._attempts.pop(attempt_id, None) or {}
+            # Remember the submission so the token cannot be replayed
+            self._attempts[attempt_id] = None
+            return marks
+
+    def open_count(self) -> int:
+        with self._lock:
+            return sum(1 for marks in self._attempts.values() if marks is not None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._attempts.clear()
+
+class SQLiteAttemptStore:
+    """Answer stamps and submitted markers in SQLite, shared across worker processes.
+
+    Rows are kept until the attempt's token expires; after that the token
+    itself is rejected, so the replay marker is no longer needed.
+    """
+
+    def __init__(self, path: str = QUIZ_ATTEMPT_PATH):
+        self._lock = threading.Lock()
+        self._opened = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS attempts (
+                id TEXT PRIMARY KEY,
+                submitted INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_attempts_expiry ON attempts(expires_at)")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS attempt_marks (
+                attempt_id TEXT NOT NULL,
+                question_id TEXT NOT NULL,
+                at REAL NOT NULL,
+                PRIMARY KEY (attempt_id, question_id)
+            ) WITHOUT ROWID"""
+        )
+
+    def open(self, attempt_id: str, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO attempts (id, submitted, expires_at) VALUES (?, 0, ?)", (attempt_id, expires_at)
+            )
+            self._opened += 1
+            # Purge occasionally rather than on every start
+            if self._opened % 1000 == 0:
+                self._purge_expired()
+
+    def _purge_expired(self) -> None:
+        """Drop attempts whose tokens have expired. Caller holds the lock."""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "DELETE FROM attempt_marks WHERE attempt_id IN (SELECT id FROM attempts WHERE expires_at < ?)", (now,)
+            )
+            self._conn.execute("DELETE FROM attempts WHERE expires_at < ?", (now,))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def mark(self, attempt_id: str, question_id: str, at: float) -> bool:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT submitted FROM attempts WHERE id = ?", (attempt_id,)).fetchone()
+                if row and row[0]:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO attempt_marks (attempt_id, question_id, at) VALUES (?, ?, ?)",
+                    (attempt_id, question_id, at)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def close(self, attempt_id: str, expires_at: float) -> Optional[Dict[str, float]]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT submitted FROM attempts WHERE id = ?", (attempt_id,)).fetchone()
+                if row and row[0]:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO attempts (id, submitted, expires_at) VALUES (?, 1, ?)",
+                    (attempt_id, expires_at)
+                )
+                marks = dict(self._conn.execute(
+                    "SELECT question_id, at FROM attempt_marks WHERE attempt_id = ?", (attempt_id,)
+                ).fetchall())
+                self._conn.execute("DELETE FROM attempt_marks WHERE attempt_id = ?", (attempt_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return marks
+
+    def open_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM attempts WHERE submitted = 0 AND expires_at >= ?", (time.time(),)
+            ).fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM attempt_marks")
+            self._conn.execute("DELETE FROM attempts")
+
+def create_attempt_store(backend: str = QUIZ_ATTEMPT_BACKEND):
+    """Build the attempt store for the configured backend."""
+    if backend == "sqlite":
+        return SQLiteAttemptStore()
+    if backend == "memory":
+        return MemoryAttemptStore()
+    raise ValueError(f"Unknown quiz attempt backend: {backend}")
+
+class QuizTimer:
+    """Issues attempt tokens, stamps answers and keeps per-question latency histograms."""
+
+    def __init__(self, ttl_seconds: int = QUIZ_ATTEMPT_TTL_SECONDS, store=None):
+        self.ttl_seconds = ttl_seconds
+        self.store = store if store is not None else create_attempt_store()
+        self._lock = threading.Lock()
+        # quiz_id -> (questions x buckets) counts, built lazily from stored attempts
+        self._histograms: Dict[str, np.ndarray] = {}
+        self._samples: Dict[str, int] = {}
+        self._global: Optional[np.ndarray] = None
+        self.started = 0
+        self.submitted = 0
+        self.rejected = 0
+
+    # ——— Attempt tokens ———
+
+    def start(self, quiz_id: str, user_id: str) -> Dict[str, Any]:
+        """Open an attempt and return its signed token."""
+        attempt_id = str(uuid.uuid4())
+        started_at = time.time()
+        token = jwt.encode({
+            "typ": ATTEMPT_TOKEN_TYPE,
+            "aid": attempt_id,
+            "quiz": quiz_id,
+            "sub": user_id,
+            "started": started_at,
+            "exp": int(started_at) + self.ttl_seconds
+        }, SECRET_KEY, algorithm=ALGORITHM)
+        self.store.open(attempt_id, int(started_at) + self.ttl_seconds)
+        with self._lock:
+            self.started += 1
+        return {"attempt_token": token, "attempt_id": attempt_id, "expires_in": self.ttl_seconds}
+
+    def _claims(self, token: str, quiz_id: str, user_id: str) -> Dict[str, Any]:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.PyJWTError:
+            claims = None
+        if (not claims or claims.get("typ") != ATTEMPT_TOKEN_TYPE
+                or claims.get("quiz") != quiz_id or claims.get("sub") != user_id):
+            with self._lock:
+                self.rejected += 1
+            raise AttemptTokenError("Invalid or expired attempt token")
+        return claims
+
+    def record_answer(self, token: str, quiz_id: str, user_id: str, question_id: str, num_questions: int) -> float:
+        """Stamp the first answer to a question; returns seconds since the attempt started."""
+        claims = self._claims(token, quiz_id, user_id)
+        if not (str(question_id).isdigit() and int(question_id) < num_questions):
+            raise UnknownQuestionError(f"Question {question_id} is not part of this quiz")
+        question_id = str(int(question_id))
+        now = time.time()
+        if not self.store.mark(claims["aid"], question_id, now):
+            raise AttemptTokenError("Attempt already submitted")
+        return round(now - claims["started"], 2)
+
+    def finish(self, token: str, quiz_id: str, user_id: str) -> Tuple[int, Dict[str, float]]:
+        """Close an attempt and return (seconds taken, seconds per answered question).
+
+        Each question is charged the time between the previous stamped answer
+        (or the start) and its own. Attempts opened before a restart still get
+        the total time, just without the per-question split.
+        """
+        claims = self._claims(token, quiz_id, user_id)
+        now = time.time()
+        marks = self.store.close(claims["aid"], claims["exp"])
+        with self._lock:
+            if marks is None:
+                self.rejected += 1
+                raise AttemptTokenError("Attempt already submitted")
+            self.submitted += 1
+        question_times = {}
+        previous = claims["started"]
+        for question_id, stamped in sorted(marks.items(), key=lambda item: item[1]):
+            question_times[question_id] = round(stamped - previous, 2)
+            previous = stamped
+        return max(0, int(round(now - claims["started"]))), question_times
+
+    # ——— Histograms ———
+
+    def _quiz_histogram(self, quiz_id: str, num_questions: int) -> np.ndarray:
+        """Histogram for a quiz; the first use replays stored attempts. Caller holds the lock."""
+        histogram = self._histograms.get(quiz_id)
+        if histogram is None:
+            histogram = np.zeros((num_questions, len(TIMING_BUCKETS)), dtype=np.int32)
+            samples = 0
+            for attempt in storage.attempts_for_quiz(quiz_id):
+                if attempt.question_times:
+                    self._add(histogram, attempt.question_times)
+                    samples += 1
+            self._histograms[quiz_id] = histogram
+            self._samples[quiz_id] = samples
+        return histogram
+
+    def _global_histogram(self) -> np.ndarray:
+        """Histogram over every question of every quiz. Caller holds the lock."""
+        if self._global is None:
+            self._global = np.zeros(len(TIMING_BUCKETS), dtype=np.int64)
+            for attempts in storage.attempts_by_user().values():
+                for attempt in attempts:
+                    self._add_global(attempt.question_times)
+        return self._global
+
+    @staticmethod
+    def _buckets(seconds: List[float]) -> np.ndarray:
+        return np.minimum(np.searchsorted(_EDGES[1:], seconds), len(TIMING_BUCKETS) - 1)
+
+    def _add(self, histogram: np.ndarray, question_times: Dict[str, float]) -> None:
+        rows = [(int(q), t) for q, t in question_times.items() if q.isdigit() and int(q) < len(histogram)]
+        if rows:
+            indexes, seconds = zip(*rows)
+            np.add.at(histogram, (np.array(indexes), self._buckets(list(seconds))), 1)
+
+    def _add_global(self, question_times: Dict[str, float]) -> None:
+        if question_times:
+            np.add.at(self._global, self._buckets(list(question_times.values())), 1)
+
+    def observe(self, quiz_id: str, num_questions: int, question_times: Dict[str, float]) -> None:
+        """Fold a submitted attempt's per-question times into the histograms."""
+        if not question_times:
+            return
+        with self._lock:
+            # Loading from storage already includes the attempt if it was saved first
+            loaded = quiz_id in self._histograms
+            histogram = self._quiz_histogram(quiz_id, num_questions)
+            if loaded:
+                self._add(histogram, question_times)
+                self._samples[quiz_id] += 1
+            if self._global is None:
+                self._global_histogram()
+            else:
+                self._add_global(question_times)
+
+    def estimate_minutes(self, num_questions: int, quiz_id: Optional[str] = None) -> int:
+        """Estimated minutes for a quiz, from its own timings or all timings, else 2 per question."""
+        with self._lock:
+            if quiz_id is not None and quiz_id in self._histograms and self._samples[quiz_id] >= QUIZ_TIMING_MIN_SAMPLES:
+                medians = [_histogram_quantile(row, 0.5) or 0.0 for row in self._histograms[quiz_id]]
+                return max(1, math.ceil(sum(medians) / 60))
+            overall = self._global_histogram()
+            if overall.sum() >= QUIZ_TIMING_MIN_SAMPLES * max(1, num_questions):
+                return max(1, math.ceil(num_questions * _histogram_quantile(overall, 0.5) / 60))
+        return num_questions * DEFAULT_MINUTES_PER_QUESTION
+
+    def quiz_timing(self, quiz_id: str, num_questions: int) -> Dict[str, Any]:
+        """Per-question median/p90 seconds with slow questions flagged."""
+        with self._lock:
+            histogram = self._quiz_histogram(quiz_id, num_questions).copy()
+            samples = self._samples[quiz_id]
+        medians = [_histogram_quantile(row, 0.5) for row in histogram]
+        known = [median for median in medians if median is not None]
+        typical = float(np.median(known)) if known else None
+        questions = [
+            {
+                "question_id": str(i),
+                "answers": int(row.sum()),
+                "median_seconds": median,
+                "p90_seconds": _histogram_quantile(row, 0.9),
+                "slow": bool(typical and median is not None and median > SLOW_QUESTION_FACTOR * typical),
+                "histogram": row.tolist()
+            }
+            for i, (row, median) in enumerate(zip(histogram, medians))
+        ]
+        return {
+            "quiz_id": quiz_id,
+            "timed_attempts": samples,
+            "estimated_time": self.estimate_minutes(num_questions, quiz_id),
+            "bucket_upper_seconds": list(TIMING_BUCKETS[:-1]) + [None],
+            "slow_questions": [q["question_id"] for q in questions if q["slow"]],
+            "questions": questions
+        }
+
+    def reset(self) -> None:
+        self.store.clear()
+        with self._lock:
+            self._histograms.clear()
+            self._samples.clear()
+            self._global = None
+
+    def stats(self) -> Dict[str, Any]:
+        open_attempts = self.store.open_count()
+        with self._lock:
+            return {
+                "backend": type(self.store).__name__,
+                "open_attempts": open_attempts,
+                "started": self.started,
+                "submitted": self.submitted,
+                "rejected_tokens": self.rejected,
+                "quizzes_with_histograms": len(self._histograms),
+                "histogram_bytes": sum(h.nbytes for h in self._histograms.values())
+            }
+
+# Global quiz timer
+quiz_timer = QuizTimer()
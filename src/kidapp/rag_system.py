@@ -4,22 +4,112 @@ Retrieval-Augmented Generation (RAG) System for WonderBot
 
 import os
 import json
-import uuid
-from typing import List, Dict, Any, Optional
+import hashlib
+from typing import List, Dict, Any, Optional, Set
 from datetime import datetime
 
+from .cache_keys import age_group_for
+from .embeddings import get_embedder, get_query_embeddings, cosine_from_distance
+
 # Try to import RAG dependencies, with fallback
 try:
     import chromadb
     from chromadb.config import Settings
     import numpy as np
-    from openai import OpenAI
+    from .openai_clients import get_openai_client, CHAT_TIMEOUT
     RAG_AVAILABLE = True
 except ImportError as e:
     print(f"⚠️ RAG dependencies not available: {e}")
     print("🔧 Falling back to basic response generation")
     RAG_AVAILABLE = False
 
+RAG_CHAT_MODEL = "gpt-3.5-turbo"
+RAG_MAX_TOKENS = 300
+RAG_ERROR_RESPONSE = "I'm having trouble finding information about that right now. Let's explore something else together!"
+# Calibrated similarity (0..1) a document needs to be used as context
+RAG_RELEVANCE_THRESHOLD = float(os.getenv("RAG_RELEVANCE_THRESHOLD", "0.35"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+
+# Seed documents loaded into an empty knowledge base
+EDUCATIONAL_CONTENT = [
+    # Science
+    {
+        "content": "The solar system consists of the Sun and the objects that orbit it, including eight planets: Mercury, Venus, Earth, Mars, Jupiter, Saturn, Uranus, and Neptune. The Sun is a star that provides light and heat to Earth.",
+        "metadata": {"category": "science", "topic": "solar_system", "age_group": "6-12"}
+    },
+    {
+        "content": "Photosynthesis is the process by which plants make their own food using sunlight, water, and carbon dioxide. This process produces oxygen that humans and animals need to breathe.",
+        "metadata": {"category": "science", "topic": "photosynthesis", "age_group": "6-12"}
+    },
+    {
+        "content": "The water cycle describes how water moves through the environment. It includes evaporation (water turning to vapor), condensation (vapor forming clouds), and precipitation (rain, snow, or hail falling).",
+        "metadata": {"category": "science", "topic": "water_cycle", "age_group": "6-12"}
+    },
+    {
+        "content": "Animals can be classified into different groups: mammals (have fur, give birth to live young), birds (have feathers, lay eggs), reptiles (have scales, lay eggs), amphibians (live in water and land), and fish (live in water, have gills).",
+        "metadata": {"category": "science", "topic": "animal_classification", "age_group": "6-12"}
+    },
+    
+    # Geography
+    {
+        "content": "The Earth has seven continents: Asia, Africa, North America, South America, Antarctica, Europe, and Australia. Each continent has unique features like mountains, rivers, and different types of plants and animals.",
+        "metadata": {"category": "geography", "topic": "continents", "age_group": "6-12"}
+    },
+    {
+        "content": "Mountains are formed when Earth's tectonic plates move and push against each other. The highest mountain in the world is Mount Everest, which is 29,029 feet tall.",
+        "metadata": {"category": "geography", "topic": "mountains", "age_group": "6-12"}
+    },
+    {
+        "content": "Oceans cover about 71% of Earth's surface. The five main oceans are the Pacific, Atlantic, Indian, Southern, and Arctic oceans. The Pacific Ocean is the largest and deepest.",
+        "metadata": {"category": "geography", "topic": "oceans", "age_group": "6-12"}
+    },
+    
+    # History
+    {
+        "content": "Ancient Egypt was one of the first civilizations, known for building pyramids, creating hieroglyphics (picture writing), and having pharaohs as rulers. The Great Pyramid of Giza is one of the Seven Wonders of the Ancient World.",
+        "metadata": {"category": "history", "topic": "ancient_egypt", "age_group": "6-12"}
+    },
+    {
+        "content": "The Roman Empire was one of the largest empires in history. Romans built roads, aqueducts (water systems), and famous buildings like the Colosseum. They also created the calendar we use today.",
+        "metadata": {"category": "history", "topic": "roman_empire", "age_group": "6-12"}
+    },
+    
+    # Math
+    {
+        "content": "Addition is combining numbers to find the total. For example, 2 + 3 = 5. Subtraction is taking away numbers to find the difference. For example, 5 - 2 = 3.",
+        "metadata": {"category": "math", "topic": "basic_operations", "age_group": "6-12"}
+    },
+    {
+        "content": "Multiplication is repeated addition. For example, 3 x 4 means adding 3 four times: 3 + 3 + 3 + 3 = 12. Division is sharing equally. For example, 12 ÷ 3 = 4 means sharing 12 items among 3 groups.",
+        "metadata": {"category": "math", "topic": "multiplication_division", "age_group": "6-12"}
+    },
+    
+    # Technology
+    {
+        "content": "Computers are machines that can process information quickly. They have parts like a CPU (brain), memory (storage), and input devices like keyboards and mice. The internet connects computers around the world.",
+        "metadata": {"category": "technology", "topic": "computers", "age_group": "6-12"}
+    },
+    {
+        "content": "Robots are machines that can perform tasks automatically. Some robots help in factories, others explore space, and some help with household chores. They are programmed with instructions to follow.",
+        "metadata": {"category": "technology", "topic": "robots", "age_group": "6-12"}
+    }
+]
+
+def document_id_for(content: str) -> str:
+    """Content-addressed document id, so adding the same text twice stores it once."""
+    normalized = " ".join(content.split())
+    return "kb_" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+def collection_name_for(model_id: str, dim: int) -> str:
+    """Chroma collection for one embedding model and dimension.
+
+    Vectors from different models (or sizes of one model) are not comparable,
+    so each gets its own collection; the model id is hashed to keep the name
+    within Chroma's length and character rules.
+    """
+    backend = model_id.split(":", 1)[0]
+    return f"wonderbot_knowledge_{backend}_{dim}_{hashlib.sha256(model_id.encode('utf-8')).hexdigest()[:12]}"
+
 class RAGSystem:
     def __init__(self):
         """Initialize the RAG system with vector database and embedding model."""
@@ -35,7 +125,11 @@ class RAGSystem:
             return
             
         try:
-            self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            self.client = get_openai_client()
+            self.embedding_model = get_embedder()
+            self.query_embeddings = get_query_embeddings()
+            self.retrievals = 0
+            self.off_topic = 0
             
             # Initialize ChromaDB for vector storage
             self.chroma_client = chromadb.PersistentClient(
@@ -43,11 +137,18 @@ class RAGSystem:
                 settings=Settings(anonymized_telemetry=False)
             )
             
-            # Create or get collection
+            # Create or get the collection for this model's vectors; the probe
+            # vector goes through the query cache, so restarts don't re-embed it
+            dim = int(self.query_embeddings.embed("embedding dimension probe").shape[0])
             self.collection = self.chroma_client.get_or_create_collection(
-                name="wonderbot_knowledge",
-                metadata={"description": "Educational content for WonderBot RAG system"}
+                name=collection_name_for(self.embedding_model.model_id, dim),
+                metadata={
+                    "description": "Educational content for WonderBot RAG system",
+                    "embedding_model": self.embedding_model.model_id,
+                    "embedding_dim": dim
+                }
             )
+            self.distance_space = (self.collection.metadata or {}).get("hnsw:space", "l2")
             
             # Initialize with educational content
             self._initialize_knowledge_base()
@@ -67,194 +168,183 @@ class RAGSystem:
     
     def _load_educational_content(self):
         """Load educational content into the vector database."""
-        educational_content = [
-            # Science
-            {
-                "content": "The solar system consists of the Sun and the objects that orbit it, including eight planets: Mercury, Venus, Earth, Mars, Jupiter, Saturn, Uranus, and Neptune. The Sun is a star that provides light and heat to Earth.",
-                "metadata": {"category": "science", "topic": "solar_system", "age_group": "6-12"}
-            },
-            {
-                "content": "Photosynthesis is the process by which plants make their own food using sunlight, water, and carbon dioxide. This process produces oxygen that humans and animals need to breathe.",
-                "metadata": {"category": "science", "topic": "photosynthesis", "age_group": "6-12"}
-            },
-            {
-                "content": "The water cycle describes how water moves through the environment. It includes evaporation (water turning to vapor), condensation (vapor forming clouds), and precipitation (rain, snow, or hail falling).",
-                "metadata": {"category": "science", "topic": "water_cycle", "age_group": "6-12"}
-            },
-            {
-                "content": "Animals can be classified into different groups: mammals (have fur, give birth to live young), birds (have feathers, lay eggs), reptiles (have scales, lay eggs), amphibians (live in water and land), and fish (live in water, have gills).",
-                "metadata": {"category": "science", "topic": "animal_classification", "age_group": "6-12"}
-            },
-            
-            # Geography
-            {
-                "content": "The Earth has seven continents: Asia, Africa, North America, South America, Antarctica, Europe, and Australia. Each continent has unique features like mountains, rivers, and different types of plants and animals.",
-                "metadata": {"category": "geography", "topic": "continents", "age_group": "6-12"}
-            },
-            {
-                "content": "Mountains are formed when Earth's tectonic plates move and push against each other. The highest mountain in the world is Mount Everest, which is 29,029 feet tall.",
-                "metadata": {"category": "geography", "topic": "mountains", "age_group": "6-12"}
-            },
-            {
-                "content": "Oceans cover about 71% of Earth's surface. The five main oceans are the Pacific, Atlantic, Indian, Southern, and Arctic oceans. The Pacific Ocean is the largest and deepest.",
-                "metadata": {"category": "geography", "topic": "oceans", "age_group": "6-12"}
-            },
-            
-            # History
-            {
-                "content": "Ancient Egypt was one of the first civilizations, known for building pyramids, creating hieroglyphics (picture writing), and having pharaohs as rulers. The Great Pyramid of Giza is one of the Seven Wonders of the Ancient World.",
-                "metadata": {"category": "history", "topic": "ancient_egypt", "age_group": "6-12"}
-            },
-            {
-                "content": "The Roman Empire was one of the largest empires in history. Romans built roads, aqueducts (water systems), and famous buildings like the Colosseum. They also created the calendar we use today.",
-                "metadata": {"category": "history", "topic": "roman_empire", "age_group": "6-12"}
-            },
-            
-            # Math
-            {
-                "content": "Addition is combining numbers to find the total. For example, 2 + 3 = 5. Subtraction is taking away numbers to find the difference. For example, 5 - 2 = 3.",
-                "metadata": {"category": "math", "topic": "basic_operations", "age_group": "6-12"}
-            },
-            {
-                "content": "Multiplication is repeated addition. For example, 3 x 4 means adding 3 four times: 3 + 3 + 3 + 3 = 12. Division is sharing equally. For example, 12 ÷ 3 = 4 means sharing 12 items among 3 groups.",
-                "metadata": {"category": "math", "topic": "multiplication_division", "age_group": "6-12"}
-            },
-            
-            # Technology
-            {
-                "content": "Computers are machines that can process information quickly. They have parts like a CPU (brain), memory (storage), and input devices like keyboards and mice. The internet connects computers around the world.",
-                "metadata": {"category": "technology", "topic": "computers", "age_group": "6-12"}
-            },
-            {
-                "content": "Robots are machines that can perform tasks automatically. Some robots help in factories, others explore space, and some help with household chores. They are programmed with instructions to follow.",
-                "metadata": {"category": "technology", "topic": "robots", "age_group": "6-12"}
-            }
-        ]
-        
-        # Add content to vector database
-        for i, item in enumerate(educational_content):
-            self.collection.add(
-                documents=[item["content"]],
-                metadatas=[item["metadata"]],
-                ids=[f"doc_{i}"]
-            )
+        # Add content to vector database in one batch
+        documents = [item["content"] for item in EDUCATIONAL_CONTENT]
+        self.collection.add(
+            documents=documents,
+            embeddings=self.embedding_model.embed(documents).tolist(),
+            metadatas=[item["metadata"] for item in EDUCATIONAL_CONTENT],
+            ids=[document_id_for(document) for document in documents]
+        )
         
-        print(f"✅ Loaded {len(educational_content)} educational documents into RAG system")
+        print(f"✅ Loaded {len(EDUCATIONAL_CONTENT)} educational documents into RAG system")
     
-    def retrieve_relevant_context(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Retrieve relevant context for a given query."""
+    def retrieve_relevant_context(self, query: str, top_k: int = RAG_TOP_K,
+                                  threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Retrieve the documents relevant to a query, most similar first.
+
+        Each context carries a calibrated similarity_score in 0..1; documents
+        below the relevance threshold are dropped, so an off-topic question
+        gets no context at all.
+        """
         rag_available = globals().get('RAG_AVAILABLE', False)
         if not rag_available or not self.collection:
             print("⚠️ RAG system not available, returning empty context")
             return []
+        threshold = RAG_RELEVANCE_THRESHOLD if threshold is None else threshold
             
         try:
-            # Use simple keyword-based search for now
-            # In a full implementation, you'd use proper embeddings
             results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=[self.query_embeddings.embed(query).tolist()],
                 n_results=top_k,
                 include=["documents", "metadatas", "distances"]
             )
             
-            # Format results
+            # Format results, keeping only relevant documents
             contexts = []
             if results["documents"] and results["documents"][0]:
                 for i in range(len(results["documents"][0])):
+                    cosine = cosine_from_distance(results["distances"][0][i], self.distance_space)
+                    score = self.embedding_model.calibrate(cosine)
+                    if score < threshold:
+                        continue
                     contexts.append({
                         "content": results["documents"][0][i],
                         "metadata": results["metadatas"][0][i],
-                        "similarity_score": 0.8  # Default similarity score
+                        "similarity_score": score
                     })
             
+            self.retrievals += 1
+            if not contexts:
+                self.off_topic += 1
             return contexts
             
         except Exception as e:
             print(f"❌ Error retrieving context: {e}")
             return []
     
-    def generate_rag_response(self, query: str, age: Optional[int] = None, interests: Optional[str] = None) -> Dict[str, Any]:
-        """Generate a response using RAG with retrieved context."""
+    def prepare_rag_prompt(self, query: str, age: Optional[int] = None, interests: Optional[str] = None) -> Dict[str, Any]:
+        """Retrieve context and build the chat messages for a question.
+
+        Returns a dict with "messages" set to None when no LLM call is needed,
+        in which case "response" holds the canned answer to use instead.
+        """
         rag_available = globals().get('RAG_AVAILABLE', False)
         if not rag_available or not self.client:
             print("⚠️ RAG system not available, using fallback response")
             return {
+                "messages": None,
                 "response": "I'm here to help you learn! What would you like to know about?",
                 "sources": [],
                 "confidence": 0.5
             }
-            
-        try:
-            # Retrieve relevant context
-            contexts = self.retrieve_relevant_context(query)
-            
-            if not contexts:
-                return {
-                    "response": "I don't have specific information about that, but I'd be happy to help you learn more!",
-                    "sources": [],
-                    "confidence": 0.0
-                }
-            
-            # Build context string
+        
+        # Retrieve relevant context; off-topic questions are answered without any
+        contexts = self.retrieve_relevant_context(query)
+        
+        # Build context string
+        context_block = ""
+        if contexts:
             context_text = "\n\n".join([ctx["content"] for ctx in contexts])
-            
-            # Create age-appropriate prompt
-            age_group = "6-8" if age and age <= 8 else "9-12" if age and age <= 12 else "6-12"
-            
-            prompt = f"""You are WonderBot, a friendly and educational AI assistant for children aged {age_group}.
-
+            context_block = f"""
 Context information:
 {context_text}
-
+"""
+        
+        # Create age-appropriate prompt
+        age_group = age_group_for(age)
+        
+        prompt = f"""You are WonderBot, a friendly and educational AI assistant for children aged {age_group}.
+{context_block}
 Child's question: {query}
 
 Please provide a clear, engaging, and educational response that:
 1. Uses simple, age-appropriate language
-2. Includes interesting facts from the context
+2. Includes interesting facts{" from the context" if contexts else ""}
 3. Encourages curiosity and learning
 4. Is fun and interactive
 5. Relates to the child's interests if mentioned: {interests or 'general curiosity'}
 
 Keep your response under 200 words and make it engaging for a child."""
-
+        
+        # Confidence is how well the knowledge base covers the question
+        confidence = round(sum(ctx["similarity_score"] for ctx in contexts) / len(contexts), 4) if contexts else 0.0
+        
+        return {
+            "messages": [
+                {"role": "system", "content": "You are WonderBot, a friendly educational assistant for children."},
+                {"role": "user", "content": prompt}
+            ],
+            "response": None,
+            "sources": [ctx["metadata"] for ctx in contexts],
+            "confidence": confidence,
+            "context_used": contexts
+        }
+    
+    def generate_rag_response(self, query: str, age: Optional[int] = None, interests: Optional[str] = None) -> Dict[str, Any]:
+        """Generate a response using RAG with retrieved context."""
+        try:
+            prepared = self.prepare_rag_prompt(query, age, interests)
+            if prepared["messages"] is None:
+                return {
+                    "response": prepared["response"],
+                    "sources": prepared["sources"],
+                    "confidence": prepared["confidence"]
+                }
+            
             # Generate response using OpenAI
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are WonderBot, a friendly educational assistant for children."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.7
+                model=RAG_CHAT_MODEL,
+                messages=prepared["messages"],
+                max_tokens=RAG_MAX_TOKENS,
+                temperature=0.7,
+                timeout=CHAT_TIMEOUT
             )
             
             generated_response = response.choices[0].message.content.strip()
             
-            # Calculate confidence based on context similarity
-            avg_similarity = sum(ctx["similarity_score"] for ctx in contexts) / len(contexts)
-            confidence = min(avg_similarity * 1.2, 1.0)  # Boost confidence slightly
-            
             return {
                 "response": generated_response,
-                "sources": [ctx["metadata"] for ctx in contexts],
-                "confidence": confidence,
-                "context_used": contexts
+                "sources": prepared["sources"],
+                "confidence": prepared["confidence"],
+                "context_used": prepared["context_used"]
             }
             
         except Exception as e:
             print(f"❌ Error generating RAG response: {e}")
             return {
-                "response": "I'm having trouble finding information about that right now. Let's explore something else together!",
+                "response": RAG_ERROR_RESPONSE,
                 "sources": [],
                 "confidence": 0.0
             }
     
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        """Which of these document ids are already in the knowledge base."""
+        if not ids:
+            return set()
+        return set(self.collection.get(ids=ids, include=[])["ids"])
+
+    def upsert_documents(self, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str],
+                         embeddings=None) -> None:
+        """Insert or replace a batch of documents, embedding them first unless vectors are given."""
+        if embeddings is None:
+            embeddings = self.embedding_model.embed(documents)
+        self.collection.upsert(
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=[list(map(float, vector)) for vector in embeddings]
+        )
+
     def add_knowledge(self, content: str, category: str, topic: str, age_group: str = "6-12") -> bool:
         """Add new knowledge to the RAG system."""
         try:
-            doc_id = f"doc_{uuid.uuid4().hex[:8]}"
+            doc_id = document_id_for(content)
+            if self.existing_ids([doc_id]):
+                print(f"ℹ️ Knowledge already present: {topic} ({category})")
+                return True
             
-            self.collection.add(
+            self.upsert_documents(
                 documents=[content],
                 metadatas=[{
                     "category": category,
@@ -272,6 +362,34 @@ Keep your response under 200 words and make it engaging for a child."""
             print(f"❌ Error adding knowledge: {e}")
             return False
     
+    def document_count(self) -> int:
+        """Number of documents in the knowledge base (seed documents when unavailable)."""
+        rag_available = globals().get('RAG_AVAILABLE', False)
+        if not rag_available or not self.collection:
+            return len(EDUCATIONAL_CONTENT)
+        return self.collection.count()
+
+    def list_documents(self, include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """Return every document's content and metadata (and embedding, if requested).
+
+        Falls back to the seed documents when the vector store is unavailable.
+        """
+        rag_available = globals().get('RAG_AVAILABLE', False)
+        if not rag_available or not self.collection:
+            return [{"content": item["content"], "metadata": item["metadata"], "embedding": None}
+                    for item in EDUCATIONAL_CONTENT]
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        results = self.collection.get(include=include)
+        embeddings = results.get("embeddings") if include_embeddings else None
+        return [
+            {
+                "content": results["documents"][i],
+                "metadata": results["metadatas"][i] or {},
+                "embedding": embeddings[i] if embeddings is not None else None
+            }
+            for i in range(len(results["ids"]))
+        ]
+
     def get_knowledge_stats(self) -> Dict[str, Any]:
         """Get statistics about the knowledge base."""
         rag_available = globals().get('RAG_AVAILABLE', False)
@@ -298,7 +416,12 @@ Keep your response under 200 words and make it engaging for a child."""
                 "status": "active",
                 "total_documents": total_docs,
                 "categories": categories,
-                "collection_name": self.collection.name
+                "collection_name": self.collection.name,
+                "embedding_backend": self.embedding_model.name,
+                "relevance_threshold": RAG_RELEVANCE_THRESHOLD,
+                "retrievals": self.retrievals,
+                "off_topic_retrievals": self.off_topic,
+                "query_embedding_cache": self.query_embeddings.stats()
             }
             
         except Exception as e:
@@ -0,0 +1,304 @@
+"""
+Topic recommender for WonderBot
+
+A background refresh builds a topic graph from the RAG knowledge base
+(category/topic metadata and document embeddings) and from learners'
+progress records:
+
+- a catalog of topics with keyword sets used to map free-form questions
+  onto them,
+- embedding-neighbour lists between topics,
+- a co-occurrence table of topics studied by the same learner, updated
+  incrementally as learners pick up new topics.
+
+Recommendations for every learner with new activity are recomputed during the
+refresh, so the endpoint only looks up a precomputed list. New activity comes
+from the storage's progress change feed, so every worker sees progress
+recorded by the others.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+from .storage import storage, ALL_PROGRESS
+
+logger = logging.getLogger(__name__)
+
+# ——— Configuration (overridable from the environment) ———
+RECOMMENDER_REFRESH_SECONDS = float(os.getenv("RECOMMENDER_REFRESH_SECONDS", "60"))
+RECOMMENDER_NEIGHBORS = int(os.getenv("RECOMMENDER_NEIGHBORS", "5"))
+RECOMMENDER_MAX_RESULTS = int(os.getenv("RECOMMENDER_MAX_RESULTS", "5"))
+# Learners more than this sure of a topic are not sent back to it
+RECOMMENDER_MASTERED = float(os.getenv("RECOMMENDER_MASTERED", "0.8"))
+RECOMMENDER_REVIEW_WEIGHT = float(os.getenv("RECOMMENDER_REVIEW_WEIGHT", "0.3"))
+
+_WORD = re.compile(r"[a-z]+")
+_STOPWORDS = {
+    "the", "and", "that", "this", "with", "from", "they", "their", "them", "have", "which", "into",
+    "what", "when", "where", "does", "about", "there", "these", "those", "other", "like", "make",
+    "made", "also", "many", "more", "most", "some", "such", "than", "very", "used", "using",
+    "called", "include", "including", "each", "known", "over", "were", "will", "your", "only",
+}
+
+def _words(text: str) -> Set[str]:
+    return {word for word in _WORD.findall(text.lower()) if len(word) > 3 and word not in _STOPWORDS}
+
+def _display_name(topic: str) -> str:
+    return topic.replace("_", " ").title()
+
+class TopicRecommender:
+    """Serves next-topic suggestions from a periodically refreshed topic graph."""
+
+    def __init__(self, neighbors: int = RECOMMENDER_NEIGHBORS, max_results: int = RECOMMENDER_MAX_RESULTS):
+        self.neighbors = neighbors
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # topic -> {"category", "name_words", "keywords"}
+        self.catalog: Dict[str, Dict[str, Any]] = {}
+        self._catalog_signature = None
+        # topic -> [(neighbour topic, similarity)]
+        self.neighbor_table: Dict[str, List[tuple]] = {}
+        # topic -> Counter(other topic -> learners who studied both)
+        self.cooccurrence: Dict[str, Counter] = {}
+        self.topic_learners: Counter = Counter()
+        self._user_topics: Dict[str, Set[str]] = {}
+        self._question_topics: Dict[str, Optional[str]] = {}
+        self._recommendations: Dict[str, List[Dict[str, Any]]] = {}
+        self._popular: List[Dict[str, Any]] = []
+        self._interest_topics: Dict[str, List[str]] = {}
+        # Last storage progress version folded into the graph
+        self._progress_version = 0
+        self._full_refresh = True
+        self.refreshes = 0
+        self.last_refresh_ms = 0.0
+        self.last_refresh_at: Optional[float] = None
+
+    # ——— Serving ———
+    def recommend(self, user_id: str, interests: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return the precomputed suggestions for a learner (dict lookups only)."""
+        recommendations = self._recommendations.get(user_id)
+        if recommendations:
+            return recommendations
+        # New learners: topics matching their interests, then the most studied topics
+        picks: List[Dict[str, Any]] = []
+        seen: Set[str] = set()
+        for interest in (interests or "").split(","):
+            for word in _words(interest):
+                for topic in self._interest_topics.get(word, []):
+                    if topic not in seen and len(picks) < self.max_results:
+                        seen.add(topic)
+                        picks.append(self._suggestion(topic, f"Based on your interest in {interest.strip()}", "easy", 1.0))
+        for item in self._popular:
+            if item["key"] not in seen and len(picks) < self.max_results:
+                seen.add(item["key"])
+                picks.append(item)
+        return picks
+
+    def reset(self) -> None:
+        """Forget all learner-derived state (used when stored data is cleared)."""
+        with self._refresh_lock, self._lock:
+            self.cooccurrence.clear()
+            self.topic_learners.clear()
+            self._user_topics.clear()
+            self._question_topics.clear()
+            self._recommendations = {}
+            self._full_refresh = True
+
+    # ——— Refresh (runs in the background) ———
+    def refresh(self) -> None:
+        """Rebuild the catalog if the knowledge base changed and recompute learners with new progress."""
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            started = time.perf_counter()
+            catalog_changed = self._refresh_catalog()
+            version, dirty = storage.progress_changes_since(self._progress_version)
+            with self._lock:
+                full = self._full_refresh or catalog_changed or ALL_PROGRESS in dirty
+                self._full_refresh = False
+            self._progress_version = version
+            if full:
+                self.cooccurrence.clear()
+                self.topic_learners.clear()
+                self._user_topics.clear()
+                self._question_topics.clear()
+                dirty = set(storage.progress_by_user())
+            for user_id in dirty:
+                self._update_user_topics(user_id)
+
+            # Only learners with new activity are recomputed incrementally; the others
+            # pick up co-occurrence changes on their next activity or catalog rebuild
+            affected = set(self._user_topics) if full else dirty
+            recommendations = dict(self._recommendations)
+            for user_id in affected:
+                recommendations[user_id] = self._compute_recommendations(user_id)
+            self._recommendations = recommendations
+            self._popular = [
+                self._suggestion(topic, "Popular with other learners", "easy", float(count))
+                for topic, count in self.topic_learners.most_common(self.max_results)
+            ] or [self._suggestion(topic, "A great place to start", "easy", 0.0)
+                  for topic in list(self.catalog)[:self.max_results]]
+
+            self.refreshes += 1
+            self.last_refresh_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.last_refresh_at = time.time()
+        except Exception as e:
+            logger.warning(f"⚠️ Recommender refresh failed: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_catalog(self) -> bool:
+        from .rag_system import rag_system
+
+        # The knowledge base only grows, so its size tells us when to rebuild
+        signature = rag_system.document_count()
+        if signature == self._catalog_signature:
+            return False
+
+        documents = rag_system.list_documents(include_embeddings=True)
+        catalog: Dict[str, Dict[str, Any]] = {}
+        vectors: Dict[str, List[Any]] = {}
+        for document in documents:
+            topic = document["metadata"].get("topic")
+            if not topic:
+                continue
+            entry = catalog.setdefault(topic, {
+                "category": document["metadata"].get("category", "general"),
+                "name_words": _words(topic.replace("_", " ")),
+                "keywords": set()
+            })
+            entry["keywords"] |= _words(document["content"])
+            if document["embedding"] is not None:
+                vectors.setdefault(topic, []).append(document["embedding"])
+
+        interest_topics: Dict[str, List[str]] = {}
+        for topic, entry in catalog.items():
+            for word in entry["name_words"] | entry["keywords"] | {entry["category"]}:
+                interest_topics.setdefault(word, []).append(topic)
+
+        self.catalog = catalog
+        self.neighbor_table = self._build_neighbors(catalog, vectors)
+        self._interest_topics = interest_topics
+        self._catalog_signature = signature
+        logger.info(f"🧭 Recommender catalog rebuilt with {len(catalog)} topics")
+        return True
+
+    def _build_neighbors(self, catalog: Dict[str, Dict[str, Any]], vectors: Dict[str, List[Any]]) -> Dict[str, List[tuple]]:
+        topics = [topic for topic in catalog if topic in vectors]
+        table: Dict[str, List[tuple]] = {}
+        if len(topics) > 1:
+            import numpy as np
+
+            centroids = np.stack([np.mean(np.asarray(vectors[topic], dtype=np.float32), axis=0) for topic in topics])
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+            similarity = centroids @ centroids.T
+            np.fill_diagonal(similarity, -1.0)
+            for i, topic in enumerate(topics):
+                order = np.argsort(-similarity[i])[:self.neighbors]
+                table[topic] = [(topics[j], float(similarity[i, j])) for j in order]
+        # Without embeddings, topics in the same category are neighbours
+        for topic, entry in catalog.items():
+            if topic not in table:
+                table[topic] = [(other, 0.5) for other, other_entry in catalog.items()
+                                if other != topic and other_entry["category"] == entry["category"]][:self.neighbors]
+        return table
+
+    def _match_topic(self, question: str) -> Optional[str]:
+        """Map a learner's free-form question onto a catalog topic."""
+        if question in self._question_topics:
+            return self._question_topics[question]
+        words = _words(question)
+        best, best_score = None, 0
+        for topic, entry in self.catalog.items():
+            score = 3 * len(words & entry["name_words"]) + len(words & entry["keywords"])
+            if score > best_score:
+                best, best_score = topic, score
+        match = best if best_score >= 2 else None
+        self._question_topics[question] = match
+        return match
+
+    def _update_user_topics(self, user_id: str) -> None:
+        topics = {topic for topic in map(self._match_topic, storage.get_progress(user_id)) if topic}
+        previous = self._user_topics.get(user_id, set())
+        for topic in topics - previous:
+            for other in previous:
+                self.cooccurrence.setdefault(topic, Counter())[other] += 1
+                self.cooccurrence.setdefault(other, Counter())[topic] += 1
+            self.topic_learners[topic] += 1
+            previous = previous | {topic}
+        self._user_topics[user_id] = topics
+
+    def _compute_recommendations(self, user_id: str) -> List[Dict[str, Any]]:
+        progress = {self._match_topic(topic): record for topic, record in storage.get_progress(user_id).items()}
+        studied = self._user_topics.get(user_id, set())
+        user = storage.get_user(user_id)
+        interest_words = _words(user.interests) if user and user.interests else set()
+
+        scores: Counter = Counter()
+        reasons: Dict[str, str] = {}
+        for topic in studied:
+            for neighbor, similarity in self.neighbor_table.get(topic, []):
+                scores[neighbor] += max(similarity, 0.0)
+                reasons.setdefault(neighbor, f"Related to {_display_name(topic)}")
+            learners = self.topic_learners[topic] or 1
+            for other, count in self.cooccurrence.get(topic, {}).items():
+                scores[other] += count / learners
+                reasons.setdefault(other, f"Learners who explored {_display_name(topic)} liked this next")
+        for word in interest_words:
+            for topic in self._interest_topics.get(word, []):
+                scores[topic] += 0.5
+                reasons.setdefault(topic, f"Based on your interest in {word}")
+
+        # Prefer new topics; studied ones come back only as lower-ranked practice
+        for topic in studied & set(scores):
+            scores[topic] *= RECOMMENDER_REVIEW_WEIGHT
+
+        suggestions = []
+        for topic, score in scores.most_common():
+            record = progress.get(topic)
+            if topic in studied and record is not None and record.mastery_level >= RECOMMENDER_MASTERED:
+                continue
+            if topic in studied:
+                reason = f"Keep practising {_display_name(topic)}"
+            else:
+                reason = reasons.get(topic, "Suggested for you")
+            suggestions.append(self._suggestion(topic, reason, self._difficulty_for(topic, progress), score))
+            if len(suggestions) == self.max_results:
+                break
+        return suggestions
+
+    def _difficulty_for(self, topic: str, progress: Dict[Optional[str], Any]) -> str:
+        category = self.catalog.get(topic, {}).get("category")
+        levels = [record.mastery_level for key, record in progress.items()
+                  if key and self.catalog.get(key, {}).get("category") == category]
+        mastery = sum(levels) / len(levels) if levels else 0.0
+        return "hard" if mastery >= 0.6 else "medium" if mastery >= 0.3 else "easy"
+
+    def _suggestion(self, topic: str, reason: str, difficulty: str, score: float) -> Dict[str, Any]:
+        return {
+            "key": topic,
+            "topic": _display_name(topic),
+            "category": self.catalog.get(topic, {}).get("category"),
+            "reason": reason,
+            "difficulty": difficulty,
+            "score": round(score, 3)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "topics": len(self.catalog),
+            "learners": len(self._recommendations),
+            "progress_version": self._progress_version,
+            "refreshes": self.refreshes,
+            "last_refresh_ms": self.last_refresh_ms,
+            "last_refresh_at": self.last_refresh_at
+        }
+
+# Global recommender instance
+recommender = TopicRecommender()
@@ -2,12 +2,16 @@
 Authentication router for WonderBot
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+import io
+import csv
+import json
+
+from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from ..models import UserCreate, UserLogin, UserResponse
-from ..auth import register_user, login_user, get_current_user
+from ..models import UserCreate, UserLogin, UserResponse, UserRole
+from ..auth import register_user, register_users_bulk, login_user, get_current_user, revoke_token, security
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -15,18 +19,47 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 async def register(user_data: UserCreate):
     """Register a new user."""
     try:
-        user = register_user(user_data)
+        user = await register_user(user_data)
         return {"message": "User registered successfully", "user": user}
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail="Registration failed")
 
+@router.post("/register/bulk", response_class=JSONResponse)
+async def register_bulk(request: Request, current_user: UserResponse = Depends(get_current_user)):
+    """Register a whole class at once from a CSV file or a JSON array of users.
+
+    CSV input needs a header row with username, email and password columns
+    (age, interests and role are optional). Each row gets its own result.
+    """
+    if current_user.role not in (UserRole.TEACHER, UserRole.PARENT):
+        raise HTTPException(status_code=403, detail="Only teachers and parents can register users in bulk")
+
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "csv" in content_type:
+            rows = list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
+        else:
+            rows = json.loads(body)
+    except (UnicodeDecodeError, ValueError, csv.Error):
+        raise HTTPException(status_code=400, detail="Body must be a CSV file or a JSON array of users")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a CSV file or a JSON array of users")
+
+    try:
+        return await register_users_bulk(rows)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Bulk registration failed")
+
 @router.post("/login", response_class=JSONResponse)
 async def login(login_data: UserLogin):
     """Login a user."""
     try:
-        result = login_user(login_data)
+        result = await login_user(login_data)
         return result
     except HTTPException as e:
         raise e
@@ -36,5 +69,11 @@ async def login(login_data: UserLogin):
 @router.get("/me", response_class=JSONResponse)
 async def get_current_user_info(current_user: UserResponse = Depends(get_current_user)):
     """Get current user information."""
-    print(f"DEBUG: /auth/me called for user: {current_user.username} (ID: {current_user.id})")
-    return {"user": current_user} 
\ No newline at end of file
+    return {"user": current_user}
+
+@router.post("/logout", response_class=JSONResponse)
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Revoke the current access token."""
+    get_current_user(credentials)
+    revoke_token(credentials.credentials)
+    return {"message": "Logged out"} 
\ No newline at end of file
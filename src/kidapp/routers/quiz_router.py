@@ -2,18 +2,25 @@
 Quiz router for WonderBot
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Form
+from fastapi import APIRouter, HTTPException, Depends, Form, Body, Header
 from fastapi.responses import JSONResponse
-from typing import Dict
+from typing import Any, Dict, List, Optional
 
-from ..models import UserResponse, DifficultyLevel
+from ..models import UserResponse, UserRole, DifficultyLevel
 from ..auth import get_current_user
 from ..quiz_generator import (
-    generate_quiz_from_explanation, 
-    save_quiz_to_memory, 
+    get_or_generate_quiz,
     get_quiz_by_id, 
-    submit_quiz_attempt
+    quiz_for_user,
+    submit_quiz_attempt,
+    start_quiz_attempt,
+    record_quiz_answer,
+    quiz_timing_report,
+    grade_quiz_batch,
+    quiz_analytics
 )
+from ..quiz_timing import AttemptTokenError, UnknownQuestionError
+from ..jobs import job_queue
 
 router = APIRouter(prefix="/quiz", tags=["Quizzes"])
 
@@ -27,50 +34,135 @@ async def generate_quiz(
 ):
     """Generate a quiz from an explanation."""
     try:
-        quiz = generate_quiz_from_explanation(
+        # Reuses (and saves) an existing quiz for the same explanation when possible
+        quiz = get_or_generate_quiz(
             explanation=explanation,
             topic=topic,
             difficulty=difficulty,
             num_questions=num_questions
         )
         
-        # Save quiz to memory
-        save_quiz_to_memory(quiz)
-        
-        return {"quiz": quiz}
+        return {"quiz": quiz_for_user(quiz, current_user.id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail="Quiz generation failed")
 
+@router.get("/jobs/{job_id}", response_class=JSONResponse)
+async def get_quiz_job(job_id: str, current_user: UserResponse = Depends(get_current_user)):
+    """Get the status of a background quiz generation job."""
+    job = job_queue.get(job_id)
+    if not job or job["kind"] != "quiz":
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["user_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this job")
+    
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "quiz_id": (job["result"] or {}).get("quiz_id"),
+        "error": job["error"]
+    }
+
 @router.get("/{quiz_id}", response_class=JSONResponse)
 async def get_quiz(quiz_id: str, current_user: UserResponse = Depends(get_current_user)):
-    """Get a quiz by ID."""
+    """Get a quiz by ID, in the current user's own question order."""
     quiz = get_quiz_by_id(quiz_id)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    return {"quiz": quiz}
+    return {"quiz": quiz_for_user(quiz, current_user.id)}
+
+@router.post("/{quiz_id}/start", response_class=JSONResponse)
+async def start_quiz(quiz_id: str, current_user: UserResponse = Depends(get_current_user)):
+    """Start a timed attempt; send the returned token as X-Attempt-Token with answers and the submission."""
+    try:
+        return start_quiz_attempt(quiz_id, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/{quiz_id}/answer/{question_id}", response_class=JSONResponse)
+async def record_answer(
+    quiz_id: str,
+    question_id: str,
+    attempt_token: str = Header(..., alias="X-Attempt-Token"),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Stamp the moment a question was answered during a timed attempt."""
+    try:
+        elapsed = record_quiz_answer(quiz_id, current_user.id, question_id, attempt_token)
+    except (AttemptTokenError, UnknownQuestionError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"question_id": question_id, "elapsed_seconds": elapsed}
 
 @router.post("/{quiz_id}/submit", response_class=JSONResponse)
 async def submit_quiz(
     quiz_id: str,
     answers: Dict[str, str],
+    attempt_token: Optional[str] = Header(None, alias="X-Attempt-Token"),
     current_user: UserResponse = Depends(get_current_user)
 ):
-    """Submit quiz answers and get results."""
+    """Submit quiz answers, keyed by position in the quiz as served to this user, and get results."""
     try:
-        result = submit_quiz_attempt(quiz_id, current_user.id, answers)
+        result = submit_quiz_attempt(quiz_id, current_user.id, answers, attempt_token, served_order=True)
         return result
+    except AttemptTokenError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Quiz submission failed")
 
+@router.post("/{quiz_id}/grade-batch", response_class=JSONResponse)
+async def grade_batch(
+    quiz_id: str,
+    attempts: List[Dict[str, Any]] = Body(..., embed=True),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Grade a class's answer sets at once and report per-question statistics."""
+    if current_user.role not in (UserRole.TEACHER, UserRole.PARENT):
+        raise HTTPException(status_code=403, detail="Only teachers and parents can grade in batch")
+    
+    answer_sets = [{str(k): str(v) for k, v in (attempt.get("answers") or {}).items()} for attempt in attempts]
+    try:
+        graded = grade_quiz_batch(quiz_id, answer_sets)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    graded["results"] = [
+        {"user_id": attempt.get("user_id"), "score": score, "correct_answers": correct}
+        for attempt, score, correct in zip(attempts, graded.pop("scores"), graded.pop("correct_answers"))
+    ]
+    return graded
+
+@router.get("/{quiz_id}/analytics", response_class=JSONResponse)
+async def get_quiz_analytics(quiz_id: str, current_user: UserResponse = Depends(get_current_user)):
+    """Difficulty and discrimination of each question over all recorded attempts."""
+    if current_user.role not in (UserRole.TEACHER, UserRole.PARENT):
+        raise HTTPException(status_code=403, detail="Only teachers and parents can view quiz analytics")
+    
+    try:
+        return quiz_analytics(quiz_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/{quiz_id}/timing", response_class=JSONResponse)
+async def get_quiz_timing(quiz_id: str, current_user: UserResponse = Depends(get_current_user)):
+    """Per-question answer-time histograms, with questions that take unusually long flagged."""
+    if current_user.role not in (UserRole.TEACHER, UserRole.PARENT):
+        raise HTTPException(status_code=403, detail="Only teachers and parents can view quiz timing")
+    
+    try:
+        return quiz_timing_report(quiz_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @router.get("/user/{user_id}/attempts", response_class=JSONResponse)
 async def get_user_quiz_attempts(user_id: str, current_user: UserResponse = Depends(get_current_user)):
     """Get all quiz attempts for a user."""
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this user's attempts")
     
-    from ..models import memory_storage
-    attempts = memory_storage.quiz_attempts.get(user_id, [])
+    from ..storage import storage
+    attempts = storage.list_attempts(user_id)
     return {"attempts": attempts} 
\ No newline at end of file
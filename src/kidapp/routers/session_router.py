@@ -2,17 +2,24 @@
 Session management router for WonderBot
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import JSONResponse
 
-from ..models import UserResponse
+from ..models import UserResponse, SessionData
 from ..auth import get_current_user
 
+SESSION_PAGE_DEFAULT = 20
+SESSION_PAGE_MAX = 100
+
 router = APIRouter(prefix="/sessions", tags=["Sessions"])
 
 def save_session_data(user_id: str, topic: str, explanation: str, diagram_url: str = None, audio_url: str = None, age: int = None, interests: str = None):
-    """Save session data to memory storage."""
-    from ..models import SessionData, memory_storage
+    """Save session data to the configured storage backend."""
+    from ..models import SessionData
+    from ..storage import storage
     
     session_data = SessionData(
         user_id=user_id,
@@ -24,16 +31,69 @@ def save_session_data(user_id: str, topic: str, explanation: str, diagram_url: s
         interests=interests
     )
     
-    if user_id not in memory_storage.sessions:
-        memory_storage.sessions[user_id] = []
-    memory_storage.sessions[user_id].append(session_data)
+    from ..progress import record_session
+    # The session and the progress it counts towards are committed together
+    with storage.transaction():
+        storage.add_session(session_data)
+        record_session(user_id, topic, at=session_data.timestamp)
+
+    # Keep the session's media out of reach of the media store's garbage collector
+    from ..media_store import media_store
+    media_store.add_ref(diagram_url)
+    media_store.add_ref(audio_url)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def get_session_page(user_id: str, limit: int = SESSION_PAGE_DEFAULT, cursor: Optional[str] = None,
+                     topic: Optional[str] = None, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None, fields: Optional[str] = None,
+                     include_total: Optional[bool] = None) -> dict:
+    """Fetch one page of a user's sessions, newest first.
+
+    `fields` is a comma-separated projection (e.g. "topic,timestamp" to leave
+    out the explanation text in list views); by default all fields are returned.
+    `total_sessions` is counted for the first page only (no cursor) unless
+    `include_total` says otherwise, so paging through history stays cheap.
+    """
+    from ..storage import storage
+
+    include = None
+    if fields:
+        include = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = include - set(SessionData.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown session fields: {', '.join(sorted(unknown))}")
+    try:
+        sessions, next_cursor = storage.page_sessions(
+            user_id, limit, cursor=cursor, topic=topic, since=_as_utc(since), until=_as_utc(until)
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    page = {
+        "sessions": [session.model_dump(mode="json", include=include) for session in sessions],
+        "next_cursor": next_cursor
+    }
+    if include_total if include_total is not None else cursor is None:
+        page["total_sessions"] = storage.count_sessions(user_id)
+    return page
 
 @router.get("/{user_id}", response_class=JSONResponse)
-async def get_user_sessions(user_id: str, current_user: UserResponse = Depends(get_current_user)):
-    """Get all sessions for a user."""
+async def get_user_sessions(
+    user_id: str,
+    limit: int = Query(SESSION_PAGE_DEFAULT, ge=1, le=SESSION_PAGE_MAX),
+    cursor: Optional[str] = None,
+    topic: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Get a page of a user's sessions, newest first; pass next_cursor back as cursor for the next page."""
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this user's sessions")
     
-    from ..models import memory_storage
-    sessions = memory_storage.sessions.get(user_id, [])
-    return {"sessions": sessions} 
\ No newline at end of file
+    return get_session_page(user_id, limit, cursor, topic, since, until, fields, include_total) 
\ No newline at end of file
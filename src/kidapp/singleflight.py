@@ -0,0 +1,58 @@
+"""
+Single-flight request coalescing for WonderBot
+
+Concurrent callers asking for the same key share one in-flight computation
+instead of each starting their own, so a classroom asking the same question
+at once costs a single RAG call, diagram and narration.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+class SingleFlight:
+    """Coalesces concurrent async computations by key."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result of compute(), sharing it with concurrent callers using the same key.
+
+        The computation runs as its own task, so a caller that disconnects does
+        not cancel the work for the others waiting on it.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda finished: self._finish(key, finished))
+            with self._lock:
+                self.leaders += 1
+        else:
+            with self._lock:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            with self._lock:
+                self.failures += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "failures": self.failures
+            }
+
+# Global coalescer for /generate computations
+generation_flights = SingleFlight()
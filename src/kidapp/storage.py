@@ -0,0 +1,876 @@
+"""
+Storage backends for WonderBot
+
+All persistent app data (users, password hashes, sessions, quizzes, quiz
+attempts, learning progress and achievements) goes through the StorageBackend
+interface. MemoryStorage keeps everything in Python dicts and is meant for
+tests and single-process development; SQLiteStorage persists to a WAL-mode
+database with indexes on the lookup columns, so several uvicorn workers see
+the same data and nothing is lost on restart.
+
+The backend is chosen with STORAGE_BACKEND=memory|sqlite (default: memory).
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+import threading
+from contextlib import contextmanager
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .models import (
+    UserResponse, SessionData, Quiz, QuizAttempt, LearningProgress, Achievement
+)
+
+# ——— Configuration (overridable from the environment) ———
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+STORAGE_PATH = os.getenv("STORAGE_PATH", os.path.join(os.getcwd(), "data", "wonderbot.sqlite3"))
+# Change-feed entry meaning "all learning progress was cleared"
+ALL_PROGRESS = ""
+
+class DuplicateUserError(ValueError):
+    """Raised when a username or email is already registered."""
+
+    def __init__(self, field: str):
+        super().__init__(f"{field} already registered")
+        self.field = field
+
+class StorageBackend:
+    """Interface shared by the storage backends."""
+
+    # ——— Users ———
+    def add_user(self, user: UserResponse, password_hash: str) -> None:
+        """Insert a new user, raising DuplicateUserError if the username or email is taken."""
+        raise NotImplementedError
+
+    def add_users(self, users: List[Tuple[UserResponse, str]]) -> List[Optional[str]]:
+        """Insert (user, password hash) pairs in one transaction.
+
+        Returns one entry per pair: None if it was inserted, otherwise the name
+        of the field ("Username" or "Email") that was already taken.
+        """
+        results: List[Optional[str]] = []
+        with self.transaction():
+            for user, password_hash in users:
+                try:
+                    self.add_user(user, password_hash)
+                    results.append(None)
+                except DuplicateUserError as e:
+                    results.append(e.field)
+        return results
+
+    def get_user(self, user_id: str) -> Optional[UserResponse]:
+        raise NotImplementedError
+
+    def get_user_by_username(self, username: str) -> Optional[UserResponse]:
+        raise NotImplementedError
+
+    def get_user_by_email(self, email: str) -> Optional[UserResponse]:
+        raise NotImplementedError
+
+    def update_user(self, user: UserResponse) -> None:
+        raise NotImplementedError
+
+    def delete_user(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    def list_users(self) -> List[UserResponse]:
+        raise NotImplementedError
+
+    def get_password_hash(self, user_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set_password_hash(self, user_id: str, password_hash: str) -> None:
+        raise NotImplementedError
+
+    def list_password_hashes(self) -> Dict[str, str]:
+        raise NotImplementedError
+
+    # ——— Sessions ———
+    def add_session(self, session: SessionData) -> None:
+        raise NotImplementedError
+
+    def list_sessions(self, user_id: str) -> List[SessionData]:
+        """Return a user's sessions, oldest first."""
+        raise NotImplementedError
+
+    def page_sessions(self, user_id: str, limit: int, cursor: Optional[str] = None,
+                      topic: Optional[str] = None, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None) -> Tuple[List[SessionData], Optional[str]]:
+        """Return up to `limit` of a user's sessions, newest first, and the cursor for the next page.
+
+        `topic` matches case-insensitively as a substring; `since` is inclusive
+        and `until` exclusive. The cursor is opaque and None on the last page.
+        """
+        raise NotImplementedError
+
+    def count_sessions(self, user_id: str) -> int:
+        raise NotImplementedError
+
+    def sessions_by_user(self) -> Dict[str, List[SessionData]]:
+        raise NotImplementedError
+
+    # ——— Quizzes ———
+    def save_quiz(self, quiz: Quiz) -> None:
+        raise NotImplementedError
+
+    def get_quiz(self, quiz_id: str) -> Optional[Quiz]:
+        raise NotImplementedError
+
+    def list_quizzes(self) -> List[Quiz]:
+        raise NotImplementedError
+
+    def quizzes_by_topic(self, topic: str) -> List[Quiz]:
+        """Return quizzes whose topic matches case-insensitively."""
+        raise NotImplementedError
+
+    def page_quizzes(self, limit: int, cursor: Optional[str] = None, topic: Optional[str] = None,
+                     difficulty: Optional[str] = None) -> Tuple[List[Quiz], Optional[str]]:
+        """Return up to `limit` quizzes, newest first, and the cursor for the next page.
+
+        `topic` matches case-insensitively and exactly; `difficulty` is a
+        DifficultyLevel value. The cursor is opaque and None on the last page.
+        """
+        raise NotImplementedError
+
+    def completed_quiz_ids(self, user_id: str, quiz_ids: Optional[List[str]] = None) -> Set[str]:
+        """Return the quizzes (optionally limited to quiz_ids) the user has submitted an attempt for."""
+        raise NotImplementedError
+
+    # ——— Quiz attempts ———
+    def add_attempt(self, attempt: QuizAttempt) -> None:
+        raise NotImplementedError
+
+    def list_attempts(self, user_id: str) -> List[QuizAttempt]:
+        raise NotImplementedError
+
+    def attempts_for_quiz(self, quiz_id: str) -> List[QuizAttempt]:
+        """Return every attempt at a quiz, oldest first."""
+        raise NotImplementedError
+
+    def attempts_by_user(self) -> Dict[str, List[QuizAttempt]]:
+        raise NotImplementedError
+
+    # ——— Learning progress ———
+    def get_progress(self, user_id: str) -> Dict[str, LearningProgress]:
+        raise NotImplementedError
+
+    def get_topic_progress(self, user_id: str, topic: str) -> Optional[LearningProgress]:
+        raise NotImplementedError
+
+    def save_progress(self, progress: LearningProgress) -> None:
+        raise NotImplementedError
+
+    def progress_by_user(self) -> Dict[str, Dict[str, LearningProgress]]:
+        raise NotImplementedError
+
+    def progress_changes_since(self, version: int) -> Tuple[int, Set[str]]:
+        """Return (current progress version, users whose progress changed after `version`).
+
+        Every save_progress bumps the version, so any worker can find the
+        learners that changed since it last looked. ALL_PROGRESS in the result
+        means progress was cleared and everything should be reloaded.
+        """
+        raise NotImplementedError
+
+    # ——— Achievements ———
+    def add_achievement(self, user_id: str, achievement: Achievement) -> None:
+        raise NotImplementedError
+
+    def list_achievements(self, user_id: str) -> List[Achievement]:
+        raise NotImplementedError
+
+    # ——— Revoked tokens ———
+    def revoke_token(self, token_id: str, expires_at: float) -> None:
+        """Refuse a token on every worker until it expires; expired entries are pruned."""
+        raise NotImplementedError
+
+    def is_token_revoked(self, token_id: str) -> bool:
+        raise NotImplementedError
+
+    # ——— Housekeeping ———
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Group several writes into one atomic batch."""
+        yield
+
+    def counts(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+def _encode_cursor(timestamp: float, seq: int) -> str:
+    return f"{timestamp:.6f}:{seq}"
+
+def _decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Split a page cursor into (timestamp, sequence), raising ValueError if malformed."""
+    timestamp, seq = cursor.split(":")
+    return float(timestamp), int(seq)
+
+class MemoryStorage(StorageBackend):
+    """Dict-backed storage for tests and single-process development."""
+
+    def __init__(self):
+        self.users: Dict[str, UserResponse] = {}
+        self.password_hashes: Dict[str, str] = {}
+        # Secondary indexes kept in step with self.users
+        self.user_ids_by_username: Dict[str, str] = {}
+        self.user_ids_by_email: Dict[str, str] = {}
+        self.sessions: Dict[str, List[SessionData]] = {}
+        self.quizzes: Dict[str, Quiz] = {}
+        # Quiz catalog indexes: creation order plus positions per topic and difficulty
+        self.quiz_order: List[str] = []
+        self._quiz_seq: Dict[str, int] = {}
+        self.quizzes_by_topic_key: Dict[str, List[int]] = {}
+        self.quizzes_by_difficulty: Dict[str, List[int]] = {}
+        self.completed_quizzes: Dict[str, Set[str]] = {}
+        self.attempts_by_quiz: Dict[str, List[QuizAttempt]] = {}
+        self.quiz_attempts: Dict[str, List[QuizAttempt]] = {}
+        self.learning_progress: Dict[str, Dict[str, LearningProgress]] = {}
+        # user_id -> progress version of their latest change
+        self.progress_changes: Dict[str, int] = {}
+        self.progress_version = 0
+        self.achievements: Dict[str, List[Achievement]] = {}
+        # token id -> expiry of revoked tokens
+        self.revoked_tokens: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def _check_unique(self, user: UserResponse) -> None:
+        owner = self.user_ids_by_username.get(user.username)
+        if owner is not None and owner != user.id:
+            raise DuplicateUserError("Username")
+        owner = self.user_ids_by_email.get(user.email)
+        if owner is not None and owner != user.id:
+            raise DuplicateUserError("Email")
+
+    def add_user(self, user: UserResponse, password_hash: str) -> None:
+        with self._lock:
+            self._check_unique(user)
+            self.users[user.id] = user
+            self.password_hashes[user.id] = password_hash
+            self.user_ids_by_username[user.username] = user.id
+            self.user_ids_by_email[user.email] = user.id
+
+    def get_user(self, user_id: str) -> Optional[UserResponse]:
+        return self.users.get(user_id)
+
+    def get_user_by_username(self, username: str) -> Optional[UserResponse]:
+        user_id = self.user_ids_by_username.get(username)
+        return self.users.get(user_id) if user_id else None
+
+    def get_user_by_email(self, email: str) -> Optional[UserResponse]:
+        user_id = self.user_ids_by_email.get(email)
+        return self.users.get(user_id) if user_id else None
+
+    def update_user(self, user: UserResponse) -> None:
+        with self._lock:
+            self._check_unique(user)
+            old = self.users.get(user.id)
+            if old is not None:
+                self.user_ids_by_username.pop(old.username, None)
+                self.user_ids_by_email.pop(old.email, None)
+            self.users[user.id] = user
+            self.user_ids_by_username[user.username] = user.id
+            self.user_ids_by_email[user.email] = user.id
+
+    def delete_user(self, user_id: str) -> None:
+        with self._lock:
+            old = self.users.pop(user_id, None)
+            self.password_hashes.pop(user_id, None)
+            if old is not None:
+                self.user_ids_by_username.pop(old.username, None)
+                self.user_ids_by_email.pop(old.email, None)
+
+    def list_users(self) -> List[UserResponse]:
+        return list(self.users.values())
+
+    def get_password_hash(self, user_id: str) -> Optional[str]:
+        return self.password_hashes.get(user_id)
+
+    def set_password_hash(self, user_id: str, password_hash: str) -> None:
+        self.password_hashes[user_id] = password_hash
+
+    def list_password_hashes(self) -> Dict[str, str]:
+        return dict(self.password_hashes)
+
+    def add_session(self, session: SessionData) -> None:
+        with self._lock:
+            self.sessions.setdefault(session.user_id, []).append(session)
+
+    def list_sessions(self, user_id: str) -> List[SessionData]:
+        return list(self.sessions.get(user_id, []))
+
+    def page_sessions(self, user_id: str, limit: int, cursor: Optional[str] = None,
+                      topic: Optional[str] = None, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None) -> Tuple[List[SessionData], Optional[str]]:
+        sessions = self.sessions.get(user_id, [])
+        # Sessions are append-only, so a list position is a stable sequence number
+        start = len(sessions) - 1
+        if cursor:
+            start = min(start, _decode_cursor(cursor)[1] - 1)
+        needle = topic.lower() if topic else None
+        page: List[SessionData] = []
+        for seq in range(start, -1, -1):
+            session = sessions[seq]
+            if since is not None and session.timestamp < since:
+                break
+            if until is not None and session.timestamp >= until:
+                continue
+            if needle and needle not in session.topic.lower():
+                continue
+            if len(page) == limit:
+                last = page[-1]
+                return page, _encode_cursor(last.timestamp.timestamp(), seq + 1)
+            page.append(session)
+        return page, None
+
+    def count_sessions(self, user_id: str) -> int:
+        return len(self.sessions.get(user_id, []))
+
+    def sessions_by_user(self) -> Dict[str, List[SessionData]]:
+        return {user_id: list(sessions) for user_id, sessions in self.sessions.items()}
+
+    def save_quiz(self, quiz: Quiz) -> None:
+        with self._lock:
+            if quiz.id not in self._quiz_seq:
+                seq = len(self.quiz_order)
+                self.quiz_order.append(quiz.id)
+                self._quiz_seq[quiz.id] = seq
+                self.quizzes_by_topic_key.setdefault(quiz.topic.lower(), []).append(seq)
+                self.quizzes_by_difficulty.setdefault(quiz.difficulty.value, []).append(seq)
+            self.quizzes[quiz.id] = quiz
+
+    def get_quiz(self, quiz_id: str) -> Optional[Quiz]:
+        return self.quizzes.get(quiz_id)
+
+    def list_quizzes(self) -> List[Quiz]:
+        return [self.quizzes[quiz_id] for quiz_id in list(self.quiz_order)]
+
+    def quizzes_by_topic(self, topic: str) -> List[Quiz]:
+        return [self.quizzes[self.quiz_order[seq]] for seq in list(self.quizzes_by_topic_key.get(topic.lower(), []))]
+
+    def page_quizzes(self, limit: int, cursor: Optional[str] = None, topic: Optional[str] = None,
+                     difficulty: Optional[str] = None) -> Tuple[List[Quiz], Optional[str]]:
+        # Walk the smallest applicable index backwards from the cursor position
+        if topic is not None:
+            positions = self.quizzes_by_topic_key.get(topic.lower(), [])
+        elif difficulty is not None:
+            positions = self.quizzes_by_difficulty.get(difficulty, [])
+        else:
+            positions = range(len(self.quiz_order))
+        end = len(positions)
+        if cursor:
+            end = bisect_left(positions, _decode_cursor(cursor)[1])
+        page: List[Quiz] = []
+        for i in range(end - 1, -1, -1):
+            quiz = self.quizzes[self.quiz_order[positions[i]]]
+            if difficulty is not None and quiz.difficulty.value != difficulty:
+                continue
+            if len(page) == limit:
+                return page, _encode_cursor(quiz.created_at.timestamp(), positions[i] + 1)
+            page.append(quiz)
+        return page, None
+
+    def completed_quiz_ids(self, user_id: str, quiz_ids: Optional[List[str]] = None) -> Set[str]:
+        completed = self.completed_quizzes.get(user_id, set())
+        if quiz_ids is None:
+            return set(completed)
+        return {quiz_id for quiz_id in quiz_ids if quiz_id in completed}
+
+    def add_attempt(self, attempt: QuizAttempt) -> None:
+        with self._lock:
+            self.quiz_attempts.setdefault(attempt.user_id, []).append(attempt)
+            self.completed_quizzes.setdefault(attempt.user_id, set()).add(attempt.quiz_id)
+            self.attempts_by_quiz.setdefault(attempt.quiz_id, []).append(attempt)
+
+    def list_attempts(self, user_id: str) -> List[QuizAttempt]:
+        return list(self.quiz_attempts.get(user_id, []))
+
+    def attempts_for_quiz(self, quiz_id: str) -> List[QuizAttempt]:
+        return list(self.attempts_by_quiz.get(quiz_id, []))
+
+    def attempts_by_user(self) -> Dict[str, List[QuizAttempt]]:
+        return {user_id: list(attempts) for user_id, attempts in self.quiz_attempts.items()}
+
+    def get_progress(self, user_id: str) -> Dict[str, LearningProgress]:
+        return dict(self.learning_progress.get(user_id, {}))
+
+    def get_topic_progress(self, user_id: str, topic: str) -> Optional[LearningProgress]:
+        return self.learning_progress.get(user_id, {}).get(topic)
+
+    def save_progress(self, progress: LearningProgress) -> None:
+        with self._lock:
+            self.learning_progress.setdefault(progress.user_id, {})[progress.topic] = progress
+            self.progress_version += 1
+            self.progress_changes[progress.user_id] = self.progress_version
+
+    def progress_by_user(self) -> Dict[str, Dict[str, LearningProgress]]:
+        return {user_id: dict(topics) for user_id, topics in self.learning_progress.items()}
+
+    def progress_changes_since(self, version: int) -> Tuple[int, Set[str]]:
+        with self._lock:
+            return self.progress_version, {user_id for user_id, changed in self.progress_changes.items() if changed > version}
+
+    def add_achievement(self, user_id: str, achievement: Achievement) -> None:
+        with self._lock:
+            self.achievements.setdefault(user_id, []).append(achievement)
+
+    def list_achievements(self, user_id: str) -> List[Achievement]:
+        return list(self.achievements.get(user_id, []))
+
+    def revoke_token(self, token_id: str, expires_at: float) -> None:
+        now = time.time()
+        with self._lock:
+            self.revoked_tokens = {revoked: exp for revoked, exp in self.revoked_tokens.items() if exp > now}
+            self.revoked_tokens[token_id] = expires_at
+
+    def is_token_revoked(self, token_id: str) -> bool:
+        return self.revoked_tokens.get(token_id, 0.0) > time.time()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._lock:
+            yield
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "users": len(self.users),
+            "sessions": sum(len(sessions) for sessions in self.sessions.values()),
+            "quizzes": len(self.quizzes),
+            "attempts": sum(len(attempts) for attempts in self.quiz_attempts.values())
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self.users.clear()
+            self.password_hashes.clear()
+            self.user_ids_by_username.clear()
+            self.user_ids_by_email.clear()
+            self.sessions.clear()
+            self.quizzes.clear()
+            self.quiz_order.clear()
+            self._quiz_seq.clear()
+            self.quizzes_by_topic_key.clear()
+            self.quizzes_by_difficulty.clear()
+            self.completed_quizzes.clear()
+            self.attempts_by_quiz.clear()
+            self.quiz_attempts.clear()
+            self.learning_progress.clear()
+            self.achievements.clear()
+            self.revoked_tokens.clear()
+            # The version keeps counting so readers notice the clear
+            self.progress_version += 1
+            self.progress_changes = {ALL_PROGRESS: self.progress_version}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_time ON sessions(user_id, timestamp);
+CREATE TABLE IF NOT EXISTS quizzes (
+    id TEXT PRIMARY KEY,
+    topic_key TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_quizzes_topic ON quizzes(topic_key);
+CREATE INDEX IF NOT EXISTS idx_quizzes_topic_time ON quizzes(topic_key, created_at);
+CREATE INDEX IF NOT EXISTS idx_quizzes_difficulty_time ON quizzes(difficulty, created_at);
+CREATE INDEX IF NOT EXISTS idx_quizzes_time ON quizzes(created_at);
+CREATE TABLE IF NOT EXISTS quiz_attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    quiz_id TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_user ON quiz_attempts(user_id, completed_at);
+CREATE INDEX IF NOT EXISTS idx_attempts_quiz ON quiz_attempts(quiz_id);
+CREATE TABLE IF NOT EXISTS quiz_completions (
+    user_id TEXT NOT NULL,
+    quiz_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, quiz_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS learning_progress (
+    user_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, topic)
+);
+CREATE TABLE IF NOT EXISTS progress_changes (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_progress_changes_version ON progress_changes(version);
+CREATE TABLE IF NOT EXISTS achievements (
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    token_id TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+"""
+
+class SQLiteStorage(StorageBackend):
+    """SQLite (WAL mode) storage shared by all worker processes.
+
+    Each thread gets its own pooled connection. Writes autocommit unless they
+    are grouped with transaction(), which batches them into one commit.
+    """
+
+    def __init__(self, path: str = STORAGE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # Databases created before quiz_completions existed: backfill it once
+        if conn.execute("SELECT 1 FROM quiz_completions LIMIT 1").fetchone() is None:
+            conn.execute("INSERT OR IGNORE INTO quiz_completions (user_id, quiz_id) SELECT user_id, quiz_id FROM quiz_attempts")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        conn = self._conn()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    @contextmanager
+    def _snapshot(self) -> Iterator[None]:
+        """Run several reads against one snapshot; a deferred transaction takes no write lock."""
+        conn = self._conn()
+        if self._local.depth:
+            yield
+            return
+        conn.execute("BEGIN DEFERRED")
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            conn.execute("COMMIT")
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        return self._conn().execute(sql, params)
+
+    # ——— Users ———
+    def add_user(self, user: UserResponse, password_hash: str) -> None:
+        try:
+            self._execute(
+                "INSERT INTO users (id, username, email, password_hash, data) VALUES (?, ?, ?, ?, ?)",
+                (user.id, user.username, user.email, password_hash, user.model_dump_json())
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateUserError("Email" if "email" in str(e) else "Username") from e
+
+    def get_user(self, user_id: str) -> Optional[UserResponse]:
+        row = self._execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
+        return UserResponse.model_validate_json(row[0]) if row else None
+
+    def get_user_by_username(self, username: str) -> Optional[UserResponse]:
+        row = self._execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+        return UserResponse.model_validate_json(row[0]) if row else None
+
+    def get_user_by_email(self, email: str) -> Optional[UserResponse]:
+        row = self._execute("SELECT data FROM users WHERE email = ?", (email,)).fetchone()
+        return UserResponse.model_validate_json(row[0]) if row else None
+
+    def update_user(self, user: UserResponse) -> None:
+        try:
+            self._execute(
+                "UPDATE users SET username = ?, email = ?, data = ? WHERE id = ?",
+                (user.username, user.email, user.model_dump_json(), user.id)
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateUserError("Email" if "email" in str(e) else "Username") from e
+
+    def delete_user(self, user_id: str) -> None:
+        self._execute("DELETE FROM users WHERE id = ?", (user_id,))
+
+    def list_users(self) -> List[UserResponse]:
+        rows = self._execute("SELECT data FROM users ORDER BY rowid").fetchall()
+        return [UserResponse.model_validate_json(row[0]) for row in rows]
+
+    def get_password_hash(self, user_id: str) -> Optional[str]:
+        row = self._execute("SELECT password_hash FROM users WHERE id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_password_hash(self, user_id: str, password_hash: str) -> None:
+        self._execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+
+    def list_password_hashes(self) -> Dict[str, str]:
+        return dict(self._execute("SELECT id, password_hash FROM users").fetchall())
+
+    # ——— Sessions ———
+    def add_session(self, session: SessionData) -> None:
+        self._execute(
+            "INSERT INTO sessions (user_id, topic, timestamp, data) VALUES (?, ?, ?, ?)",
+            (session.user_id, session.topic, session.timestamp.timestamp(), session.model_dump_json())
+        )
+
+    def list_sessions(self, user_id: str) -> List[SessionData]:
+        rows = self._execute(
+            "SELECT data FROM sessions WHERE user_id = ? ORDER BY timestamp, id", (user_id,)
+        ).fetchall()
+        return [SessionData.model_validate_json(row[0]) for row in rows]
+
+    def page_sessions(self, user_id: str, limit: int, cursor: Optional[str] = None,
+                      topic: Optional[str] = None, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None) -> Tuple[List[SessionData], Optional[str]]:
+        # Walks idx_sessions_user_time backwards; the rowid breaks timestamp ties
+        clauses = ["user_id = ?"]
+        params: list = [user_id]
+        if cursor:
+            timestamp, seq = _decode_cursor(cursor)
+            clauses.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params += [timestamp, timestamp, seq]
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until.timestamp())
+        if topic:
+            clauses.append("instr(lower(topic), ?) > 0")
+            params.append(topic.lower())
+        rows = self._execute(
+            f"SELECT id, timestamp, data FROM sessions WHERE {' AND '.join(clauses)} "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1][1], rows[-1][0])
+        return [SessionData.model_validate_json(row[2]) for row in rows], next_cursor
+
+    def count_sessions(self, user_id: str) -> int:
+        return self._execute("SELECT COUNT(*) FROM sessions WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def sessions_by_user(self) -> Dict[str, List[SessionData]]:
+        grouped: Dict[str, List[SessionData]] = {}
+        for user_id, data in self._execute("SELECT user_id, data FROM sessions ORDER BY user_id, timestamp, id"):
+            grouped.setdefault(user_id, []).append(SessionData.model_validate_json(data))
+        return grouped
+
+    # ——— Quizzes ———
+    def save_quiz(self, quiz: Quiz) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO quizzes (id, topic_key, difficulty, created_at, data) VALUES (?, ?, ?, ?, ?)",
+            (quiz.id, quiz.topic.lower(), quiz.difficulty.value, quiz.created_at.timestamp(), quiz.model_dump_json())
+        )
+
+    def get_quiz(self, quiz_id: str) -> Optional[Quiz]:
+        row = self._execute("SELECT data FROM quizzes WHERE id = ?", (quiz_id,)).fetchone()
+        return Quiz.model_validate_json(row[0]) if row else None
+
+    def list_quizzes(self) -> List[Quiz]:
+        rows = self._execute("SELECT data FROM quizzes ORDER BY created_at").fetchall()
+        return [Quiz.model_validate_json(row[0]) for row in rows]
+
+    def quizzes_by_topic(self, topic: str) -> List[Quiz]:
+        rows = self._execute(
+            "SELECT data FROM quizzes WHERE topic_key = ? ORDER BY created_at", (topic.lower(),)
+        ).fetchall()
+        return [Quiz.model_validate_json(row[0]) for row in rows]
+
+    def page_quizzes(self, limit: int, cursor: Optional[str] = None, topic: Optional[str] = None,
+                     difficulty: Optional[str] = None) -> Tuple[List[Quiz], Optional[str]]:
+        # Served by idx_quizzes_topic_time / idx_quizzes_difficulty_time / idx_quizzes_time
+        clauses = []
+        params: list = []
+        if topic is not None:
+            clauses.append("topic_key = ?")
+            params.append(topic.lower())
+        if difficulty is not None:
+            clauses.append("difficulty = ?")
+            params.append(difficulty)
+        if cursor:
+            timestamp, seq = _decode_cursor(cursor)
+            clauses.append("(created_at < ? OR (created_at = ? AND rowid < ?))")
+            params += [timestamp, timestamp, seq]
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        rows = self._execute(
+            f"SELECT rowid, created_at, data FROM quizzes {where}ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1][1], rows[-1][0])
+        return [Quiz.model_validate_json(row[2]) for row in rows], next_cursor
+
+    def completed_quiz_ids(self, user_id: str, quiz_ids: Optional[List[str]] = None) -> Set[str]:
+        if quiz_ids is None:
+            rows = self._execute("SELECT quiz_id FROM quiz_completions WHERE user_id = ?", (user_id,)).fetchall()
+        elif not quiz_ids:
+            return set()
+        else:
+            placeholders = ", ".join("?" for _ in quiz_ids)
+            rows = self._execute(
+                f"SELECT quiz_id FROM quiz_completions WHERE user_id = ? AND quiz_id IN ({placeholders})",
+                (user_id, *quiz_ids)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    # ——— Quiz attempts ———
+    def add_attempt(self, attempt: QuizAttempt) -> None:
+        with self.transaction():
+            self._execute(
+                "INSERT INTO quiz_attempts (user_id, quiz_id, completed_at, data) VALUES (?, ?, ?, ?)",
+                (attempt.user_id, attempt.quiz_id, attempt.completed_at.timestamp(), attempt.model_dump_json())
+            )
+            self._execute(
+                "INSERT OR IGNORE INTO quiz_completions (user_id, quiz_id) VALUES (?, ?)",
+                (attempt.user_id, attempt.quiz_id)
+            )
+
+    def list_attempts(self, user_id: str) -> List[QuizAttempt]:
+        rows = self._execute(
+            "SELECT data FROM quiz_attempts WHERE user_id = ? ORDER BY completed_at, id", (user_id,)
+        ).fetchall()
+        return [QuizAttempt.model_validate_json(row[0]) for row in rows]
+
+    def attempts_for_quiz(self, quiz_id: str) -> List[QuizAttempt]:
+        rows = self._execute(
+            "SELECT data FROM quiz_attempts WHERE quiz_id = ? ORDER BY completed_at, id", (quiz_id,)
+        ).fetchall()
+        return [QuizAttempt.model_validate_json(row[0]) for row in rows]
+
+    def attempts_by_user(self) -> Dict[str, List[QuizAttempt]]:
+        grouped: Dict[str, List[QuizAttempt]] = {}
+        for user_id, data in self._execute("SELECT user_id, data FROM quiz_attempts ORDER BY user_id, completed_at, id"):
+            grouped.setdefault(user_id, []).append(QuizAttempt.model_validate_json(data))
+        return grouped
+
+    # ——— Learning progress ———
+    def get_progress(self, user_id: str) -> Dict[str, LearningProgress]:
+        rows = self._execute("SELECT topic, data FROM learning_progress WHERE user_id = ?", (user_id,)).fetchall()
+        return {topic: LearningProgress.model_validate_json(data) for topic, data in rows}
+
+    def get_topic_progress(self, user_id: str, topic: str) -> Optional[LearningProgress]:
+        row = self._execute(
+            "SELECT data FROM learning_progress WHERE user_id = ? AND topic = ?", (user_id, topic)
+        ).fetchone()
+        return LearningProgress.model_validate_json(row[0]) if row else None
+
+    def save_progress(self, progress: LearningProgress) -> None:
+        with self.transaction():
+            self._execute(
+                "INSERT OR REPLACE INTO learning_progress (user_id, topic, data) VALUES (?, ?, ?)",
+                (progress.user_id, progress.topic, progress.model_dump_json())
+            )
+            self._bump_progress_version(progress.user_id)
+
+    def _bump_progress_version(self, user_id: str) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO progress_changes (user_id, version) "
+            "VALUES (?, (SELECT COALESCE(MAX(version), 0) + 1 FROM progress_changes))",
+            (user_id,)
+        )
+
+    def progress_by_user(self) -> Dict[str, Dict[str, LearningProgress]]:
+        grouped: Dict[str, Dict[str, LearningProgress]] = {}
+        for user_id, topic, data in self._execute("SELECT user_id, topic, data FROM learning_progress"):
+            grouped.setdefault(user_id, {})[topic] = LearningProgress.model_validate_json(data)
+        return grouped
+
+    def progress_changes_since(self, version: int) -> Tuple[int, Set[str]]:
+        with self._snapshot():
+            current = self._execute("SELECT COALESCE(MAX(version), 0) FROM progress_changes").fetchone()[0]
+            rows = self._execute("SELECT user_id FROM progress_changes WHERE version > ?", (version,)).fetchall()
+        return current, {row[0] for row in rows}
+
+    # ——— Achievements ———
+    def add_achievement(self, user_id: str, achievement: Achievement) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO achievements (user_id, id, data) VALUES (?, ?, ?)",
+            (user_id, achievement.id, achievement.model_dump_json())
+        )
+
+    def list_achievements(self, user_id: str) -> List[Achievement]:
+        rows = self._execute("SELECT data FROM achievements WHERE user_id = ?", (user_id,)).fetchall()
+        return [Achievement.model_validate_json(row[0]) for row in rows]
+
+    # ——— Revoked tokens ———
+    def revoke_token(self, token_id: str, expires_at: float) -> None:
+        with self.transaction():
+            self._execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (time.time(),))
+            self._execute("INSERT OR REPLACE INTO revoked_tokens (token_id, expires_at) VALUES (?, ?)", (token_id, expires_at))
+
+    def is_token_revoked(self, token_id: str) -> bool:
+        row = self._execute("SELECT 1 FROM revoked_tokens WHERE token_id = ? AND expires_at > ?", (token_id, time.time())).fetchone()
+        return row is not None
+
+    # ——— Housekeeping ———
+    def counts(self) -> Dict[str, int]:
+        return {
+            "users": self._execute("SELECT COUNT(*) FROM users").fetchone()[0],
+            "sessions": self._execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            "quizzes": self._execute("SELECT COUNT(*) FROM quizzes").fetchone()[0],
+            "attempts": self._execute("SELECT COUNT(*) FROM quiz_attempts").fetchone()[0]
+        }
+
+    def clear(self) -> None:
+        with self.transaction():
+            for table in ("users", "sessions", "quizzes", "quiz_attempts", "quiz_completions",
+                          "learning_progress", "achievements", "revoked_tokens"):
+                self._execute(f"DELETE FROM {table}")
+            # Keep the latest version so readers notice the clear
+            self._execute("DELETE FROM progress_changes WHERE version < (SELECT MAX(version) FROM progress_changes)")
+            self._bump_progress_version(ALL_PROGRESS)
+            self._execute("DELETE FROM progress_changes WHERE user_id != ?", (ALL_PROGRESS,))
+
+def create_storage(backend: str = STORAGE_BACKEND) -> StorageBackend:
+    """Build the storage backend for the configured backend name."""
+    if backend == "sqlite":
+        return SQLiteStorage()
+    if backend == "memory":
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+# Global storage instance
+storage = create_storage()
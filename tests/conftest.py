@@ -0,0 +1,27 @@
+"""
+Shared test setup: every cache, index and database goes to a throwaway
+directory and embeddings use the offline hash backend, so tests never touch
+the working tree or the network.
+"""
+
+import os
+import tempfile
+
+_STATE_DIR = tempfile.mkdtemp(prefix="wonderbot-tests-")
+
+# Must be set before any kidapp module reads its configuration
+os.environ.update({
+    "STORAGE_BACKEND": "memory",
+    "STORAGE_PATH": os.path.join(_STATE_DIR, "wonderbot.sqlite3"),
+    "RESPONSE_CACHE_BACKEND": "memory",
+    "RESPONSE_CACHE_PATH": os.path.join(_STATE_DIR, "responses.sqlite3"),
+    "QUIZ_CACHE_PATH": os.path.join(_STATE_DIR, "quizzes.sqlite3"),
+    "JOB_QUEUE_BACKEND": "memory",
+    "JOB_QUEUE_PATH": os.path.join(_STATE_DIR, "jobs.sqlite3"),
+    "QUIZ_ATTEMPT_BACKEND": "memory",
+    "QUIZ_ATTEMPT_PATH": os.path.join(_STATE_DIR, "quiz_attempts.sqlite3"),
+    "MEDIA_DIR": os.path.join(_STATE_DIR, "media"),
+    "MEDIA_INDEX_PATH": os.path.join(_STATE_DIR, "media_index.sqlite3"),
+    "RAG_EMBEDDING_BACKEND": "hash",
+    "EMBEDDING_CACHE_PATH": os.path.join(_STATE_DIR, "embeddings.sqlite3"),
+})
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+import pytest
+
+from src.kidapp.auth import TokenCache, authenticate_user
+from src.kidapp.models import UserLogin
+from src.kidapp.password_hashing import password_hasher
+from src.kidapp.storage import storage
+
+@pytest.fixture(autouse=True)
+def clean_revocations():
+    yield
+    storage.clear()
+
+def test_revocation_on_one_worker_applies_to_cached_tokens_on_another():
+    worker, other_worker = TokenCache(), TokenCache()
+    exp = time.time() + 60
+    worker.put("token", "alice", exp)
+    assert worker.get("token") == "alice"
+
+    other_worker.revoke("token", exp)
+    assert worker.get("token") is None
+    assert worker.is_revoked("token")
+    # Caching it again does not bring it back
+    worker.put("token", "alice", exp)
+    assert worker.get("token") is None
+
+def test_unknown_username_still_runs_the_password_check():
+    before = password_hasher.stats()["verifications"]
+    assert asyncio.run(authenticate_user(UserLogin(username="nobody", password="Secret123!"))) is None
+    assert password_hasher.stats()["verifications"] == before + 1
@@ -0,0 +1,48 @@
+from src.kidapp.cache_keys import (
+    normalize_topic, canonical_interests, age_group_for, make_topic_cache_key, make_image_cache_key,
+    SemanticTopicIndex
+)
+from src.kidapp.embeddings import EmbeddingCache, HashEmbedder
+
+def test_normalize_topic_folds_case_trailing_punctuation_and_contractions():
+    assert normalize_topic("  What's   the SUN made of?! ") == "what is the sun made of"
+    assert normalize_topic("What’s the sun made of") == normalize_topic("whats the sun made of")
+    assert normalize_topic("") == ""
+
+def test_arithmetic_questions_keep_distinct_keys():
+    questions = ["What is 2+2?", "What is 2-2?", "What is 2*2?", "What is 2/2?", "What is 2.5+2?", "Is 2<3?"]
+    assert len({make_topic_cache_key(question, 7) for question in questions}) == len(questions)
+    assert normalize_topic("What is -3 + 2.5?") == "what is -3 + 2.5"
+
+def test_canonical_interests_sorts_and_deduplicates():
+    assert canonical_interests("Space, dinosaurs ,space,  ") == "dinosaurs,space"
+    assert canonical_interests(None) == ""
+
+def test_age_groups_match_rag_prompt():
+    assert [age_group_for(age) for age in (None, 6, 8, 9, 12, 14)] == ["6-12", "6-8", "6-8", "9-12", "9-12", "6-12"]
+
+def test_topic_key_is_shared_by_equivalent_requests():
+    key = make_topic_cache_key("Why is the sky blue?", 7, "space,art")
+    assert make_topic_cache_key("why is the sky BLUE", 8, "Art, Space") == key
+    assert make_topic_cache_key("why is the sky blue", 10, "art,space") != key
+    assert make_topic_cache_key("why is the sky blue", 7, "art") != key
+
+def test_image_key_includes_age_group_and_interests():
+    assert make_image_cache_key("abc", 7, "b,a") == "image:abc|age:6-8|interests:a,b"
+
+def test_semantic_index_matches_paraphrase_within_bucket(tmp_path):
+    embeddings = EmbeddingCache(HashEmbedder(), path=str(tmp_path / "embeddings.sqlite3"))
+    index = SemanticTopicIndex(enabled=True, threshold=0.5, embeddings=embeddings)
+    index.add("Why is the sky blue?", 7, "space", "key-sky")
+
+    assert index.lookup("why is the sky blue", 8, "space")[0] == "key-sky"
+    assert index.lookup("how do volcanoes erupt", 7, "space") is None
+    # Different age group or interests never share answers
+    assert index.lookup("why is the sky blue", 11, "space") is None
+    assert index.lookup("why is the sky blue", 7, "art") is None
+
+def test_semantic_index_disabled_does_nothing(tmp_path):
+    index = SemanticTopicIndex(enabled=False, embeddings=EmbeddingCache(HashEmbedder(), path=None))
+    index.add("sky", 7, None, "key")
+    assert index.lookup("sky", 7, None) is None
+    assert index.stats()["topics"] == 0
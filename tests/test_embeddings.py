@@ -0,0 +1,66 @@
+import numpy as np
+
+from src.kidapp.embeddings import EmbeddingCache, HashEmbedder, cosine_from_distance, get_embedder, get_query_embeddings
+
+class CountingEmbedder(HashEmbedder):
+    def __init__(self):
+        super().__init__(dim=64)
+        self.calls = 0
+
+    def _embed_batch(self, texts):
+        self.calls += len(texts)
+        return super()._embed_batch(texts)
+
+def test_hash_embedder_rows_are_unit_length_and_deterministic():
+    embedder = HashEmbedder(dim=128)
+    vectors = embedder.embed(["the planets orbit the sun", "volcanoes erupt lava"])
+    assert vectors.shape == (2, 128)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert np.array_equal(embedder.embed_one("the planets orbit the sun"), vectors[0])
+
+def test_cosine_from_distance():
+    assert cosine_from_distance(0.0) == 1.0
+    assert cosine_from_distance(2.0) == 0.0
+    assert cosine_from_distance(0.25, space="cosine") == 0.75
+
+def test_cache_hits_memory_then_disk(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    embedder = CountingEmbedder()
+    cache = EmbeddingCache(embedder, path=path)
+
+    first = cache.embed("Why is the sky blue?")
+    # Normalization makes these the same query
+    second = cache.embed("why is the SKY blue")
+    assert embedder.calls == 1
+    assert np.array_equal(first, second)
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    # A new process finds the vector on disk
+    restarted = EmbeddingCache(embedder, path=path)
+    assert np.allclose(restarted.embed("why is the sky blue"), first)
+    assert embedder.calls == 1
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.stats()["stored_entries"] == 1
+
+def test_cache_evicts_memory_past_byte_budget(tmp_path):
+    embedder = CountingEmbedder()
+    # Room for two 64-dim float32 vectors
+    cache = EmbeddingCache(embedder, path=None, memory_bytes=2 * 64 * 4)
+    for text in ("one", "two", "three"):
+        cache.embed(text)
+    assert cache.stats()["memory_entries"] == 2
+    cache.embed("one")
+    assert embedder.calls == 4
+
+def test_cache_keys_by_model(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingCache(HashEmbedder(dim=64), path=path).embed("sky")
+    other = EmbeddingCache(HashEmbedder(dim=32), path=path)
+    assert other.embed("sky").shape == (32,)
+    assert other.stats()["disk_hits"] == 0
+
+def test_shared_instances_use_configured_backend():
+    assert get_embedder() is get_embedder()
+    assert get_embedder().name == "hash"
+    assert get_query_embeddings().embedder is get_embedder()
@@ -0,0 +1,71 @@
+import pytest
+
+from src.kidapp.grading import normalize_answer, score_matrix, grade_attempts
+from src.kidapp.models import Quiz, QuizQuestion, QuestionType, DifficultyLevel
+
+@pytest.fixture
+def quiz():
+    return Quiz(
+        id="quiz-1",
+        title="Space",
+        topic="space",
+        difficulty=DifficultyLevel.EASY,
+        estimated_time=4,
+        questions=[
+            QuizQuestion(question="Biggest planet?", question_type=QuestionType.MULTIPLE_CHOICE,
+                         correct_answer="Jupiter", options=["Earth", "Mars", "Jupiter", "Saturn"]),
+            QuizQuestion(question="The sun is a star.", question_type=QuestionType.TRUE_FALSE, correct_answer="True"),
+            QuizQuestion(question="Water turning into gas is called ___.", question_type=QuestionType.FILL_BLANK,
+                         correct_answer="Evaporation"),
+            QuizQuestion(question="Why do we have seasons?", question_type=QuestionType.SHORT_ANSWER,
+                         correct_answer="The tilt of the Earth's axis")
+        ]
+    )
+
+def test_normalize_answer():
+    assert normalize_answer("  Jupiter!! ") == "jupiter"
+    assert normalize_answer(None) == ""
+
+def test_score_matrix_accepts_equivalent_answers(quiz):
+    answers = [
+        {"0": "jupiter", "1": "yes", "2": "Evaporation.", "3": "because earth axis has a tilt"},
+        {"0": "C", "1": "t", "2": "evaporation", "3": "it is hot"},
+        {"0": "Mars", "1": "False", "2": "", "3": ""},
+        {}
+    ]
+    assert score_matrix(quiz, answers).tolist() == [
+        [True, True, True, True],
+        [True, True, True, False],
+        [False, False, False, False],
+        [False, False, False, False]
+    ]
+
+def test_correct_answer_given_as_letter(quiz):
+    question = quiz.questions[0].model_copy(update={"correct_answer": "C"})
+    lettered = quiz.model_copy(update={"questions": [question]})
+    assert score_matrix(lettered, [{"0": "Jupiter"}, {"0": "c"}, {"0": "Saturn"}]).ravel().tolist() == [True, True, False]
+
+def test_grade_attempts_scores_and_item_statistics(quiz):
+    answer_sets = [
+        {"0": "Jupiter", "1": "True", "2": "evaporation", "3": "tilt of earth axis"},
+        {"0": "Jupiter", "1": "True", "2": "evaporation", "3": ""},
+        {"0": "Jupiter", "1": "True", "2": "", "3": ""},
+        {"0": "Jupiter", "1": "False", "2": "", "3": ""}
+    ]
+    graded = grade_attempts(quiz, answer_sets)
+    assert graded["correct_answers"] == [4, 3, 2, 1]
+    assert graded["scores"] == [100.0, 75.0, 50.0, 25.0]
+    assert graded["mean_score"] == 62.5
+    difficulty = [question["difficulty"] for question in graded["questions"]]
+    assert difficulty == [1.0, 0.75, 0.5, 0.25]
+    discrimination = [question["discrimination"] for question in graded["questions"]]
+    # Everyone got question 0 right, so it cannot discriminate
+    assert discrimination[0] is None
+    # Questions the strongest attempts get right correlate positively with the rest
+    assert all(value > 0 for value in discrimination[1:])
+
+def test_grade_no_attempts(quiz):
+    graded = grade_attempts(quiz, [])
+    assert graded["scores"] == []
+    assert graded["mean_score"] is None
+    assert all(question["difficulty"] is None for question in graded["questions"])
@@ -0,0 +1,25 @@
+import pytest
+
+from src.kidapp.ingest import chunk_text
+
+def _sentence(i: int, words: int) -> str:
+    return " ".join(f"word{i}" for _ in range(words)) + "."
+
+@pytest.mark.parametrize("max_chars,overlap", [(1200, 150), (200, 50), (80, 100)])
+def test_chunks_never_exceed_max_chars(max_chars, overlap):
+    paragraphs = [" ".join(_sentence(i * 10 + j, 3 + (i * 7 + j * 13) % 40) for j in range(1 + i % 6)) for i in range(40)]
+    chunks = chunk_text("\n\n".join(paragraphs), max_chars=max_chars, overlap=overlap)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= max_chars for chunk in chunks)
+
+def test_overlap_carries_trailing_sentences_up_to_the_limit():
+    first = " ".join(_sentence(i, 8) for i in range(10))
+    second = " ".join(_sentence(i, 8) for i in range(10, 20))
+    chunks = chunk_text(first + "\n\n" + second, max_chars=len(first) + 10, overlap=60)
+    assert chunks[0] == first
+    assert chunks[1].startswith(_sentence(9, 8) + " " + _sentence(10, 8))
+
+def test_short_chunk_is_not_copied_into_the_next():
+    short, long = "A short intro.", "x" * 95 + "."
+    chunks = chunk_text(short + "\n\n" + long, max_chars=100, overlap=50)
+    assert chunks == [short, long]
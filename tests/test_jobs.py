@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from src.kidapp.jobs import JobQueue, MemoryJobStore, SQLiteJobStore, QUEUED, RUNNING, DONE, FAILED
+
+def _wait_for(queue, job_id, status=DONE, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job and job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {status}: {queue.get(job_id)}")
+
+def _orphan(store, owner, status, heartbeat_age):
+    """A job left behind by `owner`, whose last heartbeat was `heartbeat_age` seconds ago."""
+    now = time.time()
+    job_id = f"{owner}-{status}"
+    store.insert({"id": job_id, "kind": "echo", "user_id": "u1", "payload": {"value": job_id},
+                  "status": status, "created_at": now, "updated_at": now, "owner": owner})
+    with store._lock:
+        store._conn.execute("INSERT OR REPLACE INTO job_workers (owner, heartbeat_at) VALUES (?, ?)",
+                            (owner, now - heartbeat_age))
+    return job_id
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(store):
+        queue = JobQueue(store, max_workers=2)
+        queue.register("echo", lambda value: {"value": value})
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.shutdown()
+
+def test_jobs_run_and_record_results(make_queue):
+    queue = make_queue(MemoryJobStore())
+    queue.register("boom", lambda: 1 / 0)
+    done = queue.submit("echo", {"value": 3}, user_id="u1")
+    failed = queue.submit("boom", {})
+
+    assert _wait_for(queue, done)["result"] == {"value": 3}
+    assert "division by zero" in _wait_for(queue, failed, FAILED)["error"]
+    with pytest.raises(ValueError):
+        queue.submit("unknown", {})
+
+def test_memory_store_never_resumes(make_queue):
+    assert make_queue(MemoryJobStore()).resume_unfinished() == 0
+
+def test_jobs_of_dead_workers_are_resumed_regardless_of_age(make_queue, tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), stale_seconds=60)
+    queued = _orphan(store, "dead", QUEUED, heartbeat_age=3600)
+    running = _orphan(store, "crashed", RUNNING, heartbeat_age=3600)
+    # Jobs of a worker that is still heart-beating are left alone
+    alive = _orphan(store, "alive", QUEUED, heartbeat_age=1)
+
+    queue = make_queue(SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), stale_seconds=60))
+    assert queue.resume_unfinished() == 2
+    for job_id in (queued, running):
+        job = _wait_for(queue, job_id)
+        assert job["result"] == {"value": job_id}
+        assert job["owner"] == queue.owner
+    assert queue.get(alive)["status"] == QUEUED
+    # Claimed jobs are not handed out twice
+    assert queue.resume_unfinished() == 0
+
+def test_jobs_without_owner_are_resumed(make_queue, tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = SQLiteJobStore(path)
+    now = time.time()
+    store.insert({"id": "legacy", "kind": "echo", "user_id": None, "payload": {"value": 1},
+                  "status": QUEUED, "created_at": now, "updated_at": now})
+    queue = make_queue(SQLiteJobStore(path))
+    assert queue.resume_unfinished() == 1
+    _wait_for(queue, "legacy")
+
+def test_clean_shutdown_hands_jobs_over_immediately(make_queue, tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    release = threading.Event()
+    runs = []
+
+    def echo(value):
+        runs.append(value)
+        release.wait(5)
+        return {"value": value}
+
+    leaving = JobQueue(SQLiteJobStore(path), max_workers=1)
+    leaving.register("echo", echo)
+    leaving.resume_unfinished()
+    leaving.submit("echo", {"value": "busy"})
+    waiting = leaving.submit("echo", {"value": "waiting"})
+    leaving.shutdown()
+
+    taker = make_queue(SQLiteJobStore(path))
+    taker.register("echo", echo)
+    assert taker.resume_unfinished() == 2
+    release.set()
+    assert _wait_for(taker, waiting)["owner"] == taker.owner
+    # The job that had not started yet ran only in the process that took it over
+    assert runs.count("waiting") == 1
@@ -0,0 +1,146 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.kidapp import openai_clients
+from src.kidapp.models import DifficultyLevel
+from src.kidapp.storage import storage
+from src.kidapp.quiz_generator import (
+    get_or_generate_quiz, quiz_generation_stats, quiz_reuse_stats, quiz_for_user, question_order,
+    submit_quiz_attempt, start_quiz_attempt, record_quiz_answer, quiz_analytics, quiz_cache, parse_quiz_json,
+    QuizParseError
+)
+from src.kidapp.quiz_timing import quiz_timer, UnknownQuestionError
+
+QUIZ = {
+    "title": "Planet Fun",
+    "questions": [
+        {"question": f"Question {i}?", "question_type": "multiple_choice", "correct_answer": f"Right {i}",
+         "options": [f"Right {i}", f"Wrong {i}", "Neither"], "explanation": "Because."}
+        for i in range(5)
+    ]
+}
+
+class FakeCompletions:
+    """Returns canned create_quiz function-call arguments, one per request."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        call = SimpleNamespace(id=f"call_{len(self.requests)}",
+                               function=SimpleNamespace(name="create_quiz", arguments=self.replies.pop(0)))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=None, tool_calls=[call]))])
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """Install a fake OpenAI client through set_openai_clients; the real one is restored afterwards."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(openai_clients, "_sync_client", None)
+
+    def install(*replies):
+        completions = FakeCompletions(replies)
+        openai_clients.set_openai_clients(SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        return completions
+
+    return install
+
+@pytest.fixture(autouse=True)
+def clean_catalog():
+    yield
+    storage.clear()
+    quiz_cache.clear()
+    quiz_timer.reset()
+
+def _delta(before, after, *names):
+    return {name: after[name] - before[name] for name in names}
+
+def test_parse_quiz_json_repairs_common_slips():
+    assert parse_quiz_json('```json\n{"title": "T", "questions": [],}\n```')["title"] == "T"
+    assert parse_quiz_json('Here you go: {"title": "T" // a comment\n}')["title"] == "T"
+    with pytest.raises(QuizParseError):
+        parse_quiz_json("no quiz here")
+
+def test_generated_quiz_is_reused(fake_openai):
+    completions = fake_openai(json.dumps(QUIZ))
+    first = get_or_generate_quiz("Planets orbit the sun.", "planets", DifficultyLevel.EASY, 5)
+    second = get_or_generate_quiz("Planets orbit the sun.", "planets", DifficultyLevel.EASY, 5)
+
+    assert len(completions.requests) == 1
+    assert first.id == second.id
+    assert [q.correct_answer for q in first.questions] == [f"Right {i}" for i in range(5)]
+    assert storage.get_quiz(first.id) is not None
+    assert len(storage.list_quizzes()) == 1
+    assert quiz_reuse_stats()["reused"] >= 1
+
+def test_unusable_output_is_retried_once(fake_openai):
+    before = quiz_generation_stats()
+    completions = fake_openai("not json at all", json.dumps(QUIZ))
+    quiz = get_or_generate_quiz("Volcanoes erupt.", "volcanoes", DifficultyLevel.MEDIUM, 5)
+
+    assert len(quiz.questions) == 5
+    retry = completions.requests[1]["messages"]
+    # The correction is sent as the function call's result
+    assert retry[-2]["tool_calls"][0]["id"] == "call_1"
+    assert retry[-1]["role"] == "tool"
+    assert _delta(before, quiz_generation_stats(), "parse_failures", "retries", "retry_successes", "fallbacks") == {
+        "parse_failures": 1, "retries": 1, "retry_successes": 1, "fallbacks": 0
+    }
+
+def test_failed_retry_counts_both_failures_and_falls_back(fake_openai):
+    before = quiz_generation_stats()
+    fake_openai("garbage", '{"title": "Empty", "questions": []}')
+    quiz = get_or_generate_quiz("Rain falls.", "rain", DifficultyLevel.EASY, 5)
+
+    assert quiz.title == "Quick Quiz about rain"
+    assert _delta(before, quiz_generation_stats(), "parse_failures", "retries", "fallbacks") == {
+        "parse_failures": 2, "retries": 1, "fallbacks": 1
+    }
+
+def test_each_user_gets_a_stable_order_of_the_same_quiz(fake_openai):
+    fake_openai(json.dumps(QUIZ))
+    quiz = get_or_generate_quiz("Planets orbit the sun.", "planets", DifficultyLevel.EASY, 5)
+
+    orders = {user: question_order(quiz, user) for user in ("alice", "bob", "carol", "dave")}
+    assert all(sorted(order) == list(range(5)) for order in orders.values())
+    assert len({tuple(order) for order in orders.values()}) > 1
+    served = quiz_for_user(quiz, "alice")
+    assert served.id == quiz.id
+    assert served == quiz_for_user(quiz, "alice")
+    assert [q.question for q in served.questions] == [quiz.questions[i].question for i in orders["alice"]]
+    # Serving never adds quizzes to the catalog
+    assert len(storage.list_quizzes()) == 1
+
+def test_answers_in_served_order_are_graded_against_the_canonical_quiz(fake_openai):
+    fake_openai(json.dumps(QUIZ))
+    quiz = get_or_generate_quiz("Planets orbit the sun.", "planets", DifficultyLevel.EASY, 5)
+
+    for user in ("alice", "bob"):
+        served = quiz_for_user(quiz, user)
+        # Right on every question except the one shown first
+        answers = {str(i): q.correct_answer for i, q in enumerate(served.questions)}
+        answers["0"] = "Neither"
+        result = submit_quiz_attempt(quiz.id, user, answers, served_order=True)
+        assert result["correct_answers"] == 4
+
+        stored = storage.attempts_for_quiz(quiz.id)[-1]
+        first_shown = question_order(quiz, user)[0]
+        assert stored.answers[str(first_shown)] == "Neither"
+
+    analytics = quiz_analytics(quiz.id)
+    assert analytics["attempts"] == 2
+
+def test_answer_stamps_must_name_a_question_of_the_quiz(fake_openai):
+    fake_openai(json.dumps(QUIZ))
+    quiz = get_or_generate_quiz("Planets orbit the sun.", "planets", DifficultyLevel.EASY, 5)
+    token = start_quiz_attempt(quiz.id, "alice")["attempt_token"]
+
+    assert record_quiz_answer(quiz.id, "alice", "4", token) >= 0
+    for question_id in ("5", "-1", "first"):
+        with pytest.raises(UnknownQuestionError):
+            record_quiz_answer(quiz.id, "alice", question_id, token)
+    with pytest.raises(ValueError):
+        record_quiz_answer("missing-quiz", "alice", "0", token)
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from src.kidapp.models import QuizAttempt
+from src.kidapp.storage import storage
+from src.kidapp.quiz_timing import (
+    QuizTimer, MemoryAttemptStore, SQLiteAttemptStore, AttemptTokenError, UnknownQuestionError,
+    _histogram_quantile, TIMING_BUCKETS, DEFAULT_MINUTES_PER_QUESTION
+)
+
+@pytest.fixture(autouse=True)
+def clean_attempts():
+    yield
+    storage.clear()
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_timer(request, tmp_path):
+    """Build timers that share one attempt store, as workers of one deployment would."""
+    path = str(tmp_path / "attempts.sqlite3")
+    shared = MemoryAttemptStore()
+
+    def make():
+        return QuizTimer(store=SQLiteAttemptStore(path) if request.param == "sqlite" else shared)
+
+    return make
+
+def test_finish_returns_time_taken_and_question_split(make_timer):
+    timer = make_timer()
+    token = timer.start("quiz", "alice")["attempt_token"]
+    timer.record_answer(token, "quiz", "alice", "1", 3)
+    timer.record_answer(token, "quiz", "alice", "0", 3)
+    # Only the first answer to a question counts
+    timer.record_answer(token, "quiz", "alice", "1", 3)
+
+    time_taken, question_times = timer.finish(token, "quiz", "alice")
+    assert time_taken >= 0
+    assert list(question_times) == ["1", "0"]
+    assert all(seconds >= 0 for seconds in question_times.values())
+
+def test_submitted_token_cannot_be_replayed(make_timer):
+    timer, other_worker = make_timer(), make_timer()
+    token = timer.start("quiz", "alice")["attempt_token"]
+    other_worker.record_answer(token, "quiz", "alice", "0", 2)
+    timer.finish(token, "quiz", "alice")
+
+    for worker in (timer, other_worker):
+        with pytest.raises(AttemptTokenError):
+            worker.finish(token, "quiz", "alice")
+        with pytest.raises(AttemptTokenError):
+            worker.record_answer(token, "quiz", "alice", "1", 2)
+
+def test_stamps_recorded_on_another_worker_are_kept(tmp_path):
+    path = str(tmp_path / "attempts.sqlite3")
+    first, second = QuizTimer(store=SQLiteAttemptStore(path)), QuizTimer(store=SQLiteAttemptStore(path))
+    token = first.start("quiz", "alice")["attempt_token"]
+    second.record_answer(token, "quiz", "alice", "0", 2)
+    assert list(first.finish(token, "quiz", "alice")[1]) == ["0"]
+
+def test_token_must_match_quiz_and_user(make_timer):
+    timer = make_timer()
+    token = timer.start("quiz", "alice")["attempt_token"]
+    for quiz_id, user_id in (("other-quiz", "alice"), ("quiz", "bob")):
+        with pytest.raises(AttemptTokenError):
+            timer.finish(token, quiz_id, user_id)
+    with pytest.raises(AttemptTokenError):
+        timer.record_answer("not-a-token", "quiz", "alice", "0", 2)
+    assert timer.stats()["rejected_tokens"] == 3
+
+def test_expired_token_is_rejected(make_timer):
+    timer = make_timer()
+    timer.ttl_seconds = -1
+    token = timer.start("quiz", "alice")["attempt_token"]
+    with pytest.raises(AttemptTokenError):
+        timer.finish(token, "quiz", "alice")
+
+def test_question_must_be_part_of_the_quiz(make_timer):
+    timer = make_timer()
+    token = timer.start("quiz", "alice")["attempt_token"]
+    for question_id in ("2", "-1", "x"):
+        with pytest.raises(UnknownQuestionError):
+            timer.record_answer(token, "quiz", "alice", question_id, 2)
+
+def test_histogram_quantile_interpolates_inside_bucket():
+    counts = [0] * len(TIMING_BUCKETS)
+    counts[1] = 4  # all answers took 5-10 seconds
+    assert _histogram_quantile(np.array(counts), 0.5) == 7.5
+    assert _histogram_quantile(np.zeros(len(TIMING_BUCKETS)), 0.5) is None
+
+def test_estimate_falls_back_until_enough_samples(monkeypatch):
+    timer = QuizTimer(store=MemoryAttemptStore())
+    assert timer.estimate_minutes(4) == 4 * DEFAULT_MINUTES_PER_QUESTION
+
+    monkeypatch.setattr("src.kidapp.quiz_timing.QUIZ_TIMING_MIN_SAMPLES", 2)
+    for user_id in ("alice", "bob"):
+        # As in submit_quiz_attempt: the attempt is saved, then observed
+        question_times = {"0": 40.0, "1": 50.0}
+        storage.add_attempt(QuizAttempt(quiz_id="quiz", user_id=user_id, score=100, total_questions=2,
+                                        correct_answers=2, time_taken=90, answers={}, question_times=question_times))
+        timer.observe("quiz", 2, question_times)
+    timing = timer.quiz_timing("quiz", 2)
+    assert timing["timed_attempts"] == 2
+    assert [q["answers"] for q in timing["questions"]] == [2, 2]
+    assert timer.estimate_minutes(2, "quiz") == 2
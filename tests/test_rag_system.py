@@ -0,0 +1,18 @@
+from src.kidapp.rag_system import EDUCATIONAL_CONTENT, collection_name_for, document_id_for
+
+def test_collection_name_depends_on_model_and_dimension():
+    names = {
+        collection_name_for("local:all-MiniLM-L6-v2", 384),
+        collection_name_for("local:all-mpnet-base-v2", 768),
+        collection_name_for("local:all-mpnet-base-v2", 384),
+        collection_name_for("openai:text-embedding-3-small", 1536),
+        collection_name_for("hash:512", 512)
+    }
+    assert len(names) == 5
+    assert all(len(name) <= 63 and name.replace("_", "").isalnum() for name in names)
+
+def test_seed_documents_use_content_ids():
+    ids = [document_id_for(item["content"]) for item in EDUCATIONAL_CONTENT]
+    assert len(set(ids)) == len(ids)
+    # The same text re-ingested with different spacing maps to the seeded document
+    assert document_id_for("  " + EDUCATIONAL_CONTENT[0]["content"].replace(" ", "\n")) == ids[0]
@@ -0,0 +1,33 @@
+import pytest
+from fastapi import HTTPException
+
+from src.kidapp.routers.session_router import save_session_data, get_session_page
+from src.kidapp.storage import storage
+
+@pytest.fixture(autouse=True)
+def clear_storage():
+    yield
+    storage.clear()
+
+def test_total_only_on_first_page_unless_requested():
+    for i in range(5):
+        save_session_data("u1", f"topic {i}", "explanation")
+
+    first = get_session_page("u1", limit=2)
+    assert first["total_sessions"] == 5
+    assert [session["topic"] for session in first["sessions"]] == ["topic 4", "topic 3"]
+
+    second = get_session_page("u1", limit=2, cursor=first["next_cursor"])
+    assert "total_sessions" not in second
+    assert get_session_page("u1", limit=2, cursor=first["next_cursor"], include_total=True)["total_sessions"] == 5
+    assert "total_sessions" not in get_session_page("u1", limit=2, include_total=False)
+
+def test_field_projection_and_errors():
+    save_session_data("u1", "planets", "a long explanation")
+    page = get_session_page("u1", fields="topic,timestamp")
+    assert set(page["sessions"][0]) == {"topic", "timestamp"}
+    with pytest.raises(HTTPException) as error:
+        get_session_page("u1", fields="topic,password")
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException):
+        get_session_page("u1", cursor="garbage")
@@ -0,0 +1,120 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.kidapp.models import (
+    SessionData, Quiz, QuizQuestion, QuizAttempt, QuestionType, DifficultyLevel, LearningProgress
+)
+from src.kidapp.storage import MemoryStorage, SQLiteStorage, ALL_PROGRESS
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    """A fresh storage backend of each kind."""
+    if request.param == "sqlite":
+        return SQLiteStorage(str(tmp_path / "storage.sqlite3"))
+    return MemoryStorage()
+
+def _add_sessions(backend, user_id, count, same_time=False):
+    for i in range(count):
+        at = START if same_time else START + timedelta(minutes=i)
+        backend.add_session(SessionData(user_id=user_id, topic=f"topic {i}", explanation="...", timestamp=at))
+
+def _walk_sessions(backend, user_id, limit, **filters):
+    topics, cursor = [], None
+    while True:
+        page, cursor = backend.page_sessions(user_id, limit, cursor=cursor, **filters)
+        assert len(page) <= limit
+        topics += [session.topic for session in page]
+        if cursor is None:
+            return topics
+
+def _quiz(quiz_id, topic, difficulty, at):
+    question = QuizQuestion(question="Q?", question_type=QuestionType.TRUE_FALSE, correct_answer="True")
+    return Quiz(id=quiz_id, title=topic, topic=topic, questions=[question], difficulty=difficulty,
+                created_at=at, estimated_time=2)
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 10])
+def test_session_pages_cover_every_session_newest_first(backend, limit):
+    _add_sessions(backend, "u1", 7)
+    _add_sessions(backend, "u2", 2)
+    assert _walk_sessions(backend, "u1", limit) == [f"topic {i}" for i in range(6, -1, -1)]
+    assert backend.count_sessions("u1") == 7
+
+def test_session_pages_with_identical_timestamps(backend):
+    _add_sessions(backend, "u1", 5, same_time=True)
+    topics = _walk_sessions(backend, "u1", 2)
+    assert sorted(topics) == sorted(f"topic {i}" for i in range(5))
+    assert len(set(topics)) == 5
+
+def test_session_page_filters(backend):
+    _add_sessions(backend, "u1", 10)
+    assert _walk_sessions(backend, "u1", 2, topic="TOPIC 1") == ["topic 1"]
+    window = _walk_sessions(backend, "u1", 2, since=START + timedelta(minutes=3), until=START + timedelta(minutes=6))
+    assert window == ["topic 5", "topic 4", "topic 3"]
+
+def test_session_page_empty_and_bad_cursor(backend):
+    assert backend.page_sessions("nobody", 5) == ([], None)
+    with pytest.raises(ValueError):
+        backend.page_sessions("nobody", 5, cursor="not-a-cursor")
+
+def test_quiz_pages_filter_by_topic_and_difficulty(backend):
+    for i in range(6):
+        difficulty = DifficultyLevel.EASY if i % 2 else DifficultyLevel.HARD
+        backend.save_quiz(_quiz(f"q{i}", "Planets" if i < 4 else "Volcanoes", difficulty, START + timedelta(minutes=i)))
+
+    def walk(**filters):
+        ids, cursor = [], None
+        while True:
+            page, cursor = backend.page_quizzes(2, cursor=cursor, **filters)
+            ids += [quiz.id for quiz in page]
+            if cursor is None:
+                return ids
+
+    assert walk() == ["q5", "q4", "q3", "q2", "q1", "q0"]
+    assert walk(topic="planets") == ["q3", "q2", "q1", "q0"]
+    assert walk(difficulty=DifficultyLevel.EASY.value) == ["q5", "q3", "q1"]
+    assert walk(topic="planets", difficulty=DifficultyLevel.HARD.value) == ["q2", "q0"]
+
+def test_attempts_and_completions(backend):
+    backend.save_quiz(_quiz("q1", "Planets", DifficultyLevel.EASY, START))
+    for user_id in ("u1", "u2"):
+        backend.add_attempt(QuizAttempt(quiz_id="q1", user_id=user_id, score=100, total_questions=1,
+                                        correct_answers=1, time_taken=3, answers={"0": "True"}))
+    assert [attempt.user_id for attempt in backend.attempts_for_quiz("q1")] == ["u1", "u2"]
+    assert backend.completed_quiz_ids("u1", ["q1", "q2"]) == {"q1"}
+    assert backend.completed_quiz_ids("u3") == set()
+
+def test_progress_change_feed(backend):
+    version, changed = backend.progress_changes_since(0)
+    assert changed == set()
+    backend.save_progress(LearningProgress(user_id="u1", topic="planets"))
+    backend.save_progress(LearningProgress(user_id="u2", topic="planets"))
+    version, changed = backend.progress_changes_since(version)
+    assert changed == {"u1", "u2"}
+
+    backend.save_progress(LearningProgress(user_id="u1", topic="volcanoes"))
+    latest, changed = backend.progress_changes_since(version)
+    assert changed == {"u1"} and latest > version
+
+    backend.clear()
+    after_clear, changed = backend.progress_changes_since(latest)
+    assert changed == {ALL_PROGRESS} and after_clear > latest
+
+def test_sqlite_progress_feed_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    writer, reader = SQLiteStorage(path), SQLiteStorage(path)
+    writer.save_progress(LearningProgress(user_id="u1", topic="planets"))
+    assert reader.progress_changes_since(0)[1] == {"u1"}
+
+def test_revoked_tokens_expire(backend):
+    now = time.time()
+    backend.revoke_token("live", now + 60)
+    backend.revoke_token("expired", now - 1)
+    assert backend.is_token_revoked("live")
+    assert not backend.is_token_revoked("expired")
+    assert not backend.is_token_revoked("unknown")
+    backend.clear()
+    assert not backend.is_token_revoked("live")